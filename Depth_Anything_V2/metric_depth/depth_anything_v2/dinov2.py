@@ -8,8 +8,10 @@
 #   https://github.com/rwightman/pytorch-image-models/tree/master/timm/models/vision_transformer.py
 
 from functools import partial
+from collections import OrderedDict
 import math
 import logging
+import threading
 from typing import Sequence, Tuple, Union, Callable
 
 import torch
@@ -17,7 +19,7 @@ import torch.nn as nn
 import torch.utils.checkpoint
 from torch.nn.init import trunc_normal_
 
-from .dinov2_layers import Mlp, PatchEmbed, SwiGLUFFNFused, MemEffAttention, NestedTensorBlock as Block
+from .dinov2_layers import Mlp, PatchEmbed, SwiGLUFFNFused, Attention, MemEffAttention, NestedTensorBlock as Block
 
 
 logger = logging.getLogger("dinov2")
@@ -65,6 +67,7 @@ class DinoVisionTransformer(nn.Module):
         num_register_tokens=0,
         interpolate_antialias=False,
         interpolate_offset=0.1,
+        pos_embed_cache_size=8,
     ):
         """
         Args:
@@ -90,6 +93,7 @@ class DinoVisionTransformer(nn.Module):
             num_register_tokens: (int) number of extra cls tokens (so-called "registers")
             interpolate_antialias: (str) flag to apply anti-aliasing when interpolating positional embeddings
             interpolate_offset: (float) work-around offset to apply when interpolating positional embeddings
+            pos_embed_cache_size: (int) number of interpolated positional embeddings kept per input grid (0 disables the cache)
         """
         super().__init__()
         norm_layer = partial(nn.LayerNorm, eps=1e-6)
@@ -103,6 +107,11 @@ class DinoVisionTransformer(nn.Module):
         self.interpolate_antialias = interpolate_antialias
         self.interpolate_offset = interpolate_offset
 
+        self.pos_embed_cache_size = pos_embed_cache_size
+        self._pos_embed_cache = OrderedDict()
+        self._pos_embed_cache_state = None
+        self._pos_embed_cache_lock = threading.Lock()
+
         self.patch_embed = embed_layer(img_size=img_size, patch_size=patch_size, in_chans=in_chans, embed_dim=embed_dim)
         num_patches = self.patch_embed.num_patches
 
@@ -182,10 +191,43 @@ class DinoVisionTransformer(nn.Module):
         N = self.pos_embed.shape[1] - 1
         if npatch == N and w == h:
             return self.pos_embed
+        dim = x.shape[-1]
+        if torch.jit.is_tracing() and not self.interpolate_antialias:
+            # keep the grid size symbolic so exported graphs accept any input size
+            return self._interpolate_pos_encoding_traceable(dim, w, h).to(previous_dtype)
+        if not self._pos_embed_cacheable():
+            return self._interpolate_pos_encoding(dim, w, h).to(previous_dtype)
+
+        key = (w, h, previous_dtype, x.device)
+        with self._pos_embed_cache_lock:
+            # in-place weight updates (load_state_dict, .to()) change the version or storage
+            state = (self.pos_embed.data_ptr(), self.pos_embed._version)
+            if state != self._pos_embed_cache_state:
+                self._pos_embed_cache.clear()
+                self._pos_embed_cache_state = state
+            pos_embed = self._pos_embed_cache.get(key)
+            if pos_embed is not None:
+                self._pos_embed_cache.move_to_end(key)
+                return pos_embed
+
+        pos_embed = self._interpolate_pos_encoding(dim, w, h).to(previous_dtype)
+
+        with self._pos_embed_cache_lock:
+            if state == self._pos_embed_cache_state:
+                self._pos_embed_cache[key] = pos_embed
+                while len(self._pos_embed_cache) > self.pos_embed_cache_size:
+                    self._pos_embed_cache.popitem(last=False)
+        return pos_embed
+
+    def _pos_embed_cacheable(self):
+        # a cached tensor would be detached from the autograd graph, so only cache for inference
+        return self.pos_embed_cache_size > 0 and not (torch.is_grad_enabled() and self.pos_embed.requires_grad)
+
+    def _interpolate_pos_encoding(self, dim, w, h):
+        N = self.pos_embed.shape[1] - 1
         pos_embed = self.pos_embed.float()
         class_pos_embed = pos_embed[:, 0]
         patch_pos_embed = pos_embed[:, 1:]
-        dim = x.shape[-1]
         w0 = w // self.patch_size
         h0 = h // self.patch_size
         # we add a small number to avoid floating point error in the interpolation
@@ -207,7 +249,63 @@ class DinoVisionTransformer(nn.Module):
         assert int(w0) == patch_pos_embed.shape[-2]
         assert int(h0) == patch_pos_embed.shape[-1]
         patch_pos_embed = patch_pos_embed.permute(0, 2, 3, 1).view(1, -1, dim)
-        return torch.cat((class_pos_embed.unsqueeze(0), patch_pos_embed), dim=1).to(previous_dtype)
+        return torch.cat((class_pos_embed.unsqueeze(0), patch_pos_embed), dim=1)
+
+    def _interpolate_pos_encoding_traceable(self, dim, w, h):
+        """Same result as _interpolate_pos_encoding, written with tensor ops only.
+
+        The bicubic resize (align_corners=False, A=-0.75, border clamping) is expressed as two
+        (out, sqrt_N) weight matrices built from the traced grid size, so tracers (torch.jit.trace,
+        torch.onnx.export) record it as a function of the input height/width instead of a constant.
+        """
+        N = self.pos_embed.shape[1] - 1
+        S = int(math.sqrt(N))
+        pos_embed = self.pos_embed.float()
+        class_pos_embed = pos_embed[:, 0]
+        grid = pos_embed[:, 1:].reshape(S, S, dim)
+        w0 = torch.as_tensor(w) // self.patch_size
+        h0 = torch.as_tensor(h) // self.patch_size
+        # upstream returns pos_embed unchanged for the native grid; a zero offset makes the resize an identity
+        native = ((w0 == S) & (h0 == S)).float()
+        offset = self.interpolate_offset * (1 - native)
+        weights_w = self._bicubic_weights(w0, S, (w0 + offset) / S)
+        weights_h = self._bicubic_weights(h0, S, (h0 + offset) / S)
+        patch_pos_embed = torch.einsum("as,bt,std->abd", weights_w, weights_h, grid).reshape(1, -1, dim)
+        return torch.cat((class_pos_embed.unsqueeze(0), patch_pos_embed), dim=1)
+
+    @staticmethod
+    def _bicubic_weights(out_size, in_size, scale_factor, A=-0.75):
+        src = (torch.arange(out_size, dtype=torch.float32) + 0.5) / scale_factor - 0.5
+        start = torch.floor(src)
+        t = (src - start)[:, None]
+        offsets = torch.arange(-1, 3, dtype=torch.float32)[None, :]
+        x = (t - offsets).abs()
+        # cubic convolution kernel for |x| <= 1 and 1 < |x| < 2
+        near = ((A + 2) * x - (A + 3)) * x * x + 1
+        far = ((A * x - 5 * A) * x + 8 * A) * x - 4 * A
+        coeffs = torch.where(x <= 1, near, far)
+        index = (start[:, None] + offsets).clamp(0, in_size - 1)
+        columns = torch.arange(in_size, dtype=torch.float32)
+        return ((index[:, :, None] == columns).float() * coeffs[:, :, None]).sum(1)
+
+    @torch.no_grad()
+    def precompute_pos_encoding(self, shapes, dtype=torch.float32):
+        """Fill the positional embedding cache for the given (h, w) input sizes in pixels."""
+        shapes = set(shapes)
+        if self.pos_embed_cache_size:
+            # room for every precomputed size, otherwise the LRU drops the first ones right away
+            self.pos_embed_cache_size = max(self.pos_embed_cache_size, len(shapes))
+        device = self.pos_embed.device
+        for h, w in shapes:
+            npatch = (h // self.patch_size) * (w // self.patch_size)
+            x = torch.empty((1, npatch + 1, self.embed_dim), dtype=dtype, device=device)
+            # prepare_tokens_with_masks passes the input height/width as (w, h)
+            self.interpolate_pos_encoding(x, h, w)
+
+    def clear_pos_embed_cache(self):
+        with self._pos_embed_cache_lock:
+            self._pos_embed_cache.clear()
+            self._pos_embed_cache_state = None
 
     def prepare_tokens_with_masks(self, x, masks=None):
         B, nc, w, h = x.shape
@@ -320,6 +418,12 @@ class DinoVisionTransformer(nn.Module):
             return tuple(zip(outputs, class_tokens))
         return tuple(outputs)
 
+    def set_attn_backend(self, attn_backend):
+        """Switch every attention layer to another backend (see dinov2_layers.attention.ATTENTION_BACKENDS)."""
+        for module in self.modules():
+            if isinstance(module, Attention):
+                module.set_backend(attn_backend)
+
     def forward(self, *args, is_training=False, **kwargs):
         ret = self.forward_features(*args, **kwargs)
         if is_training:
@@ -336,49 +440,49 @@ def init_weights_vit_timm(module: nn.Module, name: str = ""):
             nn.init.zeros_(module.bias)
 
 
-def vit_small(patch_size=16, num_register_tokens=0, **kwargs):
+def vit_small(patch_size=16, num_register_tokens=0, attn_backend="sdpa", **kwargs):
     model = DinoVisionTransformer(
         patch_size=patch_size,
         embed_dim=384,
         depth=12,
         num_heads=6,
         mlp_ratio=4,
-        block_fn=partial(Block, attn_class=MemEffAttention),
+        block_fn=partial(Block, attn_class=partial(MemEffAttention, attn_backend=attn_backend)),
         num_register_tokens=num_register_tokens,
         **kwargs,
     )
     return model
 
 
-def vit_base(patch_size=16, num_register_tokens=0, **kwargs):
+def vit_base(patch_size=16, num_register_tokens=0, attn_backend="sdpa", **kwargs):
     model = DinoVisionTransformer(
         patch_size=patch_size,
         embed_dim=768,
         depth=12,
         num_heads=12,
         mlp_ratio=4,
-        block_fn=partial(Block, attn_class=MemEffAttention),
+        block_fn=partial(Block, attn_class=partial(MemEffAttention, attn_backend=attn_backend)),
         num_register_tokens=num_register_tokens,
         **kwargs,
     )
     return model
 
 
-def vit_large(patch_size=16, num_register_tokens=0, **kwargs):
+def vit_large(patch_size=16, num_register_tokens=0, attn_backend="sdpa", **kwargs):
     model = DinoVisionTransformer(
         patch_size=patch_size,
         embed_dim=1024,
         depth=24,
         num_heads=16,
         mlp_ratio=4,
-        block_fn=partial(Block, attn_class=MemEffAttention),
+        block_fn=partial(Block, attn_class=partial(MemEffAttention, attn_backend=attn_backend)),
         num_register_tokens=num_register_tokens,
         **kwargs,
     )
     return model
 
 
-def vit_giant2(patch_size=16, num_register_tokens=0, **kwargs):
+def vit_giant2(patch_size=16, num_register_tokens=0, attn_backend="sdpa", **kwargs):
     """
     Close to ViT-giant, with embed-dim 1536 and 24 heads => embed-dim per head 64
     """
@@ -388,14 +492,14 @@ def vit_giant2(patch_size=16, num_register_tokens=0, **kwargs):
         depth=40,
         num_heads=24,
         mlp_ratio=4,
-        block_fn=partial(Block, attn_class=MemEffAttention),
+        block_fn=partial(Block, attn_class=partial(MemEffAttention, attn_backend=attn_backend)),
         num_register_tokens=num_register_tokens,
         **kwargs,
     )
     return model
 
 
-def DINOv2(model_name):
+def DINOv2(model_name, attn_backend="sdpa"):
     model_zoo = {
         "vits": vit_small, 
         "vitb": vit_base, 
@@ -411,5 +515,6 @@ def DINOv2(model_name):
         block_chunks=0,
         num_register_tokens=0,
         interpolate_antialias=False,
-        interpolate_offset=0.1
+        interpolate_offset=0.1,
+        attn_backend=attn_backend,
     )
\ No newline at end of file
@@ -12,6 +12,7 @@ import logging
 
 from torch import Tensor
 from torch import nn
+import torch.nn.functional as F
 
 
 logger = logging.getLogger("dinov2")
@@ -26,6 +27,12 @@ except ImportError:
     XFORMERS_AVAILABLE = False
 
 
+# "sdpa": fused torch scaled_dot_product_attention (default)
+# "reference": explicit softmax(q @ k^T) @ v, kept as the reference implementation
+# "xformers": xFormers memory_efficient_attention (MemEffAttention only)
+ATTENTION_BACKENDS = ("sdpa", "reference", "xformers")
+
+
 class Attention(nn.Module):
     def __init__(
         self,
@@ -35,8 +42,10 @@ class Attention(nn.Module):
         proj_bias: bool = True,
         attn_drop: float = 0.0,
         proj_drop: float = 0.0,
+        attn_backend: str = "sdpa",
     ) -> None:
         super().__init__()
+        self.set_backend(attn_backend)
         self.num_heads = num_heads
         head_dim = dim // num_heads
         self.scale = head_dim**-0.5
@@ -46,7 +55,30 @@ class Attention(nn.Module):
         self.proj = nn.Linear(dim, dim, bias=proj_bias)
         self.proj_drop = nn.Dropout(proj_drop)
 
+    def set_backend(self, attn_backend: str) -> None:
+        if attn_backend not in ATTENTION_BACKENDS:
+            raise ValueError(f"attn_backend {attn_backend} not in {ATTENTION_BACKENDS}")
+        self.attn_backend = attn_backend
+
     def forward(self, x: Tensor) -> Tensor:
+        if self.attn_backend == "reference":
+            return self.forward_reference(x)
+        return self.forward_sdpa(x)
+
+    def forward_sdpa(self, x: Tensor) -> Tensor:
+        B, N, C = x.shape
+        qkv = self.qkv(x).reshape(B, N, 3, self.num_heads, C // self.num_heads).permute(2, 0, 3, 1, 4)
+
+        q, k, v = qkv.unbind(0)
+        # default scale is head_dim**-0.5, same as self.scale
+        x = F.scaled_dot_product_attention(q, k, v, dropout_p=self.attn_drop.p if self.training else 0.0)
+
+        x = x.transpose(1, 2).reshape(B, N, C)
+        x = self.proj(x)
+        x = self.proj_drop(x)
+        return x
+
+    def forward_reference(self, x: Tensor) -> Tensor:
         B, N, C = x.shape
         qkv = self.qkv(x).reshape(B, N, 3, self.num_heads, C // self.num_heads).permute(2, 0, 3, 1, 4)
 
@@ -64,9 +96,9 @@ class Attention(nn.Module):
 
 class MemEffAttention(Attention):
     def forward(self, x: Tensor, attn_bias=None) -> Tensor:
-        if not XFORMERS_AVAILABLE:
-            assert attn_bias is None, "xFormers is required for nested tensors usage"
+        if attn_bias is None and (self.attn_backend != "xformers" or not XFORMERS_AVAILABLE):
             return super().forward(x)
+        assert XFORMERS_AVAILABLE, "xFormers is required for nested tensors usage"
 
         B, N, C = x.shape
         qkv = self.qkv(x).reshape(B, N, 3, self.num_heads, C // self.num_heads)
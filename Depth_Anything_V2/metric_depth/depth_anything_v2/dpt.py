@@ -1,12 +1,19 @@
-import cv2
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torchvision.transforms import Compose
 
 from .dinov2 import DINOv2
 from .util.blocks import FeatureFusionBlock, _make_scratch
-from .util.transform import Resize, NormalizeImage, PrepareForNet
+from .util.preprocess import Preprocessor
+from .util.transform import Resize
+
+
+# autocast dtype per precision name (None runs the stage in float32)
+PRECISIONS = {
+    'fp32': None,
+    'bf16': torch.bfloat16,
+    'fp16': torch.float16,
+}
 
 
 def _make_fusion_block(features, use_bn, size=None):
@@ -47,6 +54,7 @@ class DPTHead(nn.Module):
         super(DPTHead, self).__init__()
         
         self.use_clstoken = use_clstoken
+        self.output_fp32 = False
         
         self.projects = nn.ModuleList([
             nn.Conv2d(
@@ -142,8 +150,16 @@ class DPTHead(nn.Module):
         path_2 = self.scratch.refinenet2(path_3, layer_2_rn, size=layer_1_rn.shape[2:])
         path_1 = self.scratch.refinenet1(path_2, layer_1_rn)
         
+        if self.output_fp32:
+            # output convolutions and Sigmoid stay in float32 even under reduced-precision autocast
+            with torch.autocast(path_1.device.type, enabled=False):
+                return self._output(path_1.float(), patch_h, patch_w)
+        
+        return self._output(path_1, patch_h, patch_w)
+    
+    def _output(self, path_1, patch_h, patch_w):
         out = self.scratch.output_conv1(path_1)
-        out = F.interpolate(out, (int(patch_h * 14), int(patch_w * 14)), mode="bilinear", align_corners=True)
+        out = F.interpolate(out, (patch_h * 14, patch_w * 14), mode="bilinear", align_corners=True)
         out = self.scratch.output_conv2(out)
         
         return out
@@ -157,7 +173,9 @@ class DepthAnythingV2(nn.Module):
         out_channels=[256, 512, 1024, 1024], 
         use_bn=False, 
         use_clstoken=False,
-        max_depth=20.0
+        max_depth=20.0,
+        attn_backend='sdpa',
+        precision=None
     ):
         super(DepthAnythingV2, self).__init__()
         
@@ -171,52 +189,137 @@ class DepthAnythingV2(nn.Module):
         self.max_depth = max_depth
         
         self.encoder = encoder
-        self.pretrained = DINOv2(model_name=encoder)
+        self.pretrained = DINOv2(model_name=encoder, attn_backend=attn_backend)
         
         self.depth_head = DPTHead(self.pretrained.embed_dim, features, use_bn, out_channels=out_channels, use_clstoken=use_clstoken)
+        
+        self._preprocessors = {}
+        
+        self.set_precision(**(precision or {}))
+    
+    def set_precision(self, backbone='fp32', head='fp32', output='fp32'):
+        """Per-stage execution precision ('fp32', 'bf16' or 'fp16') through autocast.
+        
+        backbone: DINOv2 blocks; head: DPTHead projections and fusion blocks;
+        output: DPTHead output convolutions, Sigmoid and the max_depth scaling
+        ('fp32' keeps them in float32 whatever the other stages use; otherwise it must match head,
+        since the output convolutions run inside the head autocast region).
+        """
+        for stage in (backbone, head, output):
+            if stage not in PRECISIONS:
+                raise ValueError(f"precision {stage} not in {tuple(PRECISIONS)}")
+        if output not in ('fp32', head):
+            raise ValueError(f"output precision {output} needs head precision {output} (or output fp32), got head {head}")
+        
+        self.precision = {'backbone': backbone, 'head': head, 'output': output}
+        self.depth_head.output_fp32 = output == 'fp32' and head != 'fp32'
+    
+    @torch.no_grad()
+    def precompute_pos_encoding(self, shapes):
+        """Fill the backbone positional embedding cache for the given (h, w) input sizes.
+        
+        The cache is keyed by dtype, so the entries are built in the dtype the tokens have
+        under the configured backbone precision (found with a one-patch probe).
+        """
+        backbone = self.pretrained
+        device = backbone.pos_embed.device
+        probe = torch.zeros((1, 3, backbone.patch_size, backbone.patch_size), dtype=backbone.pos_embed.dtype, device=device)
+        with self._autocast('backbone', device.type):
+            tokens = backbone.patch_embed(probe)
+            dtype = torch.cat((backbone.cls_token.expand(1, -1, -1), tokens), dim=1).dtype
+        backbone.precompute_pos_encoding(shapes, dtype=dtype)
+    
+    def _autocast(self, stage, device_type):
+        dtype = PRECISIONS[self.precision[stage]]
+        return torch.autocast(device_type, dtype=dtype, enabled=dtype is not None)
     
     def forward(self, x):
         patch_h, patch_w = x.shape[-2] // 14, x.shape[-1] // 14
         
-        features = self.pretrained.get_intermediate_layers(x, self.intermediate_layer_idx[self.encoder], return_class_token=True)
+        with self._autocast('backbone', x.device.type):
+            features = self.pretrained.get_intermediate_layers(x, self.intermediate_layer_idx[self.encoder], return_class_token=True)
+        
+        if self.precision['head'] == 'fp32':
+            features = tuple((out.float(), cls_token.float()) for out, cls_token in features)
+        
+        with self._autocast('head', x.device.type):
+            depth = self.depth_head(features, patch_h, patch_w)
         
-        depth = self.depth_head(features, patch_h, patch_w) * self.max_depth
+        if self.precision['output'] == 'fp32':
+            depth = depth.float()
         
-        return depth.squeeze(1)
+        depth = depth * self.max_depth
+        
+        # callers always get float32 metric depth
+        return depth.float().squeeze(1)
+    
+    @torch.no_grad()
+    def infer_image(self, raw_image, input_size=518, channel_order='BGR'):
+        depth, _ = self.infer_image_lowres(raw_image, input_size, channel_order)
+        
+        h, w = raw_image.shape[:2]
+        
+        return self.upsample_depth(depth, (h, w)).cpu().numpy()
     
     @torch.no_grad()
-    def infer_image(self, raw_image, input_size=518):
-        image, (h, w) = self.image2tensor(raw_image, input_size)
+    def infer_image_lowres(self, raw_image, input_size=518, channel_order='BGR'):
+        """Depth at network resolution, left on the model device (no upsampling, no copy to numpy).
         
-        depth = self.forward(image)
+        Returns the (h', w') depth tensor and the (scale_y, scale_x) factors that map raw image
+        pixel coordinates into it.
+        """
+        image, (h, w) = self.image2tensor(raw_image, input_size, channel_order)
         
-        depth = F.interpolate(depth[:, None], (h, w), mode="bilinear", align_corners=True)[0, 0]
+        depth = self.forward(image)[0]
         
-        return depth.cpu().numpy()
+        return depth, (depth.shape[0] / h, depth.shape[1] / w)
     
-    def image2tensor(self, raw_image, input_size=518):        
-        transform = Compose([
-            Resize(
-                width=input_size,
-                height=input_size,
-                resize_target=False,
-                keep_aspect_ratio=True,
-                ensure_multiple_of=14,
-                resize_method='lower_bound',
-                image_interpolation_method=cv2.INTER_CUBIC,
-            ),
-            NormalizeImage(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-            PrepareForNet(),
-        ])
+    @torch.no_grad()
+    def infer_batch(self, raw_images, input_size=518, channel_order='BGR'):
+        """Run a single batched forward over images that share the same network input shape."""
+        return [
+            self.upsample_depth(depth, raw_image.shape[:2]).cpu().numpy()
+            for raw_image, (depth, _) in zip(raw_images, self.infer_batch_lowres(raw_images, input_size, channel_order))
+        ]
+    
+    @torch.no_grad()
+    def infer_batch_lowres(self, raw_images, input_size=518, channel_order='BGR'):
+        """Batched counterpart of infer_image_lowres."""
+        images, sizes = self.get_preprocessor(input_size, channel_order).batch(raw_images)
         
-        h, w = raw_image.shape[:2]
+        depth = self.forward(images)
         
-        image = cv2.cvtColor(raw_image, cv2.COLOR_BGR2RGB) / 255.0
+        return [(depth[i], (depth.shape[1] / h, depth.shape[2] / w)) for i, (h, w) in enumerate(sizes)]
+    
+    @staticmethod
+    def upsample_depth(depth, size):
+        """Bilinearly upsample a (h', w') network-resolution depth to the raw image size (h, w)."""
+        return F.interpolate(depth[None, None], tuple(size), mode="bilinear", align_corners=True)[0, 0]
+    
+    @staticmethod
+    def get_input_shape(raw_h, raw_w, input_size=518):
+        """Network input (h, w) that image2tensor produces for a raw image of this size."""
+        width, height = Resize(
+            width=input_size,
+            height=input_size,
+            resize_target=False,
+            keep_aspect_ratio=True,
+            ensure_multiple_of=14,
+            resize_method='lower_bound',
+        ).get_size(raw_w, raw_h)
         
-        image = transform({'image': image})['image']
-        image = torch.from_numpy(image).unsqueeze(0)
+        return int(height), int(width)
+    
+    def get_preprocessor(self, input_size=518, channel_order='BGR'):
+        """Preprocessor for this input size and channel order, on the device the model lives on."""
+        device = next(self.parameters()).device
+        key = (input_size, channel_order, device)
         
-        DEVICE = 'cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'
-        image = image.to(DEVICE)
+        if key not in self._preprocessors:
+            self._preprocessors[key] = Preprocessor(input_size, device=device, channel_order=channel_order)
         
-        return image, (h, w)
+        return self._preprocessors[key]
+    
+    def image2tensor(self, raw_image, input_size=518, channel_order='BGR'):
+        """The returned tensor is a per-thread buffer reused by the next call (see Preprocessor)."""
+        return self.get_preprocessor(input_size, channel_order)(raw_image)
@@ -0,0 +1,151 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import torch
+
+from .transform import Resize
+
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+class Preprocessor(object):
+    """Single-pass float32 replacement for the Resize -> NormalizeImage -> PrepareForNet pipeline.
+
+    The image is resized once (same target size as Resize with keep_aspect_ratio,
+    ensure_multiple_of=14 and lower_bound), uploaded without an intermediate float64 copy and
+    normalized in place with fused float32 ops into a reusable per-thread buffer. The device
+    is resolved once at construction. By default the result matches the original pipeline to
+    float32 precision.
+
+    The returned tensors are owned by the preprocessor: they stay valid until the next call
+    from the same thread.
+    """
+
+    def __init__(
+        self,
+        input_size=518,
+        device="cpu",
+        channel_order="RGB",
+        mean=IMAGENET_MEAN,
+        std=IMAGENET_STD,
+        interpolation=cv2.INTER_CUBIC,
+        exact_resize=True,
+        max_cached_shapes=8,
+    ):
+        """Init.
+
+        Args:
+            input_size (int): lower bound for the shorter network side
+            device (str or torch.device): device the tensors are produced on
+            channel_order (str): channel order of the raw images, "RGB" or "BGR"
+            mean, std (tuple): per-channel normalization on the [0, 1] scale
+            interpolation (int): cv2 interpolation used for the resize
+            exact_resize (bool):
+                True: resize in float32, matching the original float64 pipeline to float32 precision.
+                False: resize the uint8 image (faster, not equivalent: resampled pixels are rounded
+                to uint8 and cubic overshoot is clipped; on noisy images up to ~1.1 normalized units
+                per pixel, ~0.008 on average).
+                Defaults to True.
+            max_cached_shapes (int): number of (batch, h, w) buffers kept per thread
+        """
+        if channel_order not in ("RGB", "BGR"):
+            raise ValueError(f"channel_order {channel_order} not supported")
+
+        self.input_size = input_size
+        self.device = torch.device(device)
+        self.channel_order = channel_order
+        self.interpolation = interpolation
+        self.exact_resize = exact_resize
+        self.max_cached_shapes = max_cached_shapes
+
+        self.resizer = Resize(
+            width=input_size,
+            height=input_size,
+            resize_target=False,
+            keep_aspect_ratio=True,
+            ensure_multiple_of=14,
+            resize_method="lower_bound",
+            image_interpolation_method=interpolation,
+        )
+
+        # (x / 255 - mean) / std == x * scale - shift
+        mean = torch.tensor(mean, dtype=torch.float32).view(3, 1, 1)
+        std = torch.tensor(std, dtype=torch.float32).view(3, 1, 1)
+        self.scale = (1.0 / (255.0 * std)).to(self.device)
+        self.shift = (mean / std).to(self.device)
+
+        self._local = threading.local()
+
+    def get_size(self, raw_h, raw_w):
+        """Network input (h, w) for a raw image of this size."""
+        width, height = self.resizer.get_size(raw_w, raw_h)
+        return int(height), int(width)
+
+    def __call__(self, raw_image, size=None):
+        """Returns the (1, 3, h, w) float32 tensor and the raw (h, w).
+
+        size: optional (h, w) network size overriding the aspect-preserving one (e.g. a shape bucket).
+        """
+        h, w = raw_image.shape[:2]
+        out = self._buffer(1, *(size or self.get_size(h, w)))
+        self._fill(out[0], raw_image)
+        return out, (h, w)
+
+    def batch(self, raw_images):
+        """Returns a (N, 3, h, w) tensor for images sharing the same network shape, and the raw sizes."""
+        sizes = [raw_image.shape[:2] for raw_image in raw_images]
+        shapes = {self.get_size(h, w) for h, w in sizes}
+        if len(shapes) != 1:
+            raise ValueError("batch requires images with the same network input shape")
+
+        out = self._buffer(len(raw_images), *shapes.pop())
+        for i, raw_image in enumerate(raw_images):
+            self._fill(out[i], raw_image)
+        return out, sizes
+
+    def _fill(self, out, raw_image):
+        image = self._to_rgb(raw_image)
+        height, width = out.shape[-2:]
+        if image.shape[:2] != (height, width):
+            if self.exact_resize:
+                image = image.astype(np.float32)
+            image = cv2.resize(image, (width, height), interpolation=self.interpolation)
+        elif not image.flags.writeable:
+            # torch.from_numpy does not accept read-only buffers (e.g. np.asarray of a PIL image)
+            image = image.copy()
+
+        # HWC -> CHW float32 conversion happens inside copy_, on the target device
+        out.copy_(torch.from_numpy(image).to(self.device, non_blocking=True).permute(2, 0, 1))
+        out.mul_(self.scale).sub_(self.shift)
+
+    def _to_rgb(self, raw_image):
+        if raw_image.dtype != np.uint8:
+            raise TypeError(f"expected a uint8 image, got {raw_image.dtype}")
+        if raw_image.ndim == 2:
+            return cv2.cvtColor(raw_image, cv2.COLOR_GRAY2RGB)
+        if raw_image.shape[2] == 4:
+            code = cv2.COLOR_BGRA2RGB if self.channel_order == "BGR" else cv2.COLOR_RGBA2RGB
+            return cv2.cvtColor(raw_image, code)
+        if self.channel_order == "BGR":
+            return cv2.cvtColor(raw_image, cv2.COLOR_BGR2RGB)
+        return np.ascontiguousarray(raw_image)
+
+    def _buffer(self, n, height, width):
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = OrderedDict()
+
+        key = (n, height, width)
+        out = buffers.get(key)
+        if out is None:
+            out = torch.empty((n, 3, height, width), dtype=torch.float32, device=self.device)
+            buffers[key] = out
+            if len(buffers) > self.max_cached_shapes:
+                buffers.popitem(last=False)
+        else:
+            buffers.move_to_end(key)
+        return out
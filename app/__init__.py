@@ -1,8 +1,133 @@
+import logging
+
 from flask import Flask
 
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__)
 
+    # configurações padrão, sobrescritas pelo test_config quando informado
+    from app.config import Config, model_options, gate_options, tracker_options, cache_options
+    app.config.from_object(Config)
+    if test_config is not None:
+        app.config.from_mapping(test_config)
+
+    # logs da aplicação na saída de erro (sem efeito se o logging já foi configurado)
+    logging.basicConfig(level=app.config['LOG_LEVEL'], format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    # carregando os modelos uma única vez por processo
+    from app.models import registry
+    if app.config['MODELS_PRELOAD'] and app.config['PREFORK_SHARED_WEIGHTS']:
+        # no processo mestre do gunicorn, antes do fork dos workers (ver app.prefork)
+        from app.prefork import load_before_fork
+        load_before_fork(registry, warmup=app.config['MODELS_WARMUP'], **model_options(app.config))
+    elif app.config['MODELS_PRELOAD']:
+        registry.load(warmup=app.config['MODELS_WARMUP'], **model_options(app.config))
+    app.extensions['models'] = registry
+
+    # agendador de micro-lotes (opcional)
+    if app.config['BATCHING_ENABLED']:
+        from app.batching import BatchScheduler
+        app.extensions['batcher'] = BatchScheduler(
+            registry,
+            window_ms=app.config['BATCH_WINDOW_MS'],
+            max_batch_size=app.config['BATCH_MAX_SIZE'],
+        )
+
+    # execução concorrente de YOLO e profundidade (opcional)
+    if app.config['PIPELINE_CONCURRENT']:
+        from app.pipeline import ConcurrentPipeline
+        app.extensions['pipeline'] = ConcurrentPipeline(
+            registry,
+            yolo_threads=app.config['PIPELINE_YOLO_THREADS'],
+            depth_threads=app.config['PIPELINE_DEPTH_THREADS'],
+            max_concurrency=app.config['PIPELINE_MAX_CONCURRENCY'],
+        )
+
+    # processamento de lotes enviados a /process_batch (opcional)
+    if app.config['PROCESS_BATCH_ENABLED']:
+        from app.batch import BatchProcessor
+        app.extensions['batch_processor'] = BatchProcessor(
+            registry,
+            batch_size=app.config['PROCESS_BATCH_SIZE'],
+            decode_workers=app.config['PROCESS_BATCH_DECODE_WORKERS'],
+            draft=app.config['IMAGE_DRAFT_DECODE'],
+        )
+
+    # controle de admissão por prazo, com as latências medidas pelo registro de modelos (opcional)
+    if app.config['ADMISSION_CONTROL']:
+        from app.admission import AdmissionController, LatencyEstimates
+        registry.latencies = LatencyEstimates(
+            history=app.config['ADMISSION_HISTORY'],
+            quantile=app.config['ADMISSION_QUANTILE'],
+        )
+        app.extensions['admission'] = AdmissionController(
+            registry.latencies,
+            sizes=app.config['DEPTH_INPUT_SIZES'],
+            safety=app.config['ADMISSION_SAFETY'],
+        )
+
+    # sessões de quadros enviados em requisições separadas (/process_frame)
+    from app.video import FrameSessions
+    app.extensions['frame_sessions'] = FrameSessions(
+        ttl_s=app.config['FRAME_SESSION_TTL_S'],
+        max_sessions=app.config['FRAME_SESSION_MAX'],
+        gate_options=gate_options(app.config),
+        tracker_options=tracker_options(app.config),
+    )
+
+    # cache de resultados por conteúdo da imagem (opcional)
+    if app.config['RESULT_CACHE']:
+        from app.cache import ResultCache
+        app.extensions['result_cache'] = ResultCache(**cache_options(app.config))
+
+    # fila de jobs assíncronos (opcional)
+    if app.config['JOBS_ENABLED']:
+        from app.jobs import JobQueue, JobStore
+        store = None
+        if app.config['JOBS_STORE_DIR']:
+            store = JobStore(app.config['JOBS_STORE_DIR'], result_ttl_s=app.config['JOBS_RESULT_TTL_S'])
+        app.extensions['jobs'] = JobQueue(
+            workers=app.config['JOBS_WORKERS'],
+            max_queue=app.config['JOBS_MAX_QUEUE'],
+            result_ttl_s=app.config['JOBS_RESULT_TTL_S'],
+            store=store,
+        )
+
+    # política de resolução adaptativa da profundidade (opcional)
+    if app.config['DEPTH_ADAPTIVE_RESOLUTION']:
+        from app.resolution import ResolutionPolicy
+        # fila = imagens em processamento (ver main._process_image) mais os jobs ainda não iniciados;
+        # os micro-lotes pendentes já são requisições em processamento
+        app.extensions['resolution'] = ResolutionPolicy(
+            sizes=app.config['DEPTH_INPUT_SIZES'],
+            min_box_pixels=app.config['DEPTH_MIN_BOX_PIXELS'],
+            queue_thresholds=app.config['DEPTH_QUEUE_THRESHOLDS'],
+            backlog=[app.extensions['jobs']] if 'jobs' in app.extensions else [],
+        )
+
+    # threads de fundo; com workers pré-forkados, iniciadas em cada worker depois do fork (ver app.prefork)
+    services = [app.extensions[name] for name in ('batcher', 'jobs') if name in app.extensions]
+    if app.config['PREFORK_SHARED_WEIGHTS']:
+        from app.prefork import start_after_fork
+        start_after_fork(*services)
+    else:
+        for service in services:
+            service.start()
+
+    # métricas do Prometheus: contagem e duração das requisições e profundidade das filas (opcional);
+    # desligadas, as métricas do pipeline (etapas, modelos, erros) também deixam de ser atualizadas
+    from app.metrics import metrics, instrument
+    metrics.enabled = app.config['METRICS_ENABLED']
+    if app.config['METRICS_ENABLED']:
+        instrument(app)
+        for name, help, service in (
+            ("fila_jobs", "Jobs assíncronos esperando na fila", app.extensions.get('jobs')),
+            ("fila_lote", "Requisições esperando o próximo micro-lote", app.extensions.get('batcher')),
+        ):
+            if service is not None:
+                metrics.gauge(name, help, lambda service=service: service.pending)
+        app.extensions['metrics'] = metrics
+
     # importando e registrando blueprints
     from app.main import main_bp
     app.register_blueprint(main_bp)
@@ -0,0 +1,153 @@
+import time
+import threading
+from collections import Counter, defaultdict, deque
+
+import numpy as np
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dpt import DepthAnythingV2
+
+# do encoder mais leve para o mais pesado
+ENCODER_ORDER = ("vits", "vitb", "vitl")
+
+# níveis de qualidade, do melhor para o pior
+TIERS = ("completa", "resolucao_reduzida", "encoder_leve", "somente_deteccoes")
+
+
+def parse_deadline(value):
+    """Prazo da requisição em ms (campo `deadline_ms` ou cabeçalho X-Deadline-Ms); None sem prazo"""
+    if value in (None, ""):
+        return None
+    try:
+        deadline_ms = float(value)
+    except ValueError:
+        deadline_ms = 0
+    if deadline_ms <= 0:
+        raise ValueError(f"Prazo inválido: {value}. Informe um tempo em ms maior que zero")
+    return deadline_ms
+
+
+def depth_work(image_size, input_size):
+    """Megapixels da entrada da rede de profundidade para uma imagem (largura, altura)"""
+    height, width = DepthAnythingV2.get_input_shape(image_size[1], image_size[0], input_size)
+    return height * width / 1e6
+
+
+class LatencyEstimates:
+    """Latências recentes de cada etapa, normalizadas pelo trabalho feito.
+
+    As amostras são guardadas por unidade de trabalho (por imagem no YOLO, por megapixel de
+    entrada na profundidade), então a estimativa vale para qualquer tamanho de entrada do mesmo
+    encoder. A estimativa é o quantil `quantile` das últimas `history` amostras, mais conservador
+    que a média quando a latência oscila.
+    """
+
+    def __init__(self, history=64, quantile=0.9):
+        self.quantile = quantile
+        self._samples = defaultdict(lambda: deque(maxlen=history))
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, work=1.0):
+        with self._lock:
+            self._samples[stage].append(seconds / work)
+
+    def estimate(self, stage, work=1.0):
+        """Segundos estimados da etapa para `work` unidades; None sem amostras"""
+        with self._lock:
+            samples = list(self._samples.get(stage, ()))
+        if not samples:
+            return None
+        return float(np.quantile(samples, self.quantile)) * work
+
+    def snapshot(self):
+        with self._lock:
+            stages = {stage: list(samples) for stage, samples in self._samples.items()}
+        return {
+            stage: {
+                "amostras": len(samples),
+                "p50_ms": round(float(np.quantile(samples, 0.5)) * 1000, 2),
+                f"p{round(self.quantile * 100)}_ms": round(float(np.quantile(samples, self.quantile)) * 1000, 2),
+            }
+            for stage, samples in stages.items() if samples
+        }
+
+
+class DepthPlan:
+    """Como a profundidade de uma requisição com prazo será calculada"""
+
+    def __init__(self, tier, encoder=None, input_size=None, reason=""):
+        self.tier = tier
+        self.encoder = encoder
+        self.input_size = input_size
+        self.reason = reason
+
+    @property
+    def depth(self):
+        return self.tier != "somente_deteccoes"
+
+
+class AdmissionController:
+    """Controle de admissão por prazo para /process_image.
+
+    Antes da detecção, a requisição é rejeitada se nem o YOLO cabe no tempo restante. Depois
+    dela, a profundidade é planejada com o tempo que sobrou: tamanho de entrada pedido, tamanhos
+    menores de `sizes`, encoders mais leves já residentes (carregar um modelo estouraria o prazo)
+    e, por fim, só as detecções. As estimativas (multiplicadas por `safety`) vêm de
+    LatencyEstimates; etapas ainda sem amostras são consideradas viáveis.
+    """
+
+    def __init__(self, estimates, sizes=(266, 364, 518), safety=1.2):
+        self.estimates = estimates
+        self.sizes = sorted(sizes, reverse=True)
+        self.safety = safety
+        self.tiers = Counter()
+        self.misses = Counter()
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _fits(self, stage, work, remaining):
+        estimate = self.estimates.estimate(stage, work)
+        return estimate is None or estimate * self.safety <= remaining
+
+    def admit(self, deadline):
+        """False quando a detecção não termina antes do prazo (a requisição deve ser rejeitada)"""
+        remaining = deadline - time.monotonic()
+        if remaining > 0 and self._fits("yolo", 1.0, remaining):
+            return True
+        with self._lock:
+            self.rejected += 1
+        return False
+
+    def plan(self, deadline, image_size, encoder, input_size, resident_encoders=()):
+        """DepthPlan que cabe no tempo restante até `deadline` (time.monotonic)"""
+        post = self.estimates.estimate("pos_processamento") or 0.0
+        remaining = deadline - time.monotonic() - post * self.safety
+
+        lighter = [e for e in ENCODER_ORDER[:ENCODER_ORDER.index(encoder)] if e in resident_encoders]
+        candidates = [(encoder, input_size, "completa")]
+        candidates += [(encoder, size, "resolucao_reduzida") for size in self.sizes if size < input_size]
+        candidates += [(e, size, "encoder_leve") for e in reversed(lighter) for size in self.sizes if size <= input_size]
+
+        for candidate_encoder, size, tier in candidates:
+            if self._fits(f"profundidade/{candidate_encoder}", depth_work(image_size, size), remaining):
+                plan = DepthPlan(tier, candidate_encoder, size, f"prazo: {candidate_encoder} em {size} px")
+                break
+        else:
+            plan = DepthPlan("somente_deteccoes", reason="prazo insuficiente para a profundidade")
+
+        with self._lock:
+            self.tiers[plan.tier] += 1
+        return plan
+
+    def finish(self, tier, deadline):
+        """Conta a requisição como prazo perdido se terminou depois do `deadline`"""
+        if time.monotonic() > deadline:
+            with self._lock:
+                self.misses[tier] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "niveis": {tier: self.tiers[tier] for tier in TIERS},
+                "prazos_perdidos": {tier: self.misses[tier] for tier in TIERS},
+                "rejeitadas": self.rejected,
+                "latencias": self.estimates.snapshot(),
+            }
@@ -0,0 +1,165 @@
+import os
+import importlib.util
+from abc import ABC, abstractmethod
+import torch
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dpt import DepthAnythingV2
+from Depth_Anything_V2.metric_depth.depth_anything_v2.util.preprocess import Preprocessor
+
+# "torch": modelos eager do PyTorch (DepthAnythingV2 e ultralytics)
+# "onnx": ONNX Runtime na CPU, a partir dos modelos exportados (gerados na primeira carga)
+BACKENDS = ("torch", "onnx")
+# pacotes do backend 'onnx' (exportação e execução), em requirements.txt
+ONNX_PACKAGES = ("onnx", "onnxruntime")
+
+
+def check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de inferência inválido: {backend}. Use um de {BACKENDS}")
+    if backend == "onnx":
+        missing = [name for name in ONNX_PACKAGES if importlib.util.find_spec(name) is None]
+        if missing:
+            raise ValueError(f"O backend 'onnx' requer os pacotes {', '.join(missing)} (ver requirements.txt)")
+
+
+def onnx_path(weights_path):
+    """Caminho do modelo ONNX exportado a partir de um checkpoint/pesos do PyTorch"""
+    root, _ = os.path.splitext(weights_path)
+    return f"{root}.onnx"
+
+
+@torch.no_grad()
+def export_depth_onnx(model, path, opset=17, sample_size=(518, 686)):
+    """Exporta o DepthAnythingV2 (float32) para ONNX com lote, altura e largura dinâmicos.
+    sample_size: (h, w) da entrada usada no tracing; qualquer múltiplo de 14 é aceito depois."""
+    model.eval()
+    torch.onnx.export(
+        model,
+        torch.zeros((1, 3, *sample_size)),
+        path,
+        input_names=["image"],
+        output_names=["depth"],
+        dynamic_axes={"image": {0: "batch", 2: "height", 3: "width"}, "depth": {0: "batch", 1: "height", 2: "width"}},
+        opset_version=opset,
+        dynamo=False,
+    )
+    return path
+
+
+def export_yolo_onnx(weights):
+    """Exporta o YOLO para ONNX (entrada dinâmica), ao lado dos pesos; devolve o caminho gerado"""
+    from ultralytics import YOLO
+    return YOLO(weights).export(format="onnx", dynamic=True)
+
+
+class DepthBackend(ABC):
+    """Interface dos backends de profundidade usados por generate_depth_map e afins.
+
+    infer_image_lowres(raw_image, input_size, channel_order) -> (profundidade (h', w') em torch, (escala_y, escala_x))
+    infer_batch_lowres(raw_images, input_size, channel_order) -> lista de (profundidade, escala)
+    infer_image(raw_image, input_size, channel_order) -> mapa HxW em metros (numpy)
+    memory_bytes() -> memória ocupada pelos pesos (usada no orçamento do ModelRegistry)
+    """
+    name = None
+
+    @abstractmethod
+    def memory_bytes(self):
+        ...
+
+    @abstractmethod
+    def infer_image_lowres(self, raw_image, input_size=518, channel_order='BGR'):
+        ...
+
+    @abstractmethod
+    def infer_batch_lowres(self, raw_images, input_size=518, channel_order='BGR'):
+        ...
+
+    def infer_image(self, raw_image, input_size=518, channel_order='BGR'):
+        depth, _ = self.infer_image_lowres(raw_image, input_size, channel_order)
+        return DepthAnythingV2.upsample_depth(depth, raw_image.shape[:2]).cpu().numpy()
+
+
+class TorchDepthBackend(DepthBackend):
+    """DepthAnythingV2 (ou CompiledDepthModel) executado pelo PyTorch; os demais atributos
+    são repassados ao modelo."""
+    name = "torch"
+
+    def __init__(self, model):
+        self.model = model
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def infer_image_lowres(self, raw_image, input_size=518, channel_order='BGR'):
+        return self.model.infer_image_lowres(raw_image, input_size, channel_order)
+
+    def infer_batch_lowres(self, raw_images, input_size=518, channel_order='BGR'):
+        return self.model.infer_batch_lowres(raw_images, input_size, channel_order)
+
+    def infer_image(self, raw_image, input_size=518, channel_order='BGR'):
+        return self.model.infer_image(raw_image, input_size, channel_order)
+
+    def memory_bytes(self):
+        # state_dict inclui os pesos empacotados das camadas quantizadas (tuplas de tensores)
+        total = 0
+        for value in self.model.state_dict().values():
+            for tensor in (value if isinstance(value, tuple) else (value,)):
+                if isinstance(tensor, torch.Tensor):
+                    total += tensor.numel() * tensor.element_size()
+        return total
+
+
+class OnnxDepthBackend(DepthBackend):
+    """DepthAnythingV2 exportado, executado pelo ONNX Runtime na CPU.
+    O pré-processamento é o mesmo do PyTorch (Preprocessor) e a saída volta como tensor torch."""
+    name = "onnx"
+
+    def __init__(self, path, threads=0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._preprocessors = {}
+
+    def get_preprocessor(self, input_size=518, channel_order='BGR'):
+        key = (input_size, channel_order)
+        if key not in self._preprocessors:
+            self._preprocessors[key] = Preprocessor(input_size, "cpu", channel_order)
+        return self._preprocessors[key]
+
+    def memory_bytes(self):
+        # os pesos do grafo exportado são carregados integralmente pela sessão
+        return os.path.getsize(self.path)
+
+    def _run(self, images):
+        return torch.from_numpy(self.session.run(None, {"image": images.numpy()})[0])
+
+    def infer_image_lowres(self, raw_image, input_size=518, channel_order='BGR'):
+        image, (h, w) = self.get_preprocessor(input_size, channel_order)(raw_image)
+        depth = self._run(image)[0]
+        return depth, (depth.shape[0] / h, depth.shape[1] / w)
+
+    def infer_batch_lowres(self, raw_images, input_size=518, channel_order='BGR'):
+        images, sizes = self.get_preprocessor(input_size, channel_order).batch(raw_images)
+        depth = self._run(images)
+        return [(depth[i], (depth.shape[1] / h, depth.shape[2] / w)) for i, (h, w) in enumerate(sizes)]
+
+
+class YoloBackend:
+    """YOLO do ultralytics usado por detect_objects: pesos .pt rodam no PyTorch e .onnx no
+    ONNX Runtime (o ultralytics faz o pré e pós-processamento, incluindo o NMS, nos dois casos)."""
+
+    def __init__(self, weights):
+        from ultralytics import YOLO
+
+        self.weights = weights
+        self.name = "onnx" if weights.endswith(".onnx") else "torch"
+        self.model = YOLO(weights, task="detect")
+
+    def __call__(self, images, **kwargs):
+        return self.model(images, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
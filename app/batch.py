@@ -0,0 +1,165 @@
+import json
+import time
+import zipfile
+from io import BytesIO
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dpt import DepthAnythingV2
+
+from app.ingest import decode_image
+from app.metrics import DETECTIONS, ERRORS
+from app.utils import calculate_object_distances, format_description
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")
+
+
+def iter_uploads(files, max_images=None):
+    """Imagens enviadas a /process_batch como pares (nome, bytes), lidas uma a uma.
+
+    files: arquivos do campo `images` (request.files.getlist); cada um pode ser uma imagem ou
+    um .zip, cujos membros com extensão de imagem são lidos em ordem. Com mais de `max_images`
+    imagens levanta ValueError."""
+    count = 0
+    for file in files:
+        if file.filename.lower().endswith(".zip"):
+            with zipfile.ZipFile(file.stream) as archive:
+                for member in archive.infolist():
+                    if member.is_dir() or not member.filename.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    count += 1
+                    if max_images is not None and count > max_images:
+                        raise ValueError(f"O lote passa do limite de {max_images} imagens.")
+                    yield member.filename, archive.read(member)
+        else:
+            count += 1
+            if max_images is not None and count > max_images:
+                raise ValueError(f"O lote passa do limite de {max_images} imagens.")
+            yield file.filename, file.stream.read()
+
+
+def decode_upload(data, draft=True):
+    """Decodifica os bytes de uma imagem em um DecodedImage (executado no pool de decodificação)"""
+    return decode_image(BytesIO(data), draft=draft)
+
+
+def ndjson(record):
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+class BatchProcessor:
+    """Processa muitas imagens de uma requisição com forwards em lote, devolvendo um registro
+    por imagem assim que ele fica pronto.
+
+    A decodificação roda em `decode_workers` threads, com no máximo 2 * `batch_size` imagens
+    decodificadas ou em decodificação ao mesmo tempo, de modo que a memória não cresce com o
+    tamanho do lote enviado. A cada `batch_size` imagens decodificadas o YOLO roda uma vez para
+    todas, e a profundidade roda uma vez por formato de entrada da rede (como no BatchScheduler).
+    """
+
+    def __init__(self, models, batch_size=8, decode_workers=4, draft=True):
+        self.models = models
+        self.batch_size = batch_size
+        self.draft = draft
+        self._decoder = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="decode")
+
+    def shutdown(self):
+        self._decoder.shutdown(wait=False, cancel_futures=True)
+
+    def process(self, uploads, statistic=("percentile", 50.0), index_min_boxes=None, input_size=518,
+                encoder=None, dataset=None):
+        """Gera os registros (dicts) de cada imagem, na ordem em que terminam, e por último o resumo.
+        uploads: iterável de (nome, bytes), ver iter_uploads. Se ele levantar ValueError (lote acima
+        do limite), as imagens já lidas são processadas e o erro sai como registro antes do resumo."""
+        t0 = time.perf_counter()
+        counts = defaultdict(int)
+        pending = deque()
+        uploads = enumerate(uploads)
+        stopped = []
+
+        def fill():
+            while not stopped and len(pending) < 2 * self.batch_size:
+                try:
+                    item = next(uploads, None)
+                except ValueError as e:
+                    stopped.append(str(e))
+                    return
+                if item is None:
+                    return
+                index, (name, data) = item
+                pending.append((index, name, self._decoder.submit(decode_upload, data, self.draft)))
+
+        fill()
+        while pending:
+            chunk = []
+            while pending and len(chunk) < self.batch_size:
+                index, name, future = pending.popleft()
+                try:
+                    chunk.append((index, name, future.result()))
+                except Exception as e:
+                    counts["erros"] += 1
+                    ERRORS.inc(causa="lote")
+                    yield {"indice": index, "nome": name, "error": f"Imagem inválida: {str(e)}"}
+            # as próximas imagens são decodificadas enquanto os modelos processam este lote
+            fill()
+            if not chunk:
+                continue
+
+            for record in self._process_chunk(chunk, statistic, index_min_boxes, input_size, encoder, dataset):
+                counts["erros" if "error" in record else "processadas"] += 1
+                if "error" in record:
+                    ERRORS.inc(causa="lote")
+                yield record
+
+        if stopped:
+            ERRORS.inc(causa="lote")
+            yield {"error": stopped[0]}
+
+        elapsed = time.perf_counter() - t0
+        total = counts["processadas"] + counts["erros"]
+        yield {"resumo": {
+            "imagens": total,
+            "processadas": counts["processadas"],
+            "erros": counts["erros"],
+            "interrompido": bool(stopped),
+            "tempo_total_s": round(elapsed, 3),
+            "imagens_por_segundo": round(total / elapsed, 2) if elapsed else None,
+        }}
+
+    def _process_chunk(self, chunk, statistic, index_min_boxes, input_size, encoder, dataset):
+        try:
+            detections = self.models.detect_batch([image for _, _, image in chunk])
+        except Exception as e:
+            for index, name, _ in chunk:
+                yield {"indice": index, "nome": name, "error": f"Erro inesperado: {str(e)}"}
+            return
+
+        # imagens sem detecções saem logo; as demais são agrupadas pelo formato de entrada da rede
+        buckets = defaultdict(list)
+        for (index, name, image), image_detections in zip(chunk, detections):
+            DETECTIONS.observe(len(image_detections))
+            if len(image_detections) == 0:
+                yield {"indice": index, "nome": name, "error": "Nenhum objeto detectado na imagem."}
+            else:
+                shape = DepthAnythingV2.get_input_shape(image.size[1], image.size[0], input_size)
+                buckets[shape].append((index, name, image, image_detections))
+
+        for items in buckets.values():
+            try:
+                depth_maps = self.models.depth_batch(
+                    [image for _, _, image, _ in items], input_size, encoder, dataset
+                )
+            except Exception as e:
+                for index, name, _, _ in items:
+                    yield {"indice": index, "nome": name, "error": f"Erro inesperado: {str(e)}"}
+                continue
+
+            for (index, name, image, image_detections), depth_map in zip(items, depth_maps):
+                results = calculate_object_distances(image_detections, depth_map, statistic, index_min_boxes)
+                description = format_description(results, image.size[0])
+                yield {
+                    "indice": index,
+                    "nome": name,
+                    "descricao": description,
+                    "resultados": image.restore_boxes(results),
+                }
@@ -0,0 +1,124 @@
+import time
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dpt import DepthAnythingV2
+
+
+class _Job:
+    __slots__ = ("image", "shape", "future")
+
+    def __init__(self, image, shape):
+        self.image = image
+        self.shape = shape
+        self.future = Future()
+
+
+class BatchScheduler:
+    """Agrupa requisições concorrentes em micro-lotes.
+
+    As requisições que chegam dentro da janela (window_ms), ou até atingir max_batch_size,
+    são processadas juntas: uma chamada ao YOLO para o lote inteiro e um forward do
+    Depth Anything V2 para cada formato de entrada da rede (múltiplos de 14 calculados pelo
+    Resize.get_size). Os resultados são devolvidos para cada requisição pelo seu Future.
+    """
+
+    def __init__(self, models, window_ms=10, max_batch_size=8, input_size=518):
+        self.models = models
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.input_size = input_size
+        self._queue = queue.Queue()
+        self._thread = None
+        self.batches = 0
+        self.processed = 0
+
+    @property
+    def pending(self):
+        """Requisições esperando o próximo lote"""
+        return self._queue.qsize()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, image):
+        """Enfileira uma imagem e retorna um Future com (detecções, mapa de profundidade).
+        O mapa de profundidade é None quando nenhum objeto foi detectado."""
+        width, height = image.size
+        job = _Job(image, DepthAnythingV2.get_input_shape(height, width, self.input_size))
+        self._queue.put(job)
+        return job.future
+
+    def process(self, image, timeout=None):
+        """Versão bloqueante de submit"""
+        return self.submit(image).result(timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                # sinal de parada: processa o lote atual e encerra na próxima coleta
+                self._queue.put(None)
+                break
+            batch.append(job)
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                break
+            try:
+                self._process_batch(batch)
+            except Exception as e:
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+
+    def _process_batch(self, batch):
+        self.batches += 1
+        self.processed += len(batch)
+
+        detections = self.models.detect_batch([job.image for job in batch])
+
+        # agrupa por formato de entrada da rede; imagens sem detecções não passam pelo modelo de profundidade
+        buckets = defaultdict(list)
+        for job, job_detections in zip(batch, detections):
+            if len(job_detections) == 0:
+                job.future.set_result((job_detections, None))
+            else:
+                buckets[job.shape].append((job, job_detections))
+
+        for items in buckets.values():
+            try:
+                depth_maps = self.models.depth_batch([job.image for job, _ in items], self.input_size)
+            except Exception as e:
+                for job, _ in items:
+                    job.future.set_exception(e)
+                continue
+
+            for (job, job_detections), depth_map in zip(items, depth_maps):
+                job.future.set_result((job_detections, depth_map))
@@ -0,0 +1,201 @@
+import json
+import time
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+
+import cv2
+from PIL import Image
+
+from app.ingest import DecodedImage
+
+
+def image_key(image, config):
+    """Chave de conteúdo: hash dos pixels decodificados (modo, tamanho e bytes) e da configuração
+    que influencia o resultado (modelo, estatística etc.). Reenvios da mesma imagem em outro
+    contêiner ou com outros metadados geram a mesma chave."""
+    # sha1 tem aceleração por hardware na maioria das CPUs e a chave não é usada para segurança
+    digest = hashlib.sha1(usedforsecurity=False)
+    digest.update(repr((image.mode, image.size, config)).encode())
+    # o buffer de um DecodedImage é lido direto, sem a cópia do tobytes
+    digest.update(image.array if isinstance(image, DecodedImage) else image.tobytes())
+    return digest.hexdigest()
+
+
+def perceptual_hash(image, hash_size=8):
+    """dHash de 64 bits: sinal do gradiente horizontal da miniatura (hash_size+1)xhash_size em cinza"""
+    if isinstance(image, DecodedImage):
+        image = Image.fromarray(cv2.resize(image.array, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA))
+    # reducing_gap reduz a imagem por blocos antes da interpolação (bem mais barato em fotos grandes)
+    small = image.resize((hash_size + 1, hash_size), Image.BILINEAR, reducing_gap=2.0)
+    pixels = small.convert("L").load()
+    value = 0
+    for y in range(hash_size):
+        for x in range(hash_size):
+            value = (value << 1) | (pixels[x, y] > pixels[x + 1, y])
+    return value
+
+
+# resultado recusado pelo `store` do líder: as requisições coalescidas calculam o próprio
+_REJECTED = object()
+
+
+def _size_of(value):
+    # tamanho aproximado da resposta guardada (como será serializada)
+    return len(json.dumps(value, default=str).encode())
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires", "near_key")
+
+    def __init__(self, value, size, expires, near_key):
+        self.value = value
+        self.size = size
+        self.expires = expires
+        self.near_key = near_key
+
+
+class ResultCache:
+    """Cache de respostas endereçado pelo conteúdo da imagem.
+
+    As entradas saem pela ordem LRU quando passam de `max_entries` ou de `max_bytes`, e expiram
+    após `ttl_s`. Com `perceptual` ligado, uma falta exata ainda pode ser atendida por uma imagem
+    quase idêntica (mesmo tamanho e configuração, dHash a no máximo `max_distance` bits), por
+    exemplo a mesma foto recomprimida por outro aparelho. Requisições simultâneas com a mesma
+    chave são coalescidas: só a primeira calcula e as demais esperam pelo seu resultado.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=64 * 2**20, ttl_s=600, perceptual=False, max_distance=4):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.perceptual = perceptual
+        self.max_distance = max_distance
+        self.bytes = 0
+        self.counts = Counter()
+        self._entries = OrderedDict()
+        # (configuração, tamanho) -> {chave exata: dHash}, para a busca de quase duplicatas
+        self._near = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, image, config, compute, store=None):
+        """Retorna (resultado, origem), com origem "acerto", "similar", "coalescido" ou "calculado".
+        compute: função sem argumentos chamada na falta; store(resultado) decide se o resultado
+        vai para o cache (por exemplo, só respostas de sucesso). Só resultados aceitos pelo store
+        são repassados às requisições coalescidas: um recusado (degradado pelo prazo ou pela
+        carga de quem o calculou) faz cada uma delas voltar à busca e eleger um novo líder.
+        Exceções do cálculo chegam a todas as requisições coalescidas."""
+        key = image_key(image, config)
+        near_key = (config, image.size) if self.perceptual else None
+        phash = perceptual_hash(image) if self.perceptual else None
+
+        while True:
+            value, origin = self._get_or_compute(key, near_key, phash, compute, store)
+            if value is not _REJECTED:
+                return value, origin
+            with self._lock:
+                self.counts["recalculados"] += 1
+
+    def _get_or_compute(self, key, near_key, phash, compute, store):
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.counts["acertos"] += 1
+                return value, "acerto"
+            if phash is not None:
+                value = self._lookup_near(near_key, phash)
+                if value is not None:
+                    self.counts["acertos_similares"] += 1
+                    return value, "similar"
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.counts["faltas"] += 1
+
+        if not leader:
+            value = future.result()
+            if value is not _REJECTED:
+                with self._lock:
+                    self.counts["coalescidos"] += 1
+            return value, "coalescido"
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        accepted = store is None or store(value)
+        with self._lock:
+            del self._inflight[key]
+            if accepted:
+                self._put(key, value, near_key, phash)
+        future.set_result(value if accepted else _REJECTED)
+        return value, "calculado"
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counts["acertos"] + self.counts["acertos_similares"] + self.counts["faltas"]
+            hits = self.counts["acertos"] + self.counts["acertos_similares"]
+            return {
+                **{name: self.counts[name] for name in
+                   ("acertos", "acertos_similares", "coalescidos", "recalculados", "faltas", "despejos",
+                    "expiradas")},
+                "entradas": len(self._entries),
+                "memoria_mb": round(self.bytes / 2**20, 2),
+                "em_andamento": len(self._inflight),
+                "taxa_acerto": round(hits / lookups, 3) if lookups else None,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._near.clear()
+            self.bytes = 0
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires < time.monotonic():
+            self._remove(key)
+            self.counts["expiradas"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def _lookup_near(self, near_key, phash):
+        best, best_distance = None, self.max_distance + 1
+        for key, other in self._near.get(near_key, {}).items():
+            distance = bin(phash ^ other).count("1")
+            if distance < best_distance:
+                best, best_distance = key, distance
+        return self._lookup(best) if best is not None else None
+
+    def _put(self, key, value, near_key, phash):
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(value, size, time.monotonic() + self.ttl_s, near_key)
+        self.bytes += size
+        if phash is not None:
+            self._near.setdefault(near_key, {})[key] = phash
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.counts["despejos"] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        if entry.near_key is not None:
+            bucket = self._near.get(entry.near_key, {})
+            bucket.pop(key, None)
+            if not bucket:
+                self._near.pop(entry.near_key, None)
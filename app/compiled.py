@@ -0,0 +1,118 @@
+import math
+import time
+import logging
+import threading
+import torch
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dpt import DepthAnythingV2
+
+logger = logging.getLogger(__name__)
+
+# "trace": TorchScript (torch.jit.trace + freeze), não depende de compilador C++
+# "compile": torch.compile (Inductor), precisa de um compilador C++ no ambiente
+COMPILE_MODES = ("trace", "compile")
+
+
+def parse_aspects(value):
+    """Converte "4:3,16:9" em [(4, 3), (16, 9)] (largura:altura)"""
+    aspects = []
+    for item in value.split(","):
+        if item.strip():
+            w, h = item.split(":")
+            aspects.append((int(w), int(h)))
+    return aspects
+
+
+class CompiledDepthModel:
+    """DepthAnythingV2 com um grafo compilado por formato de entrada (bucket).
+
+    Cada proporção configurada vira um formato fixo de entrada da rede (múltiplos de 14).
+    As imagens são ajustadas ao bucket de proporção mais próxima (até `tolerance` de
+    diferença relativa) e executadas pelo grafo compilado daquele bucket; os fatores de
+    escala de cada eixo são devolvidos junto com a profundidade. Sem bucket compatível, ou
+    antes do bucket ser compilado, a inferência cai para o modo eager.
+
+    Os demais atributos são repassados ao modelo original.
+    """
+
+    def __init__(self, model, aspects=((1, 1), (4, 3), (3, 4), (16, 9), (9, 16)), input_size=518,
+                 mode="trace", tolerance=0.15):
+        if mode not in COMPILE_MODES:
+            raise ValueError(f"Modo de compilação inválido: {mode}. Use um de {COMPILE_MODES}")
+
+        self.model = model
+        self.mode = mode
+        self.input_size = input_size
+        self.tolerance = tolerance
+        self.buckets = sorted({DepthAnythingV2.get_input_shape(h, w, input_size) for w, h in aspects})
+        self._graphs = {}
+        self._compiled = torch.compile(model, dynamic=False) if mode == "compile" else None
+        self._lock = threading.Lock()
+        self.compile_times = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def compile_all(self):
+        """Compila os grafos de todos os buckets (tempo de compilação registrado em compile_times).
+        Um bucket que falhar na compilação continua atendido pelo modo eager."""
+        for bucket in self.buckets:
+            try:
+                self.compile_bucket(bucket)
+            except Exception as e:
+                logger.warning("Falha ao compilar o bucket %dx%d (%s): %s", bucket[1], bucket[0], self.mode, e)
+        return self
+
+    @torch.no_grad()
+    def compile_bucket(self, bucket):
+        with self._lock:
+            if bucket in self._graphs:
+                return self._graphs[bucket]
+
+            t0 = time.perf_counter()
+            example = torch.zeros((1, 3, *bucket), device=next(self.model.parameters()).device)
+            if self.mode == "trace":
+                graph = torch.jit.trace(self.model, example, check_trace=False)
+                graph = torch.jit.freeze(graph.eval())
+            else:
+                graph = self._compiled
+            # as primeiras execuções especializam (trace) ou geram o código (compile) para este formato
+            for _ in range(2):
+                graph(example)
+            self.compile_times[bucket] = time.perf_counter() - t0
+            self._graphs[bucket] = graph
+            return graph
+
+    def snap(self, network_h, network_w):
+        """Bucket de proporção mais próxima, ou None se nenhum estiver dentro da tolerância"""
+        aspect = math.log(network_w / network_h)
+        best = min(self.buckets, key=lambda b: abs(math.log(b[1] / b[0]) - aspect))
+        if abs(math.log(best[1] / best[0]) - aspect) > math.log(1 + self.tolerance):
+            return None
+        return best
+
+    @torch.no_grad()
+    def infer_image_lowres(self, raw_image, input_size=518, channel_order='BGR'):
+        if input_size != self.input_size:
+            return self.model.infer_image_lowres(raw_image, input_size, channel_order)
+
+        preprocessor = self.model.get_preprocessor(input_size, channel_order)
+        h, w = raw_image.shape[:2]
+        bucket = self.snap(*preprocessor.get_size(h, w))
+        graph = self._graphs.get(bucket)
+
+        if graph is None:
+            self.misses += 1
+            return self.model.infer_image_lowres(raw_image, input_size, channel_order)
+
+        self.hits += 1
+        image, _ = preprocessor(raw_image, size=bucket)
+        depth = graph(image)[0]
+
+        return depth, (depth.shape[0] / h, depth.shape[1] / w)
+
+    @torch.no_grad()
+    def infer_image(self, raw_image, input_size=518, channel_order='BGR'):
+        depth, _ = self.infer_image_lowres(raw_image, input_size, channel_order)
+        return DepthAnythingV2.upsample_depth(depth, raw_image.shape[:2]).cpu().numpy()
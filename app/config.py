@@ -0,0 +1,263 @@
+import os
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class Config:
+    """Configurações padrão da aplicação (podem ser sobrescritas por variáveis de ambiente)"""
+    # Pesos do YOLO usados pelo registro de modelos
+    YOLO_WEIGHTS = os.environ.get("YOLO_WEIGHTS", "yolo11n.pt")
+
+    # Carrega os modelos ao criar a aplicação (desligar apenas para testes/ferramentas)
+    MODELS_PRELOAD = _env_bool("MODELS_PRELOAD", True)
+    # Executa uma inferência de aquecimento logo após carregar os modelos
+    MODELS_WARMUP = _env_bool("MODELS_WARMUP", True)
+    # Backend de inferência dos dois modelos: 'torch' ou 'onnx' (ONNX Runtime na CPU; os modelos são
+    # exportados na primeira carga, o YOLO ao lado dos pesos)
+    INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch")
+    # Diretório dos modelos de profundidade exportados para o backend 'onnx' (mesmo nome do checkpoint)
+    DEPTH_ONNX_DIR = os.environ.get("DEPTH_ONNX_DIR", "checkpoints")
+    # Threads intra-op da sessão do ONNX Runtime (0 = padrão do ONNX Runtime)
+    ONNX_THREADS = int(os.environ.get("ONNX_THREADS", 0))
+    # Modelo de profundidade padrão: encoder ('vits', 'vitb' ou 'vitl') e dataset ('hypersim' ou 'vkitti');
+    # os demais pares são carregados sob demanda quando pedidos na requisição
+    DEPTH_ENCODER = os.environ.get("DEPTH_ENCODER", "vitb")
+    DEPTH_DATASET = os.environ.get("DEPTH_DATASET", "hypersim")
+    # Memória máxima (MB) dos modelos de profundidade residentes; 0 = sem limite
+    DEPTH_MEMORY_BUDGET_MB = float(os.environ.get("DEPTH_MEMORY_BUDGET_MB", 0))
+    # Implementação da atenção do DINOv2: 'sdpa' (fundida do PyTorch), 'reference' ou 'xformers'
+    DEPTH_ATTN_BACKEND = os.environ.get("DEPTH_ATTN_BACKEND", "sdpa")
+    # Quantização INT8 para CPU: vazio (float32), 'dynamic' ou 'dynamic+head'
+    DEPTH_QUANTIZE = os.environ.get("DEPTH_QUANTIZE") or None
+    # Diretório com imagens de calibração (necessário para 'dynamic+head')
+    DEPTH_QUANT_CALIBRATION_DIR = os.environ.get("DEPTH_QUANT_CALIBRATION_DIR")
+    # Precisão por etapa do modelo de profundidade ('fp32', 'bf16' ou 'fp16'); com 'fp32' na saída,
+    # as convoluções finais do DPTHead e o Sigmoid * max_depth ficam em float32
+    DEPTH_PRECISION_BACKBONE = os.environ.get("DEPTH_PRECISION_BACKBONE", "fp32")
+    DEPTH_PRECISION_HEAD = os.environ.get("DEPTH_PRECISION_HEAD", "fp32")
+    DEPTH_PRECISION_OUTPUT = os.environ.get("DEPTH_PRECISION_OUTPUT", "fp32")
+    # Pesos do modelo de profundidade lidos do checkpoint mapeado em memória (torch.load com mmap=True):
+    # sem cópia na carga e com as páginas compartilhadas entre os workers pelo page cache
+    DEPTH_MMAP_WEIGHTS = _env_bool("DEPTH_MMAP_WEIGHTS", True)
+    # Workers pré-forkados (gunicorn com preload_app, ver gunicorn.conf.py): os modelos são carregados
+    # uma vez no processo mestre e compartilhados com os workers por copy-on-write
+    PREFORK_SHARED_WEIGHTS = _env_bool("PREFORK_SHARED_WEIGHTS", False)
+    # Topologia dos workers do gunicorn (ver app.topology): ao iniciar, cada worker recebe uma parte
+    # dos núcleos físicos e nós NUMA do host, fixa as suas threads nela (WORKER_PIN_CPUS) e dimensiona
+    # os pools do torch (uma thread intra-op por núcleo, WORKER_INTEROP_THREADS inter-op) e do
+    # OpenCV (WORKER_CV2_THREADS; 0 = uma por núcleo do worker)
+    WORKER_TOPOLOGY = _env_bool("WORKER_TOPOLOGY", True)
+    WORKER_PIN_CPUS = _env_bool("WORKER_PIN_CPUS", True)
+    WORKER_INTEROP_THREADS = int(os.environ.get("WORKER_INTEROP_THREADS", 1))
+    WORKER_CV2_THREADS = int(os.environ.get("WORKER_CV2_THREADS", 0))
+    # Tamanhos de imagem (LxA) mais comuns; os embeddings posicionais dos formatos de entrada
+    # correspondentes são interpolados na inicialização
+    DEPTH_SHAPE_BUCKETS = [
+        tuple(int(v) for v in size.split("x"))
+        for size in os.environ.get("DEPTH_SHAPE_BUCKETS", "640x480,480x640,1280x720,720x1280").split(",")
+        if size
+    ]
+    # Grafo compilado por formato de entrada: vazio (eager), 'trace' (TorchScript) ou 'compile' (torch.compile)
+    DEPTH_COMPILE = os.environ.get("DEPTH_COMPILE") or None
+    # Proporções (largura:altura) com grafo compilado; as imagens são ajustadas à mais próxima
+    DEPTH_COMPILE_ASPECTS = os.environ.get("DEPTH_COMPILE_ASPECTS", "1:1,4:3,3:4,16:9,9:16")
+    # Diferença relativa máxima de proporção aceita ao ajustar a imagem a um bucket
+    DEPTH_COMPILE_TOLERANCE = float(os.environ.get("DEPTH_COMPILE_TOLERANCE", 0.15))
+
+    # Micro-lotes: agrupa requisições concorrentes em um único forward dos modelos
+    BATCHING_ENABLED = _env_bool("BATCHING_ENABLED", False)
+    BATCH_WINDOW_MS = float(os.environ.get("BATCH_WINDOW_MS", 10))
+    BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 8))
+
+    # Execução concorrente de YOLO e profundidade dentro da requisição
+    PIPELINE_CONCURRENT = _env_bool("PIPELINE_CONCURRENT", False)
+    # Orçamento de threads intra-op de cada modelo (0 = divide automaticamente)
+    PIPELINE_YOLO_THREADS = int(os.environ.get("PIPELINE_YOLO_THREADS", 0))
+    PIPELINE_DEPTH_THREADS = int(os.environ.get("PIPELINE_DEPTH_THREADS", 0))
+    # Requisições simultâneas atendidas pelo pipeline (como o --threads do gunicorn)
+    PIPELINE_MAX_CONCURRENCY = int(os.environ.get("PIPELINE_MAX_CONCURRENCY", 8))
+
+    # Resolução adaptativa da profundidade: escolhe o input_size por requisição (ver app.resolution)
+    DEPTH_ADAPTIVE_RESOLUTION = _env_bool("DEPTH_ADAPTIVE_RESOLUTION", False)
+    # Tamanhos de entrada candidatos (múltiplos de 14); sem a política é usado sempre 518
+    DEPTH_INPUT_SIZES = [int(v) for v in os.environ.get("DEPTH_INPUT_SIZES", "266,364,518").split(",") if v]
+    # Pixels que o menor objeto precisa cobrir na entrada da rede
+    DEPTH_MIN_BOX_PIXELS = int(os.environ.get("DEPTH_MIN_BOX_PIXELS", 42))
+    # Tamanho da fila a partir do qual a resolução desce um nível (cada limite desce mais um)
+    DEPTH_QUEUE_THRESHOLDS = [int(v) for v in os.environ.get("DEPTH_QUEUE_THRESHOLDS", "2,4").split(",") if v]
+
+    # Vídeos e sessões de quadros: a profundidade só é recalculada quando a diferença média
+    # (0 a 1) para o último quadro-chave passa do limite, ou após VIDEO_MAX_DEPTH_REUSE quadros
+    VIDEO_DEPTH_THRESHOLD = float(os.environ.get("VIDEO_DEPTH_THRESHOLD", 0.04))
+    VIDEO_MAX_DEPTH_REUSE = int(os.environ.get("VIDEO_MAX_DEPTH_REUSE", 30))
+    # Quadros processados no máximo por vídeo enviado
+    VIDEO_MAX_FRAMES = int(os.environ.get("VIDEO_MAX_FRAMES", 300))
+    # Sessões de quadros: expiração sem uso (s) e quantidade máxima por processo
+    FRAME_SESSION_TTL_S = float(os.environ.get("FRAME_SESSION_TTL_S", 300))
+    FRAME_SESSION_MAX = int(os.environ.get("FRAME_SESSION_MAX", 256))
+    # Rastreamento por IoU em vídeos e sessões: cada objeto vira uma trilha e a distância só é
+    # medida de novo quando a trilha é nova, se moveu (IoU com a caixa medida abaixo de
+    # TRACK_MOVE_IOU) ou após TRACK_REFRESH_EVERY quadros; as medições são suavizadas (TRACK_ALPHA)
+    FRAME_TRACKING = _env_bool("FRAME_TRACKING", True)
+    TRACK_IOU_THRESHOLD = float(os.environ.get("TRACK_IOU_THRESHOLD", 0.3))
+    TRACK_MOVE_IOU = float(os.environ.get("TRACK_MOVE_IOU", 0.8))
+    TRACK_ALPHA = float(os.environ.get("TRACK_ALPHA", 0.5))
+    TRACK_MAX_MISSED = int(os.environ.get("TRACK_MAX_MISSED", 5))
+    TRACK_REFRESH_EVERY = int(os.environ.get("TRACK_REFRESH_EVERY", 15))
+
+    # Cache de respostas do /process_image endereçado pelo conteúdo da imagem decodificada e
+    # pela configuração pedida (LRU limitado por entradas e memória, com expiração)
+    RESULT_CACHE = _env_bool("RESULT_CACHE", True)
+    RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 512))
+    RESULT_CACHE_MAX_MB = float(os.environ.get("RESULT_CACHE_MAX_MB", 64))
+    RESULT_CACHE_TTL_S = float(os.environ.get("RESULT_CACHE_TTL_S", 600))
+    # Camada de quase duplicatas (dHash): distância de Hamming máxima em bits
+    RESULT_CACHE_PERCEPTUAL = _env_bool("RESULT_CACHE_PERCEPTUAL", False)
+    RESULT_CACHE_MAX_DISTANCE = int(os.environ.get("RESULT_CACHE_MAX_DISTANCE", 4))
+
+    # Jobs assíncronos (POST /jobs): threads que processam a fila, vagas na fila (acima disso a
+    # resposta é 429), por quanto tempo os resultados ficam guardados e espera máxima do long-poll
+    JOBS_ENABLED = _env_bool("JOBS_ENABLED", True)
+    JOBS_WORKERS = int(os.environ.get("JOBS_WORKERS", 1))
+    JOBS_MAX_QUEUE = int(os.environ.get("JOBS_MAX_QUEUE", 16))
+    JOBS_RESULT_TTL_S = float(os.environ.get("JOBS_RESULT_TTL_S", 300))
+    JOBS_MAX_WAIT_S = float(os.environ.get("JOBS_MAX_WAIT_S", 30))
+    # Diretório compartilhado com o estado dos jobs (ver app.jobs.JobStore), necessário com vários
+    # workers: um job pode ser consultado em qualquer worker. Vazio = estado apenas no processo.
+    # O gunicorn.conf.py cria um diretório temporário quando não informado.
+    JOBS_STORE_DIR = os.environ.get("JOBS_STORE_DIR", "")
+
+    # Controle de admissão por prazo (campo deadline_ms ou cabeçalho X-Deadline-Ms): com as
+    # latências medidas por etapa, a requisição roda completa, é degradada (entrada menor, encoder
+    # mais leve ou só detecções) ou rejeitada com 503. ADMISSION_SAFETY multiplica as estimativas
+    ADMISSION_CONTROL = _env_bool("ADMISSION_CONTROL", True)
+    ADMISSION_SAFETY = float(os.environ.get("ADMISSION_SAFETY", 1.2))
+    ADMISSION_QUANTILE = float(os.environ.get("ADMISSION_QUANTILE", 0.9))
+    ADMISSION_HISTORY = int(os.environ.get("ADMISSION_HISTORY", 64))
+    # Prazo aplicado às requisições que não informam um (0 = sem prazo)
+    DEFAULT_DEADLINE_MS = float(os.environ.get("DEFAULT_DEADLINE_MS", 0))
+
+    # /process_batch: imagens por forward em lote, threads de decodificação e limite de imagens
+    PROCESS_BATCH_ENABLED = _env_bool("PROCESS_BATCH_ENABLED", True)
+    PROCESS_BATCH_SIZE = int(os.environ.get("PROCESS_BATCH_SIZE", 8))
+    PROCESS_BATCH_DECODE_WORKERS = int(os.environ.get("PROCESS_BATCH_DECODE_WORKERS", 4))
+    PROCESS_BATCH_MAX_IMAGES = int(os.environ.get("PROCESS_BATCH_MAX_IMAGES", 1000))
+
+    # Decodificação reduzida (modo draft do PIL) de JPEGs maiores que o necessário para os modelos
+    IMAGE_DRAFT_DECODE = _env_bool("IMAGE_DRAFT_DECODE", True)
+
+    # Métricas no formato do Prometheus em GET /metrics (requisições, erros, filas e latências)
+    METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+    # Nível dos logs da aplicação (carga de modelos, erros internos), no formato do módulo logging
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+
+    # A partir de quantas caixas as estatísticas de profundidade usam o histograma integral
+    DEPTH_INDEX_MIN_BOXES = int(os.environ.get("DEPTH_INDEX_MIN_BOXES", 16))
+
+
+def depth_options(config):
+    """Opções de construção do modelo de profundidade a partir da configuração"""
+    return {
+        'attn_backend': config['DEPTH_ATTN_BACKEND'],
+        'quantize': config['DEPTH_QUANTIZE'],
+        'calibration_dir': config['DEPTH_QUANT_CALIBRATION_DIR'],
+        'precision': {
+            'backbone': config['DEPTH_PRECISION_BACKBONE'],
+            'head': config['DEPTH_PRECISION_HEAD'],
+            'output': config['DEPTH_PRECISION_OUTPUT'],
+        },
+        'mmap': config['DEPTH_MMAP_WEIGHTS'],
+    }
+
+
+def compile_options(config):
+    """Opções do grafo compilado do modelo de profundidade (None quando desligado)"""
+    if not config['DEPTH_COMPILE']:
+        return None
+    from app.compiled import parse_aspects
+    return {
+        'mode': config['DEPTH_COMPILE'],
+        'aspects': parse_aspects(config['DEPTH_COMPILE_ASPECTS']),
+        'tolerance': config['DEPTH_COMPILE_TOLERANCE'],
+    }
+
+
+def backend_options(config):
+    """Opções do backend ONNX do modelo de profundidade"""
+    return {
+        'directory': config['DEPTH_ONNX_DIR'],
+        'threads': config['ONNX_THREADS'],
+    }
+
+
+def model_options(config):
+    """Argumentos do ModelRegistry.load a partir da configuração"""
+    return {
+        'yolo_weights': config['YOLO_WEIGHTS'],
+        'shape_buckets': config['DEPTH_SHAPE_BUCKETS'],
+        'depth_options': depth_options(config),
+        'compile_options': compile_options(config),
+        'backend': config['INFERENCE_BACKEND'],
+        'backend_options': backend_options(config),
+        'encoder': config['DEPTH_ENCODER'],
+        'dataset': config['DEPTH_DATASET'],
+        'memory_budget_mb': config['DEPTH_MEMORY_BUDGET_MB'],
+        'input_sizes': depth_input_sizes(config),
+    }
+
+
+def depth_input_sizes(config):
+    """Entradas da rede de profundidade em uso: 518 e, com a resolução adaptativa ou o controle
+    de admissão, os DEPTH_INPUT_SIZES"""
+    sizes = {518}
+    if config['DEPTH_ADAPTIVE_RESOLUTION'] or config['ADMISSION_CONTROL']:
+        sizes.update(config['DEPTH_INPUT_SIZES'])
+    return sorted(sizes)
+
+
+def gate_options(config):
+    """Opções do DepthGate de vídeos e sessões de quadros"""
+    return {
+        'threshold': config['VIDEO_DEPTH_THRESHOLD'],
+        'max_reuse': config['VIDEO_MAX_DEPTH_REUSE'],
+    }
+
+
+def tracker_options(config):
+    """Opções do IouTracker de vídeos e sessões de quadros (None com o rastreamento desligado)"""
+    if not config['FRAME_TRACKING']:
+        return None
+    return {
+        'iou_threshold': config['TRACK_IOU_THRESHOLD'],
+        'move_iou': config['TRACK_MOVE_IOU'],
+        'alpha': config['TRACK_ALPHA'],
+        'max_missed': config['TRACK_MAX_MISSED'],
+        'refresh_every': config['TRACK_REFRESH_EVERY'],
+    }
+
+
+def cache_options(config):
+    """Opções do ResultCache do /process_image"""
+    return {
+        'max_entries': config['RESULT_CACHE_MAX_ENTRIES'],
+        'max_bytes': int(config['RESULT_CACHE_MAX_MB'] * 2**20),
+        'ttl_s': config['RESULT_CACHE_TTL_S'],
+        'perceptual': config['RESULT_CACHE_PERCEPTUAL'],
+        'max_distance': config['RESULT_CACHE_MAX_DISTANCE'],
+    }
+
+
+def topology_options(config):
+    """Opções do apply_topology para os workers do gunicorn (None com a topologia desligada)"""
+    if not config['WORKER_TOPOLOGY']:
+        return None
+    return {
+        'pin': config['WORKER_PIN_CPUS'],
+        'interop_threads': config['WORKER_INTEROP_THREADS'],
+        'cv2_threads': config['WORKER_CV2_THREADS'],
+    }
@@ -0,0 +1,134 @@
+import torch
+import numpy as np
+
+
+def parse_statistic(value):
+    """Converte o nome da estatística pedida pelo cliente em (tipo, parâmetro).
+
+    Formatos aceitos: "median", "p<q>" (percentil q, ex.: "p25") e "trimmed_mean" ou
+    "trimmed_mean:<fração>" (média aparada, fração descartada em cada cauda; padrão 0.1).
+    """
+    value = (value or "median").strip().lower()
+
+    if value == "median":
+        return ("percentile", 50.0)
+
+    if value.startswith("p"):
+        try:
+            q = float(value[1:])
+        except ValueError:
+            q = None
+        if q is not None and 0 <= q <= 100:
+            return ("percentile", q)
+
+    if value.startswith("trimmed_mean"):
+        _, _, trim = value.partition(":")
+        try:
+            trim = float(trim) if trim else 0.1
+        except ValueError:
+            trim = None
+        if trim is not None and 0 <= trim < 0.5:
+            return ("trimmed_mean", trim)
+
+    raise ValueError(f"Estatística inválida: {value}")
+
+
+def region_statistic(values, statistic):
+    """Estatística exata de uma região (tensor torch ou array numpy)"""
+    kind, param = statistic
+
+    if isinstance(values, torch.Tensor):
+        values = values.flatten()
+        if kind == "percentile":
+            # quantile interpola como o np.percentile
+            return torch.quantile(values, param / 100.0)
+        values, _ = torch.sort(values)
+        cut = int(values.numel() * param)
+        kept = values[cut:values.numel() - cut]
+        return (kept if kept.numel() else values).mean()
+
+    values = np.asarray(values).ravel()
+    if kind == "percentile":
+        return float(np.percentile(values, param))
+    values = np.sort(values)
+    cut = int(values.size * param)
+    kept = values[cut:values.size - cut]
+    return float((kept if kept.size else values).mean())
+
+
+class DepthStatsIndex:
+    """Histograma integral de um mapa de profundidade.
+
+    A profundidade é quantizada em `bins` intervalos e as contagens são acumuladas em
+    células de `cell` x `cell` pixels. Depois de construído (uma vez por mapa), responde
+    percentis e médias aparadas de qualquer retângulo com quatro leituras da tabela,
+    independente da área da caixa. A precisão fica limitada à largura de um intervalo
+    (com interpolação linear dentro dele) e as caixas são alinhadas às células.
+    """
+
+    def __init__(self, depth, bins=64, cell=4):
+        depth = torch.as_tensor(depth)
+        self.device = depth.device
+        self.bins = bins
+        self.cell = cell
+        self.height, self.width = depth.shape
+
+        depth = depth.float()
+        self.low = float(depth.min())
+        high = float(depth.max())
+        self.bin_width = max(high - self.low, 1e-6) / bins
+
+        quantized = ((depth - self.low) / self.bin_width).long().clamp_(0, bins - 1)
+
+        cells_h = -(-self.height // cell)
+        cells_w = -(-self.width // cell)
+        cell_y = (torch.arange(self.height, device=self.device) // cell)[:, None]
+        cell_x = (torch.arange(self.width, device=self.device) // cell)[None, :]
+        flat = ((cell_y * cells_w + cell_x) * bins + quantized).flatten()
+
+        hist = torch.bincount(flat, minlength=cells_h * cells_w * bins).to(torch.int32)
+        hist = hist.view(cells_h, cells_w, bins)
+        # as contagens cabem em int32; sem dtype o cumsum promoveria para int64
+
+        self.integral = torch.zeros((cells_h + 1, cells_w + 1, bins), dtype=torch.int32, device=self.device)
+        self.integral[1:, 1:] = hist.cumsum(0, dtype=torch.int32).cumsum(1, dtype=torch.int32)
+
+    def counts(self, boxes):
+        """Histogramas (N, bins) dos retângulos (x1, y1, x2, y2) em coordenadas do mapa"""
+        boxes = torch.as_tensor(boxes, dtype=torch.long, device=self.device).view(-1, 4)
+        x1 = boxes[:, 0].clamp(0, self.width - 1) // self.cell
+        y1 = boxes[:, 1].clamp(0, self.height - 1) // self.cell
+        x2 = torch.maximum(-(-boxes[:, 2].clamp(1, self.width) // self.cell), x1 + 1)
+        y2 = torch.maximum(-(-boxes[:, 3].clamp(1, self.height) // self.cell), y1 + 1)
+
+        I = self.integral
+        return (I[y2, x2] - I[y1, x2] - I[y2, x1] + I[y1, x1]).float()
+
+    def query(self, boxes, statistic=("percentile", 50.0)):
+        """Estatística de cada retângulo, como tensor (N,) no dispositivo do mapa"""
+        kind, param = statistic
+        counts = self.counts(boxes)
+        total = counts.sum(1, keepdim=True)
+        cum = counts.cumsum(1)
+
+        if kind == "percentile":
+            target = total * (param / 100.0)
+            bin_idx = torch.searchsorted(cum, target).clamp_(max=self.bins - 1)
+            below = cum.gather(1, bin_idx) - counts.gather(1, bin_idx)
+            inside = counts.gather(1, bin_idx).clamp(min=1)
+            fraction = ((target - below) / inside).clamp_(0, 1)
+            return (self.low + (bin_idx.float() + fraction) * self.bin_width).squeeze(1)
+
+        lower, upper = total * param, total * (1 - param)
+        kept = (torch.minimum(cum, upper) - torch.maximum(cum - counts, lower)).clamp_(min=0)
+        centers = self.low + (torch.arange(self.bins, device=self.device).float() + 0.5) * self.bin_width
+        return (kept * centers).sum(1) / kept.sum(1).clamp(min=1e-6)
+
+    def median(self, boxes):
+        return self.query(boxes, ("percentile", 50.0))
+
+    def percentile(self, boxes, q):
+        return self.query(boxes, ("percentile", q))
+
+    def trimmed_mean(self, boxes, trim=0.1):
+        return self.query(boxes, ("trimmed_mean", trim))
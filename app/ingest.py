@@ -0,0 +1,109 @@
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+# tag EXIF de orientação e a transformação (sobre o array HxWx3) que a corrige
+EXIF_ORIENTATION = 0x0112
+_ORIENTATION_FIXES = {
+    2: lambda a: a[:, ::-1],
+    3: lambda a: a[::-1, ::-1],
+    4: lambda a: a[::-1],
+    5: lambda a: np.rot90(a[:, ::-1], 1),
+    6: lambda a: np.rot90(a, -1),
+    7: lambda a: np.rot90(a[:, ::-1], -1),
+    8: lambda a: np.rot90(a, 1),
+}
+
+
+def _mb(nbytes):
+    return round(nbytes / 2**20, 2)
+
+
+class DecodedImage:
+    """Imagem enviada, decodificada uma única vez em um buffer uint8 RGB contíguo (H, W, 3).
+
+    O mesmo buffer alimenta o YOLO e o modelo de profundidade (ver utils._to_rgb_array e
+    utils.detect_objects). Com a decodificação reduzida as coordenadas internas ficam na escala
+    decodificada; restore_boxes leva as caixas de volta à imagem original. `size` e `mode`
+    seguem a convenção do PIL, para os pontos que só precisam do tamanho da imagem.
+    """
+    mode = "RGB"
+
+    def __init__(self, array, original_size=None, stages=None):
+        self.array = array
+        self.original_size = original_size or self.size
+        self.stages = stages if stages is not None else {}
+
+    @property
+    def size(self):
+        return self.array.shape[1], self.array.shape[0]
+
+    @property
+    def scale(self):
+        """(escala_x, escala_y) da imagem decodificada para a original"""
+        return self.original_size[0] / self.size[0], self.original_size[1] / self.size[1]
+
+    def restore_boxes(self, detections):
+        """Converte (no lugar) as caixas das detecções para as coordenadas da imagem original"""
+        scale_x, scale_y = self.scale
+        if (scale_x, scale_y) != (1.0, 1.0):
+            for obj in detections:
+                x1, y1, x2, y2 = obj['box']
+                obj['box'] = [round(x1 * scale_x), round(y1 * scale_y), round(x2 * scale_x), round(y2 * scale_y)]
+        return detections
+
+    def record(self, stage, seconds, nbytes=None, **extra):
+        """Registra o tempo (e a memória alocada) de uma etapa do processamento desta imagem"""
+        self.stages[stage] = {"ms": round(seconds * 1000, 1), **extra}
+        if nbytes is not None:
+            self.stages[stage]["mb"] = _mb(nbytes)
+
+
+def draft_size(image_size, min_short_side, min_long_side):
+    """Menor tamanho (largura, altura) que a decodificação reduzida pode entregar sem perder
+    resolução para os modelos: lado menor >= min_short_side e lado maior >= min_long_side"""
+    width, height = image_size
+    short, long = min(width, height), max(width, height)
+    factor = min(1.0, max(min_short_side / short, min_long_side / long))
+    return max(1, round(width * factor)), max(1, round(height * factor))
+
+
+def decode_image(stream, min_short_side=518, min_long_side=640, draft=True):
+    """Lê e decodifica uma imagem enviada em um DecodedImage.
+
+    JPEGs grandes são decodificados em escala reduzida (modo draft do PIL, 1/2, 1/4 ou 1/8 na
+    própria descompressão DCT) quando a imagem reduzida ainda tem ao menos min_short_side no lado
+    menor (entrada da profundidade) e min_long_side no lado maior (entrada do YOLO). A orientação
+    EXIF é aplicada sobre o buffer, com uma cópia apenas quando a imagem está girada."""
+    t0 = time.perf_counter()
+    data = stream.read()
+    stages = {}
+    t1 = time.perf_counter()
+
+    image = Image.open(BytesIO(data))
+    original_size = image.size
+    orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+    if draft and image.format == "JPEG":
+        image.draft("RGB", draft_size(image.size, min_short_side, min_long_side))
+    image.load()
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    t2 = time.perf_counter()
+
+    # único buffer da requisição (np.asarray copia os pixels do PIL uma vez)
+    array = np.asarray(image)
+    fix = _ORIENTATION_FIXES.get(orientation)
+    if fix is not None:
+        array = np.ascontiguousarray(fix(array))
+        if orientation >= 5:
+            original_size = original_size[::-1]
+    t3 = time.perf_counter()
+
+    decoded = DecodedImage(array, original_size, stages)
+    decoded.record("leitura", t1 - t0, len(data))
+    # o PIL guarda imagens RGB com 4 bytes por pixel
+    decoded.record("decodificacao", t2 - t1, image.width * image.height * 4, reducao=round(decoded.scale[0], 2))
+    decoded.record("buffer_rgb", t3 - t2, array.nbytes)
+    return decoded
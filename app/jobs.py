@@ -0,0 +1,341 @@
+import os
+import re
+import json
+import math
+import time
+import uuid
+import queue
+import logging
+import threading
+import statistics
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# estados de um job, na ordem em que acontecem
+JOB_STATES = ("na_fila", "processando", "concluido", "erro")
+
+
+class QueueFull(Exception):
+    """Fila de jobs cheia; retry_after é a espera sugerida ao cliente, em segundos"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Fila de processamento cheia. Tente novamente em {retry_after} s.")
+        self.retry_after = retry_after
+
+
+class Job:
+    def __init__(self, fn):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.state = "na_fila"
+        self.result = None
+        self.created = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+        # horários de relógio (time.time) dos mesmos eventos, comparáveis entre processos
+        self.clock = {"criado": time.time()}
+
+    def info(self):
+        """Estado do job para a resposta da API (tempos em segundos)"""
+        now = time.monotonic()
+        info = {"job": self.id, "estado": self.state}
+        info["espera_s"] = round((self.started or now) - self.created, 3)
+        if self.started is not None:
+            info["processamento_s"] = round((self.finished or now) - self.started, 3)
+        return info
+
+    def record(self):
+        """Estado do job para o JobStore (JSON)"""
+        record = {"job": self.id, "estado": self.state, "pid": os.getpid(), **self.clock}
+        if self.state == "concluido":
+            record["resposta"], record["status"] = self.result
+        elif self.state == "erro":
+            record["erro"] = str(self.result)
+        return record
+
+
+class StoredJob:
+    """Job lido do JobStore, possivelmente aceito por outro worker (mesma interface de Job)"""
+
+    def __init__(self, record):
+        self.id = record["job"]
+        self.state = record["estado"]
+        self.clock = record
+        if self.state == "concluido":
+            self.result = (record["resposta"], record["status"])
+        else:
+            self.result = record.get("erro")
+
+    def info(self):
+        now = time.time()
+        info = {"job": self.id, "estado": self.state}
+        info["espera_s"] = round(self.clock.get("inicio", now) - self.clock["criado"], 3)
+        if "inicio" in self.clock:
+            info["processamento_s"] = round(self.clock.get("fim", now) - self.clock["inicio"], 3)
+        return info
+
+
+def _json_default(value):
+    # escalares do numpy nas respostas
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+class JobStore:
+    """Estado dos jobs compartilhado pelos workers pré-forkados do gunicorn.
+
+    Cada job é um arquivo JSON em `directory`/<estado>/, e a troca de estado é uma escrita
+    atômica (os.replace) no novo subdiretório seguida da remoção do anterior. Assim qualquer
+    worker responde GET /jobs/<id>, e a fila e a capacidade (threads de cada worker vivo, em
+    `directory`/workers) são contadas para o serviço todo, não por processo.
+    """
+
+    def __init__(self, directory, result_ttl_s=300):
+        self.directory = directory
+        self.result_ttl_s = result_ttl_s
+        for name in JOB_STATES + ("workers",):
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+
+    def _path(self, state, job_id):
+        return os.path.join(self.directory, state, f"{job_id}.json")
+
+    def save(self, job, previous=None):
+        """Grava o estado atual do job e remove o arquivo do estado `previous`"""
+        record = job.record()
+        # o temporário fica fora dos subdiretórios de estado, que são contados
+        tmp = os.path.join(self.directory, f".{job.id}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "w") as f:
+                json.dump(record, f, default=_json_default)
+        except (TypeError, ValueError) as e:
+            with open(tmp, "w") as f:
+                json.dump({**record, "estado": "erro", "erro": f"Resultado não serializável: {e}"}, f)
+        os.replace(tmp, self._path(record["estado"], job.id))
+        if previous is not None and previous != record["estado"]:
+            self.remove(previous, job.id)
+
+    def remove(self, state, job_id):
+        try:
+            os.remove(self._path(state, job_id))
+        except FileNotFoundError:
+            pass
+
+    def load(self, job_id):
+        """StoredJob do id, ou None (id inexistente, expirado ou malformado)"""
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id):
+            return None
+        # estados finais primeiro: durante uma troca o job existe nos dois subdiretórios
+        for state in reversed(JOB_STATES):
+            try:
+                with open(self._path(state, job_id)) as f:
+                    return StoredJob(json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue
+        return None
+
+    def count(self, state):
+        return sum(1 for name in os.listdir(os.path.join(self.directory, state)) if name.endswith(".json"))
+
+    def expire(self, now=None):
+        # jobs terminados há mais de result_ttl_s saem (pela data de modificação do arquivo)
+        now = time.time() if now is None else now
+        for state in ("concluido", "erro"):
+            for entry in os.scandir(os.path.join(self.directory, state)):
+                try:
+                    if now - entry.stat().st_mtime > self.result_ttl_s:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+
+    def register(self, threads):
+        """Anuncia as threads de jobs deste processo (chamado no start, já no worker)"""
+        with open(os.path.join(self.directory, "workers", str(os.getpid())), "w") as f:
+            f.write(str(threads))
+
+    def unregister(self):
+        try:
+            os.remove(os.path.join(self.directory, "workers", str(os.getpid())))
+        except FileNotFoundError:
+            pass
+
+    def threads(self):
+        """Threads de jobs de todos os workers vivos (os registros de processos mortos são removidos)"""
+        total = 0
+        for entry in os.scandir(os.path.join(self.directory, "workers")):
+            try:
+                os.kill(int(entry.name), 0)
+                with open(entry.path) as f:
+                    total += int(f.read() or 0)
+            except ProcessLookupError:
+                os.remove(entry.path)
+            except (OSError, ValueError):
+                continue
+        return total
+
+
+class JobQueue:
+    """Fila limitada de jobs executados por `workers` threads do próprio processo.
+
+    submit não bloqueia: com `max_queue` jobs esperando, levanta QueueFull com a espera estimada
+    a partir do tempo de serviço medido nos últimos jobs (mediana de `history`), para que o
+    excesso de carga vire respostas 429 rápidas em vez de conexões presas até o timeout.
+    Os resultados ficam disponíveis por `result_ttl_s` segundos após o término.
+
+    Com `store` (JobStore) o estado de cada job também é gravado no diretório compartilhado:
+    os jobs rodam no worker que os aceitou, mas podem ser consultados em qualquer worker, e a
+    fila, a capacidade e o Retry-After passam a valer para todos os workers.
+    """
+
+    def __init__(self, workers=1, max_queue=16, result_ttl_s=300, history=64, default_service_s=1.0,
+                 store=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl_s = result_ttl_s
+        self.default_service_s = default_service_s
+        self.service_times = deque(maxlen=history)
+        self.rejected = 0
+        self.completed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.store = store
+
+    def start(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f"jobs-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.store is not None:
+            self.store.register(self.workers)
+        return self
+
+    def stop(self, timeout=None):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self.store is not None:
+            self.store.unregister()
+
+    def submit(self, fn):
+        """Enfileira fn (função sem argumentos) e retorna o Job; QueueFull se a fila estiver cheia"""
+        job = Job(fn)
+        with self._lock:
+            self._expire(time.monotonic())
+            if self.store is not None:
+                # gravado antes de entrar na fila: a thread do job já pode mudar o estado
+                self.store.save(job)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.rejected += 1
+                if self.store is not None:
+                    self.store.remove(job.state, job.id)
+                job = None
+            else:
+                self._jobs[job.id] = job
+        if job is None:
+            raise QueueFull(self.retry_after())
+        return job
+
+    def get(self, job_id):
+        """Job deste processo ou, com `store`, de qualquer worker (None se não existir)"""
+        with self._lock:
+            self._expire(time.monotonic())
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = self.store.load(job_id)
+        return job
+
+    def wait(self, job_id, timeout=None, poll_s=0.1):
+        """Long-poll: espera o job terminar por até `timeout` segundos (None se o id não existir).
+        Jobs de outros workers são relidos do `store` a cada `poll_s` segundos."""
+        job = self.get(job_id)
+        if isinstance(job, Job):
+            job.done.wait(timeout)
+            return job
+        end = time.monotonic() + (timeout or 0)
+        while job is not None and job.state not in ("concluido", "erro") and time.monotonic() < end:
+            time.sleep(min(poll_s, max(end - time.monotonic(), 0)))
+            job = self.store.load(job_id) or job
+        return job
+
+    @property
+    def pending(self):
+        """Jobs esperando na fila (de todos os workers com `store`)"""
+        if self.store is not None:
+            return self.store.count("na_fila")
+        return self._queue.qsize()
+
+    @property
+    def capacity(self):
+        """Threads de jobs do serviço (de todos os workers vivos com `store`)"""
+        if self.store is not None:
+            return self.store.threads() or self.workers
+        return self.workers
+
+    def service_time(self):
+        """Tempo de serviço estimado de um job (mediana dos últimos, em segundos)"""
+        with self._lock:
+            samples = list(self.service_times)
+        return statistics.median(samples) if samples else self.default_service_s
+
+    def retry_after(self, pending=None):
+        """Segundos até a fila ter vaga: jobs à frente (mais os em execução) divididos pelas threads"""
+        pending = self.pending if pending is None else pending
+        capacity = self.capacity
+        return max(1, math.ceil((pending + capacity) * self.service_time() / capacity))
+
+    def stats(self):
+        return {
+            "na_fila": self.pending,
+            "capacidade": self.max_queue,
+            "workers": self.capacity,
+            "concluidos": self.completed,
+            "rejeitados": self.rejected,
+            "tempo_servico_s": round(self.service_time(), 3),
+        }
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.started = time.monotonic()
+            job.clock["inicio"] = time.time()
+            job.state = "processando"
+            self._save(job, "na_fila")
+            try:
+                job.result = job.fn()
+                job.state = "concluido"
+            except Exception as e:
+                logger.exception("Erro no job %s: %s", job.id, e)
+                job.result = e
+                job.state = "erro"
+            job.finished = time.monotonic()
+            job.clock["fim"] = time.time()
+            job.fn = None
+            self._save(job, "processando")
+            with self._lock:
+                self.service_times.append(job.finished - job.started)
+                self.completed += 1
+            job.done.set()
+
+    def _save(self, job, previous):
+        if self.store is None:
+            return
+        try:
+            self.store.save(job, previous)
+        except OSError as e:
+            logger.exception("Erro ao gravar o estado do job %s: %s", job.id, e)
+
+    def _expire(self, now):
+        # jobs terminados há mais de result_ttl_s saem (os demais nunca expiram)
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished is not None and now - job.finished > self.result_ttl_s]:
+            del self._jobs[job_id]
+        if self.store is not None:
+            self.store.expire()
@@ -1,14 +1,26 @@
+import os
 import time
-from PIL import Image
-from ultralytics import YOLO
-from flask import Blueprint, request, jsonify
+from contextlib import nullcontext
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context, url_for
 from app.utils import ( 
+    check_depth_model,
     format_description, 
-    detect_objects, 
-    load_depth_anything, 
-    generate_depth_map, 
-    calculate_object_distances
+    format_detections,
+    calculate_object_distances,
+    encode_depth_map
 )
+from app.depth_stats import parse_statistic
+from app.resolution import parse_quality
+from app.jobs import QueueFull
+from app.admission import depth_work, parse_deadline
+from app.batch import iter_uploads, ndjson
+from app.ingest import DecodedImage, decode_image
+from app.prefork import process_memory, workers_memory
+from app.metrics import DETECTIONS, ERRORS, STAGE_LATENCY
+from app.topology import current_layout
+from app.config import model_options, gate_options, tracker_options
+from app.tracking import IouTracker
+from app.video import DepthGate, process_frame, process_video
 
 main_bp = Blueprint('main', __name__)
 
@@ -16,45 +28,459 @@ main_bp = Blueprint('main', __name__)
 def home():
     return "Hello, world"
 
+@main_bp.route("/models")
+def models_status():
+    """Modelos de profundidade residentes, memória e tempos de carga"""
+    models = current_app.extensions['models']
+    return jsonify({**models.residency(), "tempos_carga_s": models.load_times}), 200
+
+@main_bp.route("/memory")
+def memory_status():
+    """Memória única (USS), PSS e RSS deste processo e, com workers pré-forkados, do mestre e de cada worker"""
+    response = {"processo": {"pid": os.getpid(), **(process_memory() or {})}}
+    if current_app.config['PREFORK_SHARED_WEIGHTS']:
+        response.update(workers_memory(os.getppid()))
+    return jsonify(response), 200
+
+@main_bp.route("/metrics")
+def metrics_status():
+    """Métricas do processo no formato de texto do Prometheus"""
+    metrics = current_app.extensions.get('metrics')
+    if metrics is None:
+        return jsonify({"error": "Métricas desligadas."}), 400
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@main_bp.route("/topology")
+def topology_status():
+    """CPUs, nós NUMA e pools de threads deste worker e o plano de divisão do host entre os workers"""
+    return jsonify(current_layout()), 200
+
+def _shared_models():
+    """Modelos compartilhados pelo processo (carregados no create_app; aqui só se a carga inicial foi desligada)"""
+    models = current_app.extensions['models']
+    if not models.ready:
+        models.load(warmup=False, **model_options(current_app.config))
+    return models
+
+@main_bp.route("/cache")
+def cache_status():
+    """Contadores de acertos e faltas do cache de resultados"""
+    cache = current_app.extensions.get('result_cache')
+    if cache is None:
+        return jsonify({"error": "Cache de resultados desligado."}), 400
+    return jsonify(cache.stats()), 200
+
+def _image_options():
+    """Opções de /process_image e /jobs enviadas pelo cliente (ValueError se inválidas)"""
+    # modelo de profundidade pedido pelo cliente (padrão do registro quando omitido)
+    encoder = request.values.get('encoder') or current_app.config['DEPTH_ENCODER']
+    dataset = request.values.get('dataset') or current_app.config['DEPTH_DATASET']
+    check_depth_model(encoder, dataset)
+    # prazo em ms contado a partir daqui (nos jobs, o tempo na fila também conta)
+    deadline_ms = parse_deadline(request.values.get('deadline_ms') or request.headers.get('X-Deadline-Ms'))
+    deadline_ms = deadline_ms or current_app.config['DEFAULT_DEADLINE_MS']
+    return {
+        "encoder": encoder,
+        "dataset": dataset,
+        "statistic": parse_statistic(request.values.get('statistic')),
+        "quality": parse_quality(request.values.get('quality')),
+        # o mapa em resolução completa só é gerado quando o cliente pede explicitamente
+        "with_depth_map": request.values.get('depth_map', '').lower() in ('1', 'true'),
+        "deadline": time.monotonic() + deadline_ms / 1000 if deadline_ms else None,
+    }
+
+@main_bp.route("/admission")
+def admission_status():
+    """Níveis de qualidade aplicados, prazos perdidos e latências estimadas por etapa"""
+    admission = current_app.extensions.get('admission')
+    if admission is None:
+        return jsonify({"error": "Controle de admissão desligado."}), 400
+    return jsonify(admission.stats()), 200
+
+@main_bp.route("/resolution")
+def resolution_status():
+    """Tamanhos de entrada escolhidos pela resolução adaptativa, por causa, e as últimas escolhas"""
+    resolution = current_app.extensions.get('resolution')
+    if resolution is None:
+        return jsonify({"error": "Resolução adaptativa desligada."}), 400
+    return jsonify(resolution.stats()), 200
+
+def _error(cause, message, status):
+    """Resposta de erro do processamento de imagens, contada em erros_total pela causa"""
+    ERRORS.inc(causa=cause)
+    return jsonify({"error": message}), status
+
 @main_bp.route("/process_image", methods=['POST'])
 def process_image():
     if 'image' not in request.files:
-        return jsonify({"error": "Nenhuma imagem enviada."}), 400
+        return _error("sem_imagem", "Nenhuma imagem enviada.", 400)
     
     try:
-        depth_model = load_depth_anything() # carrega modelo de profundidade
-        try:
-            yolo_model = YOLO("yolo11n.pt")
-        except Exception as e:
-            yolo_model = None
-            print("Erro ao carregar modelo YOLO", e)
-        
-        if not yolo_model or not depth_model:
-            return jsonify({"error": "Modelo YOLO ou Depth Anything não foi carregado corretamente."}), 400
+        options = _image_options()
+    except ValueError as e:
+        return _error("opcao_invalida", str(e), 400)
+    
+    try:
+        models = _shared_models()
+        if not models.ready or models.depth_model_for(options["encoder"], options["dataset"], record_use=False) is None:
+            return _error("modelos_indisponiveis", "Modelo YOLO ou Depth Anything não foi carregado corretamente.", 400)
 
         file = request.files['image']
-        image = Image.open(file.stream)
-        image_width, _ = image.size
-        
-        print("Imagem recebida. Iniciando detecção...")
-        
-        t_start = time.perf_counter()
-
-        detections = detect_objects(yolo_model, image)
-        if len(detections) == 0:
-            return jsonify({"error": "Nenhum objeto detectado na imagem."}), 400
-        
-        depth_map = generate_depth_map(depth_model, image)
-        results = calculate_object_distances(detections, depth_map)
-        description  = format_description(results, image_width)
+        image = _decode_upload(file.stream, options["with_depth_map"])
+
+        response, status = _process_image(models, image, **options)
+        return jsonify(response), status
+    
+    except Exception as e:
+        current_app.logger.exception("Erro interno: %s", e)
+        return _error("interno", f"Erro inesperado: {str(e)}", 500)
+
+
+@main_bp.route("/jobs", methods=['POST'])
+def submit_job():
+    """Versão assíncrona do /process_image: enfileira a imagem e responde 202 com o id do job.
+    Com a fila cheia responde 429 e Retry-After estimado pelo tempo de serviço medido."""
+    jobs = current_app.extensions.get('jobs')
+    if jobs is None:
+        return jsonify({"error": "Processamento assíncrono desligado."}), 400
+    if 'image' not in request.files:
+        return _error("sem_imagem", "Nenhuma imagem enviada.", 400)
+
+    try:
+        options = _image_options()
+    except ValueError as e:
+        return _error("opcao_invalida", str(e), 400)
+
+    try:
+        models = _shared_models()
+        if not models.ready or models.depth_model_for(options["encoder"], options["dataset"], record_use=False) is None:
+            return _error("modelos_indisponiveis", "Modelo YOLO ou Depth Anything não foi carregado corretamente.", 400)
+
+        # decodifica agora: o arquivo enviado deixa de existir quando a requisição termina
+        image = _decode_upload(request.files['image'].stream, options["with_depth_map"])
+    except Exception as e:
+        return _error("imagem_invalida", f"Imagem inválida: {str(e)}", 400)
+
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            return _process_image(models, image, **options)
+
+    try:
+        job = jobs.submit(run)
+    except QueueFull as e:
+        ERRORS.inc(causa="fila_cheia")
+        return jsonify({"error": str(e)}), 429, {"Retry-After": str(e.retry_after)}
+
+    location = url_for('main.job_status', job_id=job.id)
+    return jsonify({**job.info(), "na_fila": jobs.pending, "resultado": location}), 202, {"Location": location}
+
+
+@main_bp.route("/jobs")
+def jobs_status():
+    """Ocupação da fila de jobs e tempo de serviço medido"""
+    jobs = current_app.extensions.get('jobs')
+    if jobs is None:
+        return jsonify({"error": "Processamento assíncrono desligado."}), 400
+    return jsonify(jobs.stats()), 200
+
+
+@main_bp.route("/jobs/<job_id>")
+def job_status(job_id):
+    """Estado/resultado de um job. Com `wait` (segundos) a resposta espera o job terminar
+    (long-poll), até JOBS_MAX_WAIT_S. Enquanto não termina responde 202."""
+    jobs = current_app.extensions.get('jobs')
+    if jobs is None:
+        return jsonify({"error": "Processamento assíncrono desligado."}), 400
+
+    try:
+        wait = min(float(request.args.get('wait', 0)), current_app.config['JOBS_MAX_WAIT_S'])
+    except ValueError:
+        return jsonify({"error": f"Tempo de espera inválido: {request.args.get('wait')}"}), 400
+
+    job = jobs.wait(job_id, wait) if wait > 0 else jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado (ou expirado)."}), 404
+
+    if job.state == "concluido":
+        response, status = job.result
+        return jsonify({**job.info(), **response}), status
+    if job.state == "erro":
+        return jsonify({**job.info(), "error": f"Erro inesperado: {str(job.result)}"}), 500
+    return jsonify(job.info()), 202, {"Retry-After": str(jobs.retry_after())}
+
+
+def _decode_upload(stream, with_depth_map=False):
+    """Decodifica a imagem enviada uma única vez (DecodedImage). A decodificação reduzida só é
+    usada quando o mapa de profundidade não é pedido, pois ele sai na resolução decodificada."""
+    return decode_image(
+        stream,
+        min_short_side=max(current_app.config['DEPTH_INPUT_SIZES'] + [518]),
+        draft=current_app.config['IMAGE_DRAFT_DECODE'] and not with_depth_map,
+    )
+
+
+def _process_image(models, image, encoder, dataset, statistic, quality, with_depth_map, deadline=None):
+    """Resposta de /process_image e /jobs, contada na fila de profundidade da política de resolução"""
+    policy = current_app.extensions.get('resolution')
+    with policy.working() if policy is not None else nullcontext():
+        return _cached_image(models, image, encoder, dataset, statistic, quality, with_depth_map, deadline)
+
+
+def _cached_image(models, image, encoder, dataset, statistic, quality, with_depth_map, deadline=None):
+    """Resposta de _process_image, passando pelo cache de resultados quando ligado"""
+    analyze = lambda: _analyze_image(models, image, encoder, dataset, statistic, quality, with_depth_map, deadline)
+    cache = current_app.extensions.get('result_cache')
+    if cache is None:
+        response, status = analyze()
+    else:
+        # a mesma imagem com a mesma configuração devolve a resposta já calculada. O prazo e a fila
+        # não entram na chave, então respostas degradadas por prazo ou reduzidas pela fila não são guardadas
+        config = (encoder, dataset, statistic, quality, with_depth_map)
+        (response, status), origin = cache.get_or_compute(image, config, analyze, store=_cacheable)
+        # cópia: a resposta guardada não leva as etapas nem a origem
+        response = {**response, "cache": origin}
 
-        t3 = time.perf_counter()
-        print(f"Processamento finalizado em {(t3 - t_start):.2f} segundos.")
-        print(description)
-        print(results)
+    _observe_stages(image)
+    if status == 200 and isinstance(image, DecodedImage):
+        # etapas desta requisição (num acerto, apenas as de leitura e decodificação)
+        response["etapas"] = image.stages
+    return response, status
 
-        return jsonify({"descricao": description , "resultados": results}), 200
+
+def _cacheable(result):
+    """Respostas completas, que não dependem do prazo nem da carga do processo"""
+    response, status = result
+    return (
+        status == 200
+        and response.get("qualidade", {}).get("nivel", "completa") == "completa"
+        and "fila" not in response.get("resolucao_profundidade", {})
+    )
+
+
+def _observe_stages(image):
+    """Duração das etapas registradas no DecodedImage nos histogramas de etapa_duracao_segundos"""
+    if isinstance(image, DecodedImage):
+        for stage, info in image.stages.items():
+            STAGE_LATENCY.observe(info["ms"] / 1000, etapa=stage)
+
+
+def _analyze_image(models, image, encoder, dataset, statistic, quality, with_depth_map, deadline=None):
+    """Detecção, profundidade e distâncias de uma imagem; retorna (resposta, status HTTP).
+    deadline: prazo em time.monotonic(); com o controle de admissão ligado a requisição pode ser
+    rejeitada (503) ou degradada para caber nele"""
+    admission = current_app.extensions.get('admission') if deadline is not None else None
+    if admission is not None and not admission.admit(deadline):
+        ERRORS.inc(causa="prazo")
+        return {"error": "Não é possível processar a imagem dentro do prazo informado."}, 503
+
+    default_depth = (encoder, dataset) == models.default_depth
+    image_width, _ = image.size
+
+    t_start = time.perf_counter()
+
+    batcher = current_app.extensions.get('batcher')
+    pipeline = current_app.extensions.get('pipeline')
+    policy = current_app.extensions.get('resolution')
+    timeline = None
+    resolution = None
+    plan = None
+    # com prazo a profundidade é planejada depois da detecção, então lote e pipeline não são usados
+    if batcher is not None and default_depth and admission is None:
+        # os lotes usam o modelo padrão e o input_size do agendador
+        detections, depth_map = batcher.process(image)
+    elif pipeline is not None and admission is None:
+        # a profundidade começa junto com a detecção, então só a fila e a qualidade são consideradas
+        if policy is not None:
+            resolution = policy.choose(image.size, quality=quality)
+        detections, depth_map, timeline = pipeline.process(
+            image, input_size=resolution[0] if resolution else 518, encoder=encoder, dataset=dataset
+        )
+    else:
+        t0 = time.perf_counter()
+        detections = models.detect(image)
+        _record_stage(image, "yolo", t0)
+        depth_map = None
+    
+    DETECTIONS.observe(len(detections))
+    if len(detections) == 0:
+        ERRORS.inc(causa="sem_deteccoes")
+        return {"error": "Nenhum objeto detectado na imagem."}, 400
     
+    if depth_map is None:
+        if policy is not None:
+            resolution = policy.choose(image.size, detections, quality)
+        input_size = resolution[0] if resolution else 518
+        if admission is not None:
+            plan = admission.plan(deadline, image.size, encoder, input_size, models.resident_encoders(dataset))
+            if plan.depth and (plan.encoder, plan.input_size) != (encoder, input_size):
+                encoder, input_size = plan.encoder, plan.input_size
+                default_depth = (encoder, dataset) == models.default_depth
+                resolution = (input_size, plan.reason, None)
+        if plan is None or plan.depth:
+            t0 = time.perf_counter()
+            depth_map = models.depth(image, input_size=input_size, encoder=encoder, dataset=dataset)
+            # memória: tensor float32 de entrada da rede
+            _record_stage(image, "profundidade", t0, depth_work(image.size, input_size) * 1e6 * 3 * 4)
+
+    t_post = time.perf_counter()
+    if depth_map is None:
+        # prazo curto demais para a profundidade: apenas as detecções
+        results = detections
+        description = format_detections(detections)
+    else:
+        results = calculate_object_distances(
+            detections, depth_map, statistic, current_app.config['DEPTH_INDEX_MIN_BOXES']
+        )
+        description  = format_description(results, image_width)
+        if models.latencies is not None:
+            models.latencies.record("pos_processamento", time.perf_counter() - t_post)
+        _record_stage(image, "distancias", t_post)
+    if isinstance(image, DecodedImage):
+        # as caixas voltam para as coordenadas da imagem enviada (decodificação reduzida)
+        image.restore_boxes(results)
+
+    _record_stage(image, "processamento", t_start)
+
+    response = {"descricao": description , "resultados": results}
+    if with_depth_map and depth_map is not None:
+        response["mapa_profundidade"] = encode_depth_map(depth_map.full_resolution())
+    if timeline is not None:
+        response["linha_do_tempo"] = timeline
+    if not default_depth and depth_map is not None:
+        response["modelo_profundidade"] = {"encoder": encoder, "dataset": dataset}
+    if resolution is not None and depth_map is not None:
+        response["resolucao_profundidade"] = {"tamanho": resolution[0], "motivo": resolution[1]}
+        if resolution[2] is not None:
+            response["resolucao_profundidade"]["fila"] = resolution[2]
+    if plan is not None:
+        admission.finish(plan.tier, deadline)
+        response["qualidade"] = {"nivel": plan.tier, "motivo": plan.reason}
+
+    return response, 200
+
+
+def _record_stage(image, stage, start, nbytes=None):
+    """Tempo (e memória) de uma etapa, guardados no DecodedImage para a resposta"""
+    if isinstance(image, DecodedImage):
+        image.record(stage, time.perf_counter() - start, nbytes)
+
+
+@main_bp.route("/process_batch", methods=['POST'])
+def process_batch_route():
+    """Processa muitas imagens em uma requisição (campo `images`, repetido, com imagens ou .zip).
+    A resposta é NDJSON: um registro por imagem assim que fica pronto e, por fim, o resumo."""
+    processor = current_app.extensions.get('batch_processor')
+    if processor is None:
+        return jsonify({"error": "Processamento em lote desligado."}), 400
+    files = request.files.getlist('images')
+    if not files:
+        return _error("sem_imagem", "Nenhuma imagem enviada.", 400)
+
+    try:
+        statistic = parse_statistic(request.values.get('statistic'))
+        encoder = request.values.get('encoder') or current_app.config['DEPTH_ENCODER']
+        dataset = request.values.get('dataset') or current_app.config['DEPTH_DATASET']
+        check_depth_model(encoder, dataset)
+    except ValueError as e:
+        return _error("opcao_invalida", str(e), 400)
+
+    try:
+        models = _shared_models()
+        if not models.ready or models.depth_model_for(encoder, dataset, record_use=False) is None:
+            return _error("modelos_indisponiveis", "Modelo YOLO ou Depth Anything não foi carregado corretamente.", 400)
+    except Exception as e:
+        current_app.logger.exception("Erro interno: %s", e)
+        return _error("interno", f"Erro inesperado: {str(e)}", 500)
+
+    uploads = iter_uploads(files, current_app.config['PROCESS_BATCH_MAX_IMAGES'])
+    records = processor.process(
+        uploads, statistic, current_app.config['DEPTH_INDEX_MIN_BOXES'], encoder=encoder, dataset=dataset
+    )
+
+    def generate():
+        try:
+            for record in records:
+                yield ndjson(record)
+        except Exception as e:
+            # o status 200 já foi enviado: o erro vai como último registro
+            current_app.logger.exception("Erro interno: %s", e)
+            ERRORS.inc(causa="interno")
+            yield ndjson({"error": str(e)})
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@main_bp.route("/process_video", methods=['POST'])
+def process_video_route():
+    """Processa um vídeo enviado: YOLO em todos os quadros e profundidade apenas quando a cena muda"""
+    if 'video' not in request.files:
+        return _error("sem_video", "Nenhum vídeo enviado.", 400)
+
+    try:
+        statistic = parse_statistic(request.values.get('statistic'))
+        stride = int(request.values.get('stride', 1))
+        if stride < 1:
+            raise ValueError(f"Intervalo entre quadros inválido: {stride}")
+    except ValueError as e:
+        return _error("opcao_invalida", str(e), 400)
+
+    try:
+        models = _shared_models()
+        if not models.ready:
+            return _error("modelos_indisponiveis", "Modelo YOLO ou Depth Anything não foi carregado corretamente.", 400)
+
+        options = tracker_options(current_app.config)
+        tracker = IouTracker(**options) if options is not None else None
+        result = process_video(
+            models,
+            request.files['video'].stream,
+            DepthGate(**gate_options(current_app.config)),
+            statistic,
+            current_app.config['DEPTH_INDEX_MIN_BOXES'],
+            stride=stride,
+            max_frames=current_app.config['VIDEO_MAX_FRAMES'],
+            tracker=tracker,
+        )
+        return jsonify(result), 200
+
+    except ValueError as e:
+        return _error("video_invalido", str(e), 400)
+    except Exception as e:
+        current_app.logger.exception("Erro interno: %s", e)
+        return _error("interno", f"Erro inesperado: {str(e)}", 500)
+
+@main_bp.route("/process_frame", methods=['POST'])
+def process_frame_route():
+    """Processa um quadro de uma sessão (campo `session`; sem ele uma nova sessão é criada),
+    reaproveitando a profundidade do quadro-chave da sessão quando a cena pouco mudou e a
+    distância das trilhas que não se moveram"""
+    if 'image' not in request.files:
+        return _error("sem_imagem", "Nenhuma imagem enviada.", 400)
+
+    try:
+        statistic = parse_statistic(request.values.get('statistic'))
+    except ValueError as e:
+        return _error("opcao_invalida", str(e), 400)
+
+    try:
+        models = _shared_models()
+        if not models.ready:
+            return _error("modelos_indisponiveis", "Modelo YOLO ou Depth Anything não foi carregado corretamente.", 400)
+
+        image = decode_image(request.files['image'].stream, draft=False)
+        session = current_app.extensions['frame_sessions'].get(request.values.get('session'))
+        with session.lock:
+            result = process_frame(
+                models, image.array, session.gate, statistic, current_app.config['DEPTH_INDEX_MIN_BOXES'],
+                session.tracker,
+            )
+            session.frames += 1
+            frame_index = session.frames
+
+        return jsonify({"sessao": session.id, "quadro": frame_index, **result}), 200
+
     except Exception as e:
-        print(f"Erro interno: {str(e)}")
-        return jsonify({"error": f"Erro inesperado: {str(e)}"}), 500
+        current_app.logger.exception("Erro interno: %s", e)
+        return _error("interno", f"Erro inesperado: {str(e)}", 500)
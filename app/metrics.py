@@ -0,0 +1,208 @@
+import time
+import bisect
+import threading
+
+from flask import g, request
+
+# limites (segundos) dos histogramas de latência: de 1 ms (etapas de pós-processamento) a 30 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return "+Inf" if value == float("inf") else repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+    # desligada pelo registro quando METRICS_ENABLED é falso: as atualizações são ignoradas
+    enabled = True
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple([labels[name] for name in self.labels])
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, value=1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labels, key)} {_number(v)}" for key, v in values]
+
+
+class Gauge(_Metric):
+    """Valor lido na hora da coleta: `read` devolve um número (sem rótulos) ou um dict
+    {valores dos rótulos: número}"""
+    kind = "gauge"
+
+    def __init__(self, name, help, read, labels=()):
+        super().__init__(name, help, labels)
+        self.read = read
+
+    def render(self):
+        value = self.read()
+        values = value.items() if isinstance(value, dict) else [((), value)]
+        return self.header() + [
+            f"{self.name}{_labels(self.labels, key if isinstance(key, tuple) else (key,))} {_number(v)}"
+            for key, v in values
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # contagem por faixa (a última é +Inf) e soma
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def render(self):
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = self.header()
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Métricas do processo no formato de texto do Prometheus (GET /metrics).
+
+    Contadores e histogramas são atualizados no caminho das requisições com um lock por métrica
+    (sem E/S); gauges são lidos só na coleta. Com vários workers do gunicorn cada processo tem as
+    suas métricas, e a coleta deve ser feita por worker.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._enabled = True
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        """Liga ou desliga as atualizações de todas as métricas (definido pelo create_app)"""
+        self._enabled = bool(value)
+        for metric in self._metrics.values():
+            metric.enabled = self._enabled
+
+    def _register(self, metric):
+        # registrar de novo (create_app chamado outra vez) substitui a métrica anterior
+        metric.enabled = self._enabled
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, read, labels=()):
+        return self._register(Gauge(name, help, read, labels))
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+# Instância única por processo, com as métricas do pipeline
+metrics = MetricsRegistry()
+
+REQUESTS = metrics.counter("requisicoes_total", "Requisições HTTP atendidas", ("rota", "metodo", "status"))
+REQUEST_LATENCY = metrics.histogram("requisicao_duracao_segundos", "Duração das requisições HTTP", ("rota",))
+ERRORS = metrics.counter("erros_total", "Respostas de erro do processamento de imagens, por causa", ("causa",))
+DETECTIONS = metrics.histogram("deteccoes_por_imagem", "Objetos detectados pelo YOLO por imagem",
+                               buckets=COUNT_BUCKETS)
+STAGE_LATENCY = metrics.histogram("etapa_duracao_segundos", "Duração de cada etapa do pipeline", ("etapa",))
+MODEL_LATENCY = metrics.histogram("modelo_duracao_segundos", "Duração das inferências de cada modelo", ("modelo",))
+RESOLUTION_CHOICES = metrics.counter("resolucao_escolhas_total",
+                                     "Tamanhos de entrada escolhidos pela resolução adaptativa, por causa",
+                                     ("tamanho", "causa"))
+
+
+def instrument(app):
+    """Conta as requisições do app por rota (regra da URL, sem os valores dos parâmetros), método e
+    status, mede a duração de cada uma e expõe quantas estão em andamento"""
+    state = {"em_andamento": 0}
+    lock = threading.Lock()
+
+    def started():
+        g.metrics_start = time.perf_counter()
+        with lock:
+            state["em_andamento"] += 1
+
+    def finished(response):
+        route = request.url_rule.rule if request.url_rule is not None else "desconhecida"
+        REQUESTS.inc(rota=route, metodo=request.method, status=response.status_code)
+        if "metrics_start" in g:
+            REQUEST_LATENCY.observe(time.perf_counter() - g.metrics_start, rota=route)
+        return response
+
+    def teardown(exc=None):
+        with lock:
+            state["em_andamento"] -= 1
+
+    app.before_request(started)
+    app.after_request(finished)
+    app.teardown_request(teardown)
+    metrics.gauge("requisicoes_em_andamento", "Requisições HTTP em andamento no processo",
+                  lambda: state["em_andamento"])
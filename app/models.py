@@ -0,0 +1,290 @@
+import time
+import logging
+import threading
+from collections import Counter, OrderedDict
+import numpy as np
+from PIL import Image
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dpt import DepthAnythingV2
+from app.admission import depth_work
+from app.metrics import MODEL_LATENCY
+from app.backends import TorchDepthBackend, check_backend
+from app.compiled import CompiledDepthModel
+from app.utils import (
+    check_depth_model,
+    load_depth_anything,
+    load_depth_onnx,
+    load_yolo,
+    detect_objects,
+    detect_objects_batch,
+    generate_depth_map,
+    generate_depth_lowres,
+    generate_depth_maps
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """Registro de modelos do processo: carrega o YOLO e os modelos Depth Anything V2 uma única vez
+    e compartilha as mesmas instâncias entre todas as requisições.
+
+    Cada par (encoder, dataset) de profundidade é carregado na primeira vez em que é pedido e
+    fica residente enquanto couber no orçamento de memória; ao estourar, os modelos usados há
+    mais tempo são descarregados (o modelo padrão nunca é). Requisições em andamento mantêm a
+    referência ao modelo descarregado até terminarem.
+    """
+
+    def __init__(self):
+        self._load_lock = threading.Lock()
+        # protege o dicionário de modelos residentes (operações rápidas, sem carga)
+        self._models_lock = threading.Lock()
+        # O predictor do ultralytics guarda estado entre chamadas, então as inferências
+        # do YOLO são serializadas. O modelo de profundidade é somente leitura em eval/no_grad.
+        self._yolo_lock = threading.Lock()
+        self.depth_models = OrderedDict()  # (encoder, dataset) -> backend, do menos para o mais recente
+        self.depth_info = {}
+        self.default_depth = ('vitb', 'hypersim')
+        self.memory_budget = 0
+        self.evictions = Counter()
+        self.yolo_model = None
+        self.load_times = {}
+        self._options = {}
+        # LatencyEstimates do controle de admissão (None = latências não registradas)
+        self.latencies = None
+
+    @property
+    def depth_model(self):
+        """Modelo de profundidade padrão"""
+        return self.depth_models.get(self.default_depth)
+
+    @property
+    def ready(self):
+        return self.depth_model is not None and self.yolo_model is not None
+
+    def load(self, yolo_weights="yolo11n.pt", warmup=True, shape_buckets=(), depth_options=None,
+             compile_options=None, backend="torch", backend_options=None, encoder="vitb", dataset="hypersim",
+             memory_budget_mb=0, input_sizes=(518,)):
+        """Carrega os modelos padrão (apenas na primeira chamada) e opcionalmente faz o aquecimento.
+        shape_buckets: tamanhos (largura, altura) de imagem cujos embeddings posicionais são pré-calculados
+        input_sizes: entradas da rede em uso (ver app.resolution); os embeddings de cada bucket são
+        pré-calculados em todas elas
+        depth_options: argumentos repassados ao load_depth_anything
+        compile_options: argumentos do CompiledDepthModel (None mantém o modelo eager)
+        backend: 'torch' ou 'onnx' (ver app.backends)
+        backend_options: argumentos do load_depth_onnx ('directory' e 'threads') no backend 'onnx'
+        encoder, dataset: modelo de profundidade padrão
+        memory_budget_mb: memória máxima dos modelos de profundidade residentes (0 = sem limite)
+        As mesmas opções valem para os modelos carregados depois, sob demanda (depth_model_for)."""
+        check_backend(backend)
+        check_depth_model(encoder, dataset)
+        with self._load_lock:
+            self._options = {
+                'shape_buckets': shape_buckets,
+                'input_sizes': input_sizes,
+                'depth_options': depth_options or {},
+                'compile_options': compile_options,
+                'backend': backend,
+                'backend_options': backend_options or {},
+            }
+            self.default_depth = (encoder, dataset)
+            self.memory_budget = memory_budget_mb * 2**20
+            if self.ready:
+                return self
+
+            if self.depth_model is None:
+                self._load_depth(self.default_depth)
+                if self.depth_model is not None:
+                    self.load_times['depth'] = self.depth_info[self.default_depth]['tempo_carga_s']
+
+            if self.yolo_model is None:
+                t0 = time.perf_counter()
+                self.yolo_model = load_yolo(yolo_weights, backend)
+                self.load_times['yolo'] = time.perf_counter() - t0
+
+            if warmup and self.ready:
+                self.warmup()
+
+        return self
+
+    def depth_model_for(self, encoder=None, dataset=None, record_use=True):
+        """Modelo de profundidade do par (encoder, dataset), carregado no primeiro uso.
+        Sem argumentos devolve o padrão; None se o modelo não puder ser carregado.
+        record_use: conta o acesso como uso (False apenas para verificar/carregar)"""
+        key = (encoder or self.default_depth[0], dataset or self.default_depth[1])
+        check_depth_model(*key)
+
+        model = self._touch(key, record_use)
+        if model is not None:
+            return model
+
+        with self._load_lock:
+            # outra requisição pode ter carregado o mesmo modelo enquanto esta esperava
+            model = self._touch(key, record_use)
+            if model is None and self._load_depth(key) is not None:
+                model = self._touch(key, record_use)
+        return model
+
+    def resident_encoders(self, dataset=None):
+        """Encoders residentes treinados no dataset (padrão do registro quando omitido)"""
+        dataset = dataset or self.default_depth[1]
+        with self._models_lock:
+            return [encoder for encoder, key_dataset in self.depth_models if key_dataset == dataset]
+
+    def residency(self):
+        """Modelos de profundidade residentes (do menos para o mais recente) e o uso do orçamento"""
+        with self._models_lock:
+            models = [
+                {"encoder": encoder, "dataset": dataset, "padrao": (encoder, dataset) == self.default_depth,
+                 **self.depth_info[(encoder, dataset)]}
+                for encoder, dataset in self.depth_models
+            ]
+            evictions = [{"encoder": e, "dataset": d, "descarregamentos": n} for (e, d), n in self.evictions.items()]
+        return {
+            "orcamento_mb": round(self.memory_budget / 2**20, 1),
+            "residentes_mb": round(sum(m["memoria_mb"] for m in models), 1),
+            "modelos": models,
+            "descarregados": evictions,
+        }
+
+    def _touch(self, key, record_use=True):
+        with self._models_lock:
+            model = self.depth_models.get(key)
+            if model is not None and record_use:
+                self.depth_models.move_to_end(key)
+                info = self.depth_info[key]
+                info['usos'] += 1
+                info['ultimo_uso'] = time.time()
+            return model
+
+    def _load_depth(self, key):
+        """Carrega o modelo (com _load_lock adquirido), registra o tempo e aplica o orçamento"""
+        encoder, dataset = key
+        options = self._options
+        t0 = time.perf_counter()
+        if options['backend'] == "onnx":
+            # o grafo exportado já tem formato dinâmico; compile_options e shape_buckets não se aplicam
+            model = self._load_depth_onnx(encoder, dataset, options['depth_options'], options['backend_options'])
+        else:
+            model = self._load_depth_torch(encoder, dataset, options['depth_options'], options['shape_buckets'],
+                                           options['input_sizes'], options['compile_options'])
+        if model is None:
+            return None
+
+        memory_mb = model.memory_bytes() / 2**20
+        with self._models_lock:
+            self.depth_models[key] = model
+            self.depth_info[key] = {
+                "backend": model.name,
+                "memoria_mb": round(memory_mb, 1),
+                "tempo_carga_s": round(time.perf_counter() - t0, 3),
+                "carregado_em": time.time(),
+                "ultimo_uso": time.time(),
+                "usos": 0,
+            }
+            self._evict(keep=key)
+        logger.info("Modelo de profundidade %s/%s residente (%.0f MB, %.2f s).",
+                    encoder, dataset, memory_mb, self.depth_info[key]['tempo_carga_s'])
+        return model
+
+    def _evict(self, keep):
+        """Descarrega os modelos menos usados recentemente até caber no orçamento (com _models_lock)"""
+        if not self.memory_budget:
+            return
+        total = sum(info["memoria_mb"] for info in self.depth_info.values()) * 2**20
+        for key in list(self.depth_models):
+            if total <= self.memory_budget:
+                break
+            if key in (keep, self.default_depth):
+                continue
+            del self.depth_models[key]
+            total -= self.depth_info.pop(key)["memoria_mb"] * 2**20
+            self.evictions[key] += 1
+            logger.info("Modelo de profundidade %s/%s descarregado (orçamento de memória).", *key)
+
+    def _load_depth_torch(self, encoder, dataset, depth_options, shape_buckets, input_sizes, compile_options):
+        model = load_depth_anything(encoder, dataset, **depth_options)
+        if model is not None and shape_buckets:
+            # no dtype dos tokens sob a precisão configurada (a chave do cache inclui o dtype)
+            model.precompute_pos_encoding(
+                {DepthAnythingV2.get_input_shape(h, w, size) for w, h in shape_buckets for size in input_sizes}
+            )
+
+        if model is not None and compile_options:
+            # medido à parte: a compilação não entra na latência de regime
+            t0 = time.perf_counter()
+            model = CompiledDepthModel(model, **compile_options).compile_all()
+            self.load_times[f'depth_compile:{encoder}:{dataset}'] = time.perf_counter() - t0
+            logger.info("Grafos de profundidade (%s) compilados em %.2f segundos.",
+                        compile_options['mode'], time.perf_counter() - t0)
+
+        return TorchDepthBackend(model) if model is not None else None
+
+    def _load_depth_onnx(self, encoder, dataset, depth_options, backend_options):
+        precision = depth_options.get('precision') or {}
+        if depth_options.get('quantize') or any(value != 'fp32' for value in precision.values()):
+            logger.warning("Quantização e precisão por etapa não se aplicam ao backend ONNX; usando o modelo float32.")
+        return load_depth_onnx(encoder, dataset, attn_backend=depth_options.get('attn_backend', 'sdpa'),
+                               **backend_options)
+
+    def warmup(self, size=(640, 480)):
+        """Roda uma inferência com imagem sintética para inicializar kernels e alocações"""
+        t0 = time.perf_counter()
+        image = Image.fromarray(np.zeros((size[1], size[0], 3), dtype=np.uint8))
+        self.detect(image)
+        self.depth(image)
+        self.load_times['warmup'] = time.perf_counter() - t0
+        logger.info("Aquecimento dos modelos finalizado em %.2f segundos.", self.load_times['warmup'])
+
+    def detect(self, image):
+        """Detecção de objetos com o YOLO compartilhado"""
+        with self._yolo_lock:
+            t0 = time.perf_counter()
+            detections = detect_objects(self.yolo_model, image)
+            elapsed = time.perf_counter() - t0
+        MODEL_LATENCY.observe(elapsed, modelo="yolo")
+        if self.latencies is not None:
+            self.latencies.record("yolo", elapsed)
+        return detections
+
+    def detect_batch(self, images):
+        """Detecção de objetos em lote (uma chamada ao YOLO para todas as imagens)"""
+        with self._yolo_lock:
+            t0 = time.perf_counter()
+            detections = detect_objects_batch(self.yolo_model, images)
+        MODEL_LATENCY.observe(time.perf_counter() - t0, modelo="yolo/lote")
+        return detections
+
+    def depth(self, image, full_resolution=False, input_size=518, encoder=None, dataset=None):
+        """Mapa de profundidade com o Depth Anything V2 compartilhado.
+        Por padrão fica na resolução da rede (LowResDepth); full_resolution devolve o mapa HxW em numpy.
+        input_size: lado menor da entrada da rede (ver app.resolution)
+        encoder, dataset: modelo a usar (padrão do registro quando omitidos)"""
+        model = self.depth_model_for(encoder, dataset)
+        if model is None:
+            raise RuntimeError(f"Modelo de profundidade {encoder}/{dataset} não pôde ser carregado")
+        t0 = time.perf_counter()
+        if full_resolution:
+            depth_map = generate_depth_map(model, image, input_size)
+        else:
+            depth_map = generate_depth_lowres(model, image, input_size)
+        elapsed = time.perf_counter() - t0
+        stage = f"profundidade/{encoder or self.default_depth[0]}"
+        MODEL_LATENCY.observe(elapsed, modelo=stage)
+        if self.latencies is not None:
+            # por megapixel de entrada da rede, para estimar qualquer input_size do mesmo encoder
+            self.latencies.record(stage, elapsed, depth_work(image.size, input_size))
+        return depth_map
+
+    def depth_batch(self, images, input_size=518, encoder=None, dataset=None):
+        """Mapas de profundidade em lote (imagens com o mesmo formato de entrada da rede)"""
+        model = self.depth_model_for(encoder, dataset)
+        if model is None:
+            raise RuntimeError(f"Modelo de profundidade {encoder}/{dataset} não pôde ser carregado")
+        t0 = time.perf_counter()
+        depth_maps = generate_depth_maps(model, images, input_size)
+        MODEL_LATENCY.observe(time.perf_counter() - t0, modelo=f"profundidade/{encoder or self.default_depth[0]}/lote")
+        return depth_maps
+
+
+# Instância única por processo
+registry = ModelRegistry()
@@ -0,0 +1,126 @@
+import time
+import ctypes
+import logging
+import threading
+import torch
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+try:
+    # libgomp carregada pelo torch; omp_set_num_threads altera apenas a thread que o chama
+    _omp_set_num_threads = ctypes.CDLL(None).omp_set_num_threads
+except (AttributeError, OSError):
+    _omp_set_num_threads = None
+
+
+def _set_intra_op_threads(n):
+    """Orçamento de threads das regiões paralelas da thread do executor. torch.set_num_threads
+    não serve: ele também troca o número global que as threads novas do processo herdam,
+    desfazendo o orçamento do worker (app.topology)."""
+    # a primeira chamada inicializa a thread com o orçamento do processo; depois só esta thread muda
+    torch.get_num_threads()
+    if _omp_set_num_threads is not None:
+        _omp_set_num_threads(n)
+
+
+def split_thread_budget(total=None, yolo_threads=0, depth_threads=0):
+    """Divide o orçamento de threads intra-op entre YOLO e profundidade (0 = automático).
+    O modelo de profundidade é o mais caro, então fica com a maior parte."""
+    total = total or torch.get_num_threads()
+    if not yolo_threads:
+        yolo_threads = max(1, total // 3)
+    if not depth_threads:
+        depth_threads = max(1, total - yolo_threads)
+    return yolo_threads, depth_threads
+
+
+class ConcurrentPipeline:
+    """Executa o YOLO e o Depth Anything V2 em paralelo dentro da mesma requisição.
+
+    A profundidade é iniciada de forma especulativa junto com a detecção; se o YOLO não
+    encontrar objetos, o job de profundidade é cancelado (se ainda não começou) ou seu
+    resultado é descartado. Cada modelo roda em um executor com seu próprio orçamento de
+    threads intra-op, para que os dois não disputem os mesmos núcleos. Os executores têm
+    `max_concurrency` threads (as requisições atendidas ao mesmo tempo pelo worker), para que
+    uma requisição lenta não segure as demais na fila do executor.
+    """
+
+    def __init__(self, models, yolo_threads=0, depth_threads=0, max_concurrency=8):
+        self.models = models
+        self.max_concurrency = max_concurrency
+        self._requested = (yolo_threads, depth_threads)
+        self._lock = threading.Lock()
+        self._yolo_executor = self._depth_executor = None
+        self.yolo_threads = self.depth_threads = None
+
+    def _start(self):
+        """Divide o orçamento e cria os executores no primeiro uso. Com workers pré-forkados o
+        pipeline é criado no mestre, antes de app.topology definir as threads de cada worker; o
+        orçamento lido ali seria o do host inteiro."""
+        with self._lock:
+            if self._depth_executor is not None:
+                return
+            yolo_threads, depth_threads = self._requested
+            self.yolo_threads, self.depth_threads = split_thread_budget(
+                yolo_threads=yolo_threads, depth_threads=depth_threads
+            )
+            if _omp_set_num_threads is None:
+                logger.warning("OpenMP indisponível: YOLO e profundidade usam o orçamento de threads do processo.")
+            self._yolo_executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix="yolo",
+                initializer=_set_intra_op_threads, initargs=(self.yolo_threads,)
+            )
+            self._depth_executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix="depth",
+                initializer=_set_intra_op_threads, initargs=(self.depth_threads,)
+            )
+
+    def shutdown(self):
+        if self._depth_executor is not None:
+            self._yolo_executor.shutdown(wait=False, cancel_futures=True)
+            self._depth_executor.shutdown(wait=False, cancel_futures=True)
+
+    def process(self, image, input_size=518, encoder=None, dataset=None):
+        """Retorna (detecções, mapa de profundidade ou None, linha do tempo em ms).
+        input_size: entrada da rede de profundidade (escolhida antes da detecção)
+        encoder, dataset: modelo de profundidade (padrão do registro quando omitidos)"""
+        self._start()
+        t0 = time.perf_counter()
+        stages = {}
+
+        def timed(name, fn):
+            def run():
+                start = time.perf_counter()
+                try:
+                    return fn(image)
+                finally:
+                    stages[name] = {
+                        "inicio_ms": round((start - t0) * 1000, 1),
+                        "fim_ms": round((time.perf_counter() - t0) * 1000, 1),
+                    }
+            return run
+
+        depth = lambda image: self.models.depth(image, input_size=input_size, encoder=encoder, dataset=dataset)
+        depth_future = self._depth_executor.submit(timed("profundidade", depth))
+        detections = self._yolo_executor.submit(timed("yolo", self.models.detect)).result()
+
+        if len(detections) == 0:
+            # nenhum objeto: cancela a profundidade ou descarta o resultado quando ela terminar
+            depth_future.cancel()
+            return detections, None, self._timeline(stages, t0, depth_status="descartada")
+
+        depth_map = depth_future.result()
+        return detections, depth_map, self._timeline(stages, t0, depth_status="usada")
+
+    def _timeline(self, stages, t0, depth_status):
+        timeline = dict(stages)
+        timeline["profundidade_status"] = depth_status
+        timeline["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        yolo, depth = stages.get("yolo"), stages.get("profundidade")
+        if yolo and depth:
+            overlap = min(yolo["fim_ms"], depth["fim_ms"]) - max(yolo["inicio_ms"], depth["inicio_ms"])
+            timeline["sobreposicao_ms"] = round(max(0.0, overlap), 1)
+
+        return timeline
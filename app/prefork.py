@@ -0,0 +1,98 @@
+import gc
+import os
+import logging
+
+import torch
+
+from app.backends import check_backend
+
+logger = logging.getLogger(__name__)
+
+
+def load_before_fork(registry, warmup=True, **options):
+    """Carrega os modelos no processo mestre do gunicorn (preload_app), antes do fork dos workers.
+
+    Os pesos ficam em páginas compartilhadas por copy-on-write com todos os workers. A carga e o
+    aquecimento rodam com uma única thread intra-op: o pool do OpenMP criado no mestre não
+    sobrevive ao fork e os workers travariam na primeira inferência. O número de threads é
+    restaurado depois, e cada worker cria o próprio pool no primeiro uso.
+    Sessões do ONNX Runtime também não sobrevivem ao fork; com esse backend os modelos são
+    carregados por cada worker na primeira requisição."""
+    check_backend(options.get('backend', "torch"))
+    if options.get('backend') == "onnx":
+        logger.info("Backend ONNX: os modelos serão carregados por cada worker, após o fork.")
+        return registry
+    threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    try:
+        registry.load(warmup=warmup, **options)
+    finally:
+        torch.set_num_threads(threads)
+    return registry
+
+
+def start_after_fork(*services):
+    """Inicia as threads de `services` (objetos com start()) apenas nos processos filhos. Threads
+    do mestre não existem nos workers, e as filas herdadas guardariam as esperas delas: um put
+    acordaria uma thread inexistente e os jobs ficariam parados na fila"""
+    os.register_at_fork(after_in_child=lambda: [service.start() for service in services])
+
+
+def freeze_shared_objects():
+    """Move os objetos Python do mestre para a geração permanente do coletor de lixo. Assim as
+    coletas nos workers não escrevem nos cabeçalhos desses objetos, o que copiaria as páginas"""
+    gc.collect()
+    gc.freeze()
+
+
+def process_memory(pid="self"):
+    """Memória de um processo em MB, de /proc/<pid>/smaps_rollup (Linux): RSS, PSS (páginas
+    compartilhadas divididas entre os processos que as usam) e única (USS, páginas privadas, o
+    que o processo libera ao terminar). None quando indisponível."""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as smaps:
+            for line in smaps:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[key] = int(value.split()[0])
+    except OSError:
+        return None
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "unica_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 1),
+        "compartilhada_mb": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024, 1),
+    }
+
+
+def child_pids(parent):
+    """PIDs dos processos filhos de `parent` (lidos de /proc/<pid>/stat)"""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                # o nome do processo vem entre parênteses e pode conter espaços
+                ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == parent:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def workers_memory(master_pid):
+    """Memória do mestre e de cada worker pré-forkado"""
+    workers = []
+    for pid in child_pids(master_pid):
+        memory = process_memory(pid)
+        if memory is not None:
+            workers.append({"pid": pid, **memory})
+    return {
+        "mestre": {"pid": master_pid, **(process_memory(master_pid) or {})},
+        "workers": workers,
+        "total_unica_mb": round(sum(worker["unica_mb"] for worker in workers), 1),
+        "total_pss_mb": round(sum(worker["pss_mb"] for worker in workers), 1),
+    }
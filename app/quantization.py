@@ -0,0 +1,108 @@
+import os
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.ao.quantization import QuantWrapper, convert, get_default_qconfig, prepare, quantize_dynamic
+
+# "dynamic": INT8 dinâmico nas camadas nn.Linear do backbone DINOv2 (Mlp e Attention)
+# "dynamic+head": além disso, INT8 estático (calibrado) nas convoluções do DPTHead,
+# mantendo a convolução final + Sigmoid * max_depth em float32
+QUANTIZATION_MODES = ("dynamic", "dynamic+head")
+
+
+def quantized_checkpoint_path(checkpoint_path, mode):
+    """Caminho do artefato quantizado gerado a partir de um checkpoint float32"""
+    root, ext = os.path.splitext(checkpoint_path)
+    return f"{root}_{mode.replace('+', '_')}_int8{ext}"
+
+
+def _check_mode(mode):
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Modo de quantização inválido: {mode}. Use um de {QUANTIZATION_MODES}")
+
+
+def _used_head_convs(model):
+    """Convoluções do head que participam do forward (o resConfUnit1 do refinenet4 nunca é usado)"""
+    used = set()
+    hooks = [
+        conv.register_forward_hook(lambda module, args, output: used.add(id(module)))
+        for conv in model.depth_head.modules() if isinstance(conv, nn.Conv2d)
+    ]
+    try:
+        model.infer_image_lowres(np.zeros((14, 14, 3), dtype=np.uint8), input_size=14, channel_order='RGB')
+    finally:
+        for hook in hooks:
+            hook.remove()
+    return used
+
+
+def _wrap_head_convs(module, used):
+    """Envolve cada nn.Conv2d usado do head com quantização/dequantização (exceto a saída final)"""
+    for name, child in module.named_children():
+        if name == "output_conv2":
+            continue
+        if isinstance(child, nn.Conv2d):
+            if id(child) in used:
+                wrapper = QuantWrapper(child)
+                wrapper.qconfig = get_default_qconfig(torch.backends.quantized.engine)
+                setattr(module, name, wrapper)
+        else:
+            _wrap_head_convs(child, used)
+
+
+def _quantize_backbone(model):
+    quantize_dynamic(model.pretrained, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+@torch.no_grad()
+def quantize_depth_model(model, mode="dynamic", calibration_images=()):
+    """Quantiza o DepthAnythingV2 (já com os pesos float32 carregados), no próprio objeto.
+    calibration_images: imagens RGB uint8 usadas para calibrar o head no modo "dynamic+head"."""
+    _check_mode(mode)
+    model.eval()
+    _quantize_backbone(model)
+
+    if mode == "dynamic+head":
+        if not calibration_images:
+            raise ValueError("O modo dynamic+head precisa de imagens de calibração")
+        _wrap_head_convs(model.depth_head, _used_head_convs(model))
+        prepare(model.depth_head, inplace=True)
+        for image in calibration_images:
+            model.infer_image_lowres(image, channel_order='RGB')
+        convert(model.depth_head, inplace=True)
+
+    return model
+
+
+@torch.no_grad()
+def prepare_quantized_skeleton(model, mode="dynamic"):
+    """Reproduz a estrutura quantizada sem calibração, para carregar um artefato salvo com load_state_dict"""
+    _check_mode(mode)
+    model.eval()
+    _quantize_backbone(model)
+
+    if mode == "dynamic+head":
+        _wrap_head_convs(model.depth_head, _used_head_convs(model))
+        prepare(model.depth_head, inplace=True)
+        # escalas provisórias; são substituídas pelas do artefato
+        model.infer_image_lowres(np.zeros((14, 14, 3), dtype=np.uint8), input_size=14, channel_order='RGB')
+        convert(model.depth_head, inplace=True)
+
+    return model
+
+
+def load_calibration_images(directory, limit=16):
+    """Lê até `limit` imagens RGB de um diretório para calibração"""
+    from PIL import Image
+
+    images = []
+    if not directory or not os.path.isdir(directory):
+        return images
+    for name in sorted(os.listdir(directory)):
+        if len(images) >= limit:
+            break
+        try:
+            images.append(np.asarray(Image.open(os.path.join(directory, name)).convert("RGB")))
+        except OSError:
+            continue
+    return images
@@ -0,0 +1,122 @@
+import threading
+from contextlib import contextmanager
+from collections import Counter, deque
+
+from app.metrics import RESOLUTION_CHOICES
+
+# dicas de qualidade aceitas por requisição
+QUALITY_HINTS = ("high", "normal", "low")
+
+
+def parse_quality(value):
+    """Valida a dica de qualidade enviada pelo cliente (padrão: "normal")"""
+    value = (value or "normal").strip().lower()
+    if value not in QUALITY_HINTS:
+        raise ValueError(f"Qualidade inválida: {value}. Use um de {QUALITY_HINTS}")
+    return value
+
+
+def smallest_box_side(detections):
+    """Menor lado (em pixels da imagem) entre as caixas detectadas, ou None sem detecções"""
+    sides = [min(x2 - x1, y2 - y1) for x1, y1, x2, y2 in (obj["box"] for obj in detections)]
+    return min(sides) if sides else None
+
+
+class ResolutionPolicy:
+    """Escolhe o input_size do modelo de profundidade de cada requisição.
+
+    Os sinais considerados são a dica de qualidade do cliente, a fila de profundidade do
+    processo (imagens em processamento, contadas por `working`, mais os itens pendentes dos
+    serviços em `backlog`, como a fila de jobs) e o menor objeto detectado. No modo "normal" é
+    usado o menor tamanho em que o menor objeto ainda cobre `min_box_pixels` pixels na entrada
+    da rede (o lado menor da imagem vira input_size); com a fila acima de cada limite de
+    `queue_thresholds` o tamanho desce um nível. "high" usa sempre o maior tamanho e "low"
+    sempre o menor. As escolhas ficam registradas em `counts` (por tamanho), `causes` (por
+    tamanho e causa) e `history`, expostas por `stats` (GET /resolution) e em /metrics.
+    """
+
+    def __init__(self, sizes=(266, 364, 518), min_box_pixels=42, queue_thresholds=(2, 4), history=256,
+                 backlog=()):
+        self.sizes = sorted(sizes)
+        self.min_box_pixels = min_box_pixels
+        self.queue_thresholds = sorted(queue_thresholds)
+        self.backlog = list(backlog)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.counts = Counter()
+        self.causes = Counter()
+        self.history = deque(maxlen=history)
+
+    @contextmanager
+    def working(self):
+        """Conta um processamento de imagem (/process_image ou job) em andamento durante o bloco"""
+        with self._lock:
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    @property
+    def queue_depth(self):
+        """Processamentos de imagem em andamento além do atual mais os pendentes em `backlog`"""
+        return max(self._in_flight - 1, 0) + sum(service.pending for service in self.backlog)
+
+    def choose(self, image_size, detections=None, quality="normal", queue_depth=None):
+        """Retorna (input_size, motivo, fila), com fila = profundidade da fila que reduziu o
+        tamanho, ou None quando a escolha não depende da carga do processo.
+        image_size: (largura, altura) da imagem; detections: caixas do YOLO (None quando a
+        profundidade é calculada antes da detecção)."""
+        queue_depth = self.queue_depth if queue_depth is None else queue_depth
+        reduced_by = None
+
+        if quality == "high":
+            size, reason, cause = self.sizes[-1], "qualidade alta", "qualidade"
+        elif quality == "low":
+            size, reason, cause = self.sizes[0], "qualidade baixa", "qualidade"
+        else:
+            size, reason, cause = self._size_for_boxes(image_size, detections)
+
+            level = sum(queue_depth >= threshold for threshold in self.queue_thresholds)
+            if level:
+                reduced = self.sizes[max(self.sizes.index(size) - level, 0)]
+                if reduced != size:
+                    size, reason, reduced_by = reduced, f"fila com {queue_depth} requisições", queue_depth
+                    cause = "fila"
+
+        self._record(size, reason, cause, queue_depth)
+        return size, reason, reduced_by
+
+    def _size_for_boxes(self, image_size, detections):
+        if detections is None:
+            return self.sizes[-1], "profundidade antes da detecção", "antes_deteccao"
+        side = smallest_box_side(detections)
+        if side is None:
+            return self.sizes[-1], "sem caixas", "sem_caixas"
+
+        # o menor tamanho em que o objeto ainda é resolvido; objetos muito pequenos ficam no maior
+        shorter = min(image_size)
+        fitting = [size for size in self.sizes if side * size / shorter >= self.min_box_pixels]
+        return (fitting[0] if fitting else self.sizes[-1]), f"menor objeto com {side} px", "menor_objeto"
+
+    def _record(self, size, reason, cause, queue_depth):
+        # `cause` é a categoria do motivo (o texto traz números e não serve de rótulo da métrica)
+        RESOLUTION_CHOICES.inc(tamanho=size, causa=cause)
+        with self._lock:
+            self.counts[size] += 1
+            self.causes[size, cause] += 1
+            self.history.append({"tamanho": size, "motivo": reason, "fila": queue_depth})
+
+    def stats(self):
+        queue_depth = self.queue_depth
+        with self._lock:
+            by_cause = {}
+            for (size, cause), count in sorted(self.causes.items()):
+                by_cause.setdefault(size, {})[cause] = count
+            return {
+                "tamanhos": {size: self.counts[size] for size in self.sizes},
+                "causas": by_cause,
+                "fila": queue_depth,
+                "historico": list(self.history),
+            }
@@ -0,0 +1,148 @@
+import os
+import glob
+import logging
+
+import cv2
+import torch
+
+logger = logging.getLogger(__name__)
+
+# layout aplicado a este processo (ver apply_topology)
+_layout = None
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def parse_cpulist(text):
+    """CPUs de uma lista no formato do kernel, ex.: '0-3,8-11' -> [0, 1, 2, 3, 8, 9, 10, 11]"""
+    cpus = []
+    for part in filter(None, (text or "").split(",")):
+        start, _, end = part.partition("-")
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def host_topology(cpus=None):
+    """CPUs disponíveis (afinidade do processo quando `cpus` é omitido) agrupadas por nó NUMA e,
+    dentro de cada nó, por núcleo físico: {nó: [[cpu, irmã SMT], ...]}. Sem informação de NUMA
+    no /sys, todas as CPUs ficam no nó 0."""
+    available = set(cpus if cpus is not None else os.sched_getaffinity(0))
+    nodes = {}
+    for path in sorted(glob.glob("/sys/devices/system/node/node[0-9]*"), key=lambda p: int(p.rsplit("node", 1)[1])):
+        node_cpus = [cpu for cpu in parse_cpulist(_read(f"{path}/cpulist")) if cpu in available]
+        if node_cpus:
+            nodes[int(path.rsplit("node", 1)[1])] = node_cpus
+    if not nodes:
+        nodes = {0: sorted(available)}
+
+    topology = {}
+    for node, node_cpus in nodes.items():
+        cores = {}
+        for cpu in node_cpus:
+            siblings = parse_cpulist(_read(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list"))
+            cores.setdefault(min(siblings) if siblings else cpu, []).append(cpu)
+        topology[node] = list(cores.values())
+    return topology
+
+
+def _split(items, parts):
+    """Divide `items` em `parts` fatias contíguas de tamanhos que diferem em no máximo 1"""
+    size, extra = divmod(len(items), parts)
+    bounds = [i * size + min(i, extra) for i in range(parts + 1)]
+    return [items[bounds[i]:bounds[i + 1]] for i in range(parts)]
+
+
+def plan_workers(topology, workers):
+    """Núcleos físicos de cada um de `workers` workers, sem atravessar nós NUMA quando possível.
+
+    Com menos workers que nós, cada worker recebe nós inteiros. Com mais, os workers são
+    distribuídos entre os nós e cada nó tem os seus núcleos divididos entre os workers que recebeu;
+    se um nó tiver mais workers que núcleos, eles compartilham os núcleos em rodízio."""
+    nodes = list(topology.items())
+    if workers <= len(nodes):
+        return [
+            {"nos_numa": [node for node, _ in group], "nucleos": [core for _, cores in group for core in cores]}
+            for group in _split(nodes, workers)
+        ]
+
+    plans = []
+    for i, (node, cores) in enumerate(nodes):
+        count = workers // len(nodes) + (1 if i < workers % len(nodes) else 0)
+        if count <= len(cores):
+            plans += [{"nos_numa": [node], "nucleos": chunk} for chunk in _split(cores, count)]
+        else:
+            plans += [{"nos_numa": [node], "nucleos": [cores[j % len(cores)]]} for j in range(count)]
+    return plans
+
+
+def pin_threads(cpus):
+    """Fixa em `cpus` todas as threads do processo. sched_setaffinity(0) vale só para a thread que o
+    chama, e as threads já iniciadas (jobs e micro-lotes, iniciados no fork) manteriam as CPUs do host"""
+    for tid in os.listdir("/proc/self/task"):
+        try:
+            os.sched_setaffinity(int(tid), cpus)
+        except ProcessLookupError:
+            # thread terminada durante a varredura
+            continue
+
+
+def apply_topology(slot, workers, pin=True, interop_threads=1, cv2_threads=0):
+    """Aplica ao processo atual a parte do host do worker `slot` (de `workers`).
+
+    Deve rodar logo após o fork, antes de qualquer inferência: a afinidade é aplicada às threads
+    já existentes e herdada pelas criadas depois (pools do OpenMP, do OpenCV e as threads de
+    requisição). O pool intra-op do torch fica com uma thread por núcleo físico do worker; as
+    threads iniciadas antes desta chamada adotam esse número na primeira região paralela.
+    cv2_threads=0 usa o mesmo número no OpenCV. A memória alocada pelo worker vai para o nó NUMA das suas CPUs (primeiro toque); os
+    pesos carregados no mestre antes do fork ficam onde foram alocados."""
+    global _layout
+    topology = host_topology()
+    plans = plan_workers(topology, workers)
+    plan = plans[slot % workers]
+    cpus = sorted(cpu for core in plan["nucleos"] for cpu in core)
+    threads = len(plan["nucleos"])
+
+    if pin:
+        pin_threads(cpus)
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError as e:
+        # só pode ser definido uma vez por processo, antes de qualquer trabalho inter-op
+        logger.warning("Não foi possível definir as threads inter-op do torch: %s", e)
+    cv2.setNumThreads(cv2_threads or threads)
+
+    _layout = {
+        "worker": slot,
+        "workers": workers,
+        "fixado": pin,
+        "host": {str(node): [cpu for core in cores for cpu in core] for node, cores in topology.items()},
+        "plano": [
+            {"worker": i, "nos_numa": p["nos_numa"], "cpus": sorted(cpu for core in p["nucleos"] for cpu in core)}
+            for i, p in enumerate(plans)
+        ],
+    }
+    logger.info("Worker %s (%s): CPUs %s, nó(s) NUMA %s, %s threads intra-op.",
+                slot, os.getpid(), cpus, plan['nos_numa'], threads)
+    return current_layout()
+
+
+def current_layout():
+    """Layout deste processo: CPUs permitidas e tamanho dos pools de threads, mais o plano de todos
+    os workers quando a topologia foi aplicada"""
+    return {
+        "aplicada": _layout is not None,
+        "pid": os.getpid(),
+        "cpus": sorted(os.sched_getaffinity(0)),
+        "threads_intra_op": torch.get_num_threads(),
+        "threads_inter_op": torch.get_num_interop_threads(),
+        "threads_cv2": cv2.getNumThreads(),
+        **(_layout or {"host": {str(node): [cpu for core in cores for cpu in core]
+                                for node, cores in host_topology().items()}}),
+    }
@@ -0,0 +1,101 @@
+import itertools
+
+
+def box_iou(a, b):
+    """IoU de duas caixas (x1, y1, x2, y2)"""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    """Objeto acompanhado entre quadros, com a distância estimada"""
+
+    def __init__(self, track_id, detection):
+        self.id = track_id
+        self.cls = detection["class"]
+        self.box = detection["box"]
+        # caixa e idade (em quadros) da última medição de profundidade
+        self.measured_box = None
+        self.since_measured = 0
+        self.distance = None
+        self.missed = 0
+
+
+class IouTracker:
+    """Rastreador multiobjeto por IoU entre as caixas do YOLO em quadros consecutivos.
+
+    A associação é gulosa (maior IoU primeiro, apenas entre caixas da mesma classe). Uma trilha
+    precisa de nova medição de profundidade quando é nova, quando sua caixa se afastou da caixa
+    medida (IoU abaixo de `move_iou`) ou a cada `refresh_every` quadros; nas demais a distância
+    anterior é mantida. As medições novas de trilhas existentes são suavizadas por média móvel
+    exponencial (`alpha` é o peso da medição nova). Trilhas sem detecção por mais de
+    `max_missed` quadros são descartadas.
+    """
+
+    def __init__(self, iou_threshold=0.3, move_iou=0.8, alpha=0.5, max_missed=5, refresh_every=15):
+        self.iou_threshold = iou_threshold
+        self.move_iou = move_iou
+        self.alpha = alpha
+        self.max_missed = max_missed
+        self.refresh_every = refresh_every
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def update(self, detections):
+        """Associa as detecções às trilhas. Retorna a trilha de cada detecção (na mesma ordem)
+        e os índices das detecções que precisam de nova medição de profundidade."""
+        pairs = sorted(
+            ((box_iou(track.box, det["box"]), t, d)
+             for t, track in enumerate(self.tracks)
+             for d, det in enumerate(detections)
+             if track.cls == det["class"]),
+            reverse=True,
+        )
+
+        assigned = [None] * len(detections)
+        used_tracks = set()
+        for overlap, t, d in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in used_tracks or assigned[d] is not None:
+                continue
+            used_tracks.add(t)
+            assigned[d] = self.tracks[t]
+
+        for t, track in enumerate(self.tracks):
+            if t not in used_tracks:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        refresh = []
+        for d, det in enumerate(detections):
+            track = assigned[d]
+            if track is None:
+                track = assigned[d] = Track(next(self._ids), det)
+                self.tracks.append(track)
+            track.box = det["box"]
+            track.missed = 0
+            track.since_measured += 1
+            if self._needs_refresh(track):
+                refresh.append(d)
+
+        return assigned, refresh
+
+    def _needs_refresh(self, track):
+        return (
+            track.distance is None
+            or track.since_measured >= self.refresh_every
+            or box_iou(track.box, track.measured_box) < self.move_iou
+        )
+
+    def record(self, track, distance):
+        """Registra uma medição de distância da trilha (suavizada se a trilha já tinha estimativa)"""
+        if track.distance is None:
+            track.distance = distance
+        else:
+            track.distance = self.alpha * distance + (1 - self.alpha) * track.distance
+        track.measured_box = track.box
+        track.since_measured = 0
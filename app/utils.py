@@ -1,11 +1,33 @@
+import os
+import cv2
+import time
+import logging
 import torch
 import base64
 import numpy as np
 from PIL import Image
 from io import BytesIO
 from collections import defaultdict
+from app.backends import (
+    OnnxDepthBackend,
+    YoloBackend,
+    check_backend,
+    export_depth_onnx,
+    export_yolo_onnx,
+    onnx_path
+)
+from app.depth_stats import DepthStatsIndex, region_statistic
+from app.ingest import DecodedImage
+from app.quantization import (
+    quantized_checkpoint_path,
+    quantize_depth_model,
+    prepare_quantized_skeleton,
+    load_calibration_images
+)
 from Depth_Anything_V2.metric_depth.depth_anything_v2.dpt import DepthAnythingV2
 
+logger = logging.getLogger(__name__)
+
 CLASS_TRANSLATIONS = {
     0: "pessoa",
     1: "bicicleta",
@@ -157,68 +179,318 @@ def format_description(detections, image_width):
     intro = "Foi identificado na imagem " if len(detections) == 1 else "Foram identificados na imagem "
     return intro + ", ".join(phrases) + "."
 
+def format_detections(detections):
+    """Função para formatar descrição de imagem quando as distâncias não foram calculadas"""
+    if not detections:
+        return "Não foi identificado nenhum objeto na imagem."
+
+    label_counts = defaultdict(int)
+    for obj in detections:
+        label_counts[obj['class']] += 1
+
+    parts = [f"um {label}" if qty == 1 else f"{qty} {pluralize(label)}" for label, qty in label_counts.items()]
+    intro = "Foi identificado na imagem " if len(detections) == 1 else "Foram identificados na imagem "
+    return intro + " e ".join(parts) + " (distâncias não calculadas)."
+
+# lado da entrada quadrada (letterbox) do YOLO
+YOLO_IMGSZ = 640
+
+def _parse_detections(result, scale=(1.0, 1.0)):
+    """Converte um resultado do YOLO na lista de detecções usada pela API.
+    scale: (x, y) da imagem passada ao YOLO para a imagem da requisição"""
+    detections = []
+    for box in result.boxes:
+        x1,y1,x2,y2 = box.xyxy[0].tolist()
+        x1,x2 = int(x1 * scale[0]), int(x2 * scale[0])
+        y1,y2 = int(y1 * scale[1]), int(y2 * scale[1])
+        class_id = int(box.cls[0].item())
+        # class_name = model.names[class_id]
+        class_name = CLASS_TRANSLATIONS[class_id]
+
+        detections.append({"class":class_name, "box": [x1,y1,x2,y2]})
+
+    return detections
+
+def _yolo_input(image):
+    """Entrada do YOLO e a escala de volta para a imagem. Um DecodedImage é reduzido pelo mesmo
+    resize do letterbox do ultralytics direto do buffer RGB, e só a versão reduzida é convertida
+    para BGR (ordem que o ultralytics espera em arrays); imagens PIL seguem como estão."""
+    if not isinstance(image, DecodedImage):
+        return image, (1.0, 1.0)
+
+    t0 = time.perf_counter()
+    width, height = image.size
+    ratio = min(YOLO_IMGSZ / height, YOLO_IMGSZ / width)
+    resized = image.array
+    if ratio < 1:
+        size = int(round(width * ratio)), int(round(height * ratio))
+        resized = cv2.resize(resized, size, interpolation=cv2.INTER_LINEAR)
+    bgr = cv2.cvtColor(resized, cv2.COLOR_RGB2BGR)
+    image.record("entrada_yolo", time.perf_counter() - t0, bgr.nbytes)
+    return bgr, (width / bgr.shape[1], height / bgr.shape[0])
+
 def detect_objects(model, image):
-    """Função para detectar objetos na imagem usando o modelo YOLO passado"""
+    """Função para detectar objetos na imagem usando o modelo YOLO passado (YoloBackend ou YOLO do ultralytics)"""
+    image, scale = _yolo_input(image)
     # Fazer inferencia com YOLO
     results = model(image)
 
     detections = []
     for result in results:
-        for box in result.boxes:
-            x1,y1,x2,y2 = map(int, box.xyxy[0])
-            class_id = int(box.cls[0].item())
-            # class_name = model.names[class_id]
-            class_name = CLASS_TRANSLATIONS[class_id]
-
-            detections.append({"class":class_name, "box": [x1,y1,x2,y2]})
+        detections.extend(_parse_detections(result, scale))
     
     return detections
 
+def detect_objects_batch(model, images):
+    """Função para detectar objetos em várias imagens com uma única chamada ao YOLO"""
+    inputs = [_yolo_input(image) for image in images]
+    results = model([image for image, _ in inputs])
 
-def load_depth_anything():
-    """Função para carregar o modelo Depth Anything V2 e os checkpoints"""
-    model_configs = {
-        'vits': {'encoder': 'vits', 'features': 64, 'out_channels': [48, 96, 192, 384]},
-        'vitb': {'encoder': 'vitb', 'features': 128, 'out_channels': [96, 192, 384, 768]},
-        'vitl': {'encoder': 'vitl', 'features': 256, 'out_channels': [256, 512, 1024, 1024]}
-    }
+    return [_parse_detections(result, scale) for result, (_, scale) in zip(results, inputs)]
+
+
+MODEL_CONFIGS = {
+    'vits': {'encoder': 'vits', 'features': 64, 'out_channels': [48, 96, 192, 384]},
+    'vitb': {'encoder': 'vitb', 'features': 128, 'out_channels': [96, 192, 384, 768]},
+    'vitl': {'encoder': 'vitl', 'features': 256, 'out_channels': [256, 512, 1024, 1024]}
+}
+
+# profundidade máxima (metros) de cada conjunto de treino dos checkpoints métricos
+DATASET_MAX_DEPTH = {'hypersim': 20.0, 'vkitti': 80.0}
 
-    dataset = 'hypersim' # 'hypersim' ou 'vkitti'
-    encoder = 'vitb' # 'vitl', 'vitb' ou 'vits'
+
+def check_depth_model(encoder, dataset):
+    if encoder not in MODEL_CONFIGS:
+        raise ValueError(f"Encoder inválido: {encoder}. Use um de {tuple(MODEL_CONFIGS)}")
+    if dataset not in DATASET_MAX_DEPTH:
+        raise ValueError(f"Dataset inválido: {dataset}. Use um de {tuple(DATASET_MAX_DEPTH)}")
+
+def depth_checkpoint_path(encoder='vitb', dataset='hypersim', directory='checkpoints'):
+    """Caminho do checkpoint métrico do Depth Anything V2"""
+    return os.path.join(directory, f'depth_anything_v2_metric_{dataset}_{encoder}.pth')
+
+def load_depth_anything(encoder='vitb', dataset='hypersim', attn_backend='sdpa', quantize=None, calibration_dir=None,
+                        precision=None, mmap=False):
+    """Função para carregar o modelo Depth Anything V2 e os checkpoints.
+    encoder: 'vits', 'vitb' ou 'vitl'; dataset: 'hypersim' (interno, até 20 m) ou 'vkitti' (externo, até 80 m)
+    attn_backend: implementação da atenção do DINOv2 ('sdpa', 'reference' ou 'xformers')
+    quantize: None (float32), 'dynamic' ou 'dynamic+head' (INT8 para CPU, ver app.quantization).
+    O modelo quantizado é salvo ao lado do checkpoint e reaproveitado nas próximas cargas.
+    precision: precisão por etapa, ex.: {'backbone': 'bf16', 'head': 'bf16', 'output': 'fp32'}
+    mmap: usa os tensores do checkpoint mapeado em memória como pesos do modelo (sem cópia); as páginas
+    vêm do page cache e são compartilhadas por todos os processos que carregam o mesmo arquivo"""
+    check_depth_model(encoder, dataset)
+    checkpoint = depth_checkpoint_path(encoder, dataset)
+    config = {
+        **MODEL_CONFIGS[encoder],
+        'max_depth': DATASET_MAX_DEPTH[dataset],
+        'attn_backend': attn_backend,
+        'precision': precision,
+    }
 
     try:
-        model = DepthAnythingV2(**{**model_configs[encoder]})
-        print("Modelo Depth Anything V2 carregado com sucesso.")
+        model = DepthAnythingV2(**config)
+        logger.info("Modelo Depth Anything V2 (%s, %s) carregado com sucesso.", encoder, dataset)
     except Exception as e:
-        print("Erro ao carregar modelo Depth Anything V2", e)
+        logger.exception("Erro ao carregar modelo Depth Anything V2: %s", e)
         return None
 
+    if quantize:
+        quantized_checkpoint = quantized_checkpoint_path(checkpoint, quantize)
+        if os.path.exists(quantized_checkpoint):
+            try:
+                prepare_quantized_skeleton(model, quantize)
+                model.load_state_dict(torch.load(quantized_checkpoint, map_location='cpu'))
+                logger.info("Checkpoints quantizados (%s) carregados com sucesso.", quantize)
+                model.eval()
+                return model
+            except Exception as e:
+                logger.warning("Erro ao carregar os checkpoints quantizados, quantizando novamente: %s", e)
+                model = DepthAnythingV2(**config)
+
     try:
-        model.load_state_dict(torch.load(f'checkpoints/depth_anything_v2_metric_{dataset}_{encoder}.pth', map_location='cpu'))
-        print('Checkpoints carregado com sucesso.')
+        if mmap and not quantize:
+            _load_mmap_state_dict(model, checkpoint)
+        else:
+            model.load_state_dict(torch.load(checkpoint, map_location='cpu'))
+        logger.info("Checkpoints carregado com sucesso.")
     except Exception as e:
-        print("Erro ao carregar os checkpoints do modelo DepthAnythingV2", e)
+        logger.exception("Erro ao carregar os checkpoints do modelo DepthAnythingV2: %s", e)
         return None
 
     model.eval()
 
+    if quantize:
+        try:
+            quantize_depth_model(model, quantize, load_calibration_images(calibration_dir))
+            torch.save(model.state_dict(), quantized_checkpoint)
+            logger.info("Modelo quantizado (%s) salvo em %s.", quantize, quantized_checkpoint)
+        except Exception as e:
+            logger.exception("Erro ao quantizar o modelo DepthAnythingV2: %s", e)
+            return None
+
     return model
 
-def generate_depth_map(model, image):
-    """"Função para gerar o mapa de profundidade da imagem usando o modelo passado"""
+def _load_mmap_state_dict(model, checkpoint):
+    """Pesos do modelo apontando para o checkpoint mapeado em memória (assign=True evita a cópia).
+    Checkpoints no formato antigo do torch.save não podem ser mapeados e são lidos normalmente."""
+    try:
+        state_dict = torch.load(checkpoint, map_location='cpu', mmap=True)
+    except RuntimeError as e:
+        logger.warning("Checkpoint não pode ser mapeado em memória, lendo o arquivo inteiro: %s", e)
+        model.load_state_dict(torch.load(checkpoint, map_location='cpu'))
+        return
+    model.load_state_dict(state_dict, assign=True)
+
+def load_depth_onnx(encoder='vitb', dataset='hypersim', directory='checkpoints', threads=0, attn_backend='sdpa'):
+    """Função para carregar o Depth Anything V2 no ONNX Runtime (CPU).
+    O modelo exportado fica em `directory`, com o nome do checkpoint; se ainda não existir,
+    o modelo float32 é carregado e exportado com altura e largura dinâmicas."""
+    check_depth_model(encoder, dataset)
+    path = onnx_path(depth_checkpoint_path(encoder, dataset, directory))
+    if not os.path.exists(path):
+        model = load_depth_anything(encoder, dataset, attn_backend=attn_backend)
+        if model is None:
+            return None
+        try:
+            export_depth_onnx(model, path)
+            logger.info("Modelo Depth Anything V2 exportado para ONNX em %s.", path)
+        except Exception as e:
+            logger.exception("Erro ao exportar o modelo Depth Anything V2 para ONNX: %s", e)
+            return None
+
+    try:
+        backend = OnnxDepthBackend(path, threads)
+        logger.info("Modelo Depth Anything V2 (ONNX Runtime) carregado com sucesso.")
+    except Exception as e:
+        logger.exception("Erro ao carregar o modelo ONNX do Depth Anything V2: %s", e)
+        return None
+
+    return backend
+
+def load_yolo(weights="yolo11n.pt", backend="torch"):
+    """Função para carregar o modelo YOLO.
+    backend: 'torch' ou 'onnx' (exporta os pesos para ONNX na primeira carga)"""
+    check_backend(backend)
+    try:
+        if backend == "onnx" and not weights.endswith(".onnx"):
+            exported = onnx_path(weights)
+            weights = exported if os.path.exists(exported) else export_yolo_onnx(weights)
+        model = YoloBackend(weights)
+        logger.info("Modelo YOLO (%s) carregado com sucesso.", model.name)
+    except Exception as e:
+        logger.exception("Erro ao carregar modelo YOLO: %s", e)
+        return None
+
+    return model
+
+def _to_rgb_array(image):
+    """Imagem PIL como array uint8 RGB (as imagens do PIL já vêm em RGB, não em BGR).
+    Um DecodedImage entrega o próprio buffer, sem cópia."""
+    if isinstance(image, DecodedImage):
+        return image.array
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return np.asarray(image)
+
+def generate_depth_map(model, image, input_size=518):
+    """"Função para gerar o mapa de profundidade da imagem usando o modelo passado (DepthAnythingV2 ou
+    um backend de app.backends)"""
     # image = cv2.imread(image)  
-    image_np = np.array(image)
-    depth_map = model.infer_image(image_np) # HxW depth map in meters in numpy
+    image_np = _to_rgb_array(image)
+    depth_map = model.infer_image(image_np, input_size, channel_order='RGB') # HxW depth map in meters in numpy
 
     return depth_map
 
-def calculate_object_distances(detections, depth_map):
-    """Função que retorna as detecções com o calculo da distancias usando o mapa de profundidade."""
+class LowResDepth:
+    """Mapa de profundidade na resolução da rede (tensor no dispositivo do modelo),
+    com os fatores de escala para as coordenadas da imagem original."""
+
+    def __init__(self, depth, scale, size):
+        self.depth = depth # tensor (h', w') em metros
+        self.scale = scale # (escala_y, escala_x) da imagem original para a grade da rede
+        self.size = size # (h, w) da imagem original
+        self._stats_index = None
+
+    def stats_index(self):
+        """Histograma integral do mapa, construído uma única vez na primeira consulta"""
+        if self._stats_index is None:
+            self._stats_index = DepthStatsIndex(self.depth)
+        return self._stats_index
+
+    def box_to_grid(self, box):
+        """Mapeia uma caixa (x1, y1, x2, y2) da imagem original para a grade da rede"""
+        x1,y1,x2,y2 = box
+        scale_y, scale_x = self.scale
+        grid_h, grid_w = self.depth.shape
+
+        gx1 = min(max(int(np.floor(x1 * scale_x)), 0), grid_w - 1)
+        gy1 = min(max(int(np.floor(y1 * scale_y)), 0), grid_h - 1)
+        # garante pelo menos um pixel por caixa
+        gx2 = min(max(int(np.ceil(x2 * scale_x)), gx1 + 1), grid_w)
+        gy2 = min(max(int(np.ceil(y2 * scale_y)), gy1 + 1), grid_h)
+
+        return gx1, gy1, gx2, gy2
+
+    def full_resolution(self):
+        """Mapa de profundidade reamostrado para o tamanho da imagem original (numpy)"""
+        return DepthAnythingV2.upsample_depth(self.depth, self.size).cpu().numpy()
+
+def generate_depth_lowres(model, image, input_size=518):
+    """Função para gerar o mapa de profundidade na resolução da rede, sem reamostrar para a imagem original"""
+    image_np = _to_rgb_array(image)
+    depth, scale = model.infer_image_lowres(image_np, input_size, channel_order='RGB')
+
+    return LowResDepth(depth, scale, image_np.shape[:2])
+
+def generate_depth_maps(model, images, input_size=518):
+    """Função para gerar os mapas de profundidade (resolução da rede) de várias imagens em um único forward.
+    As imagens devem ter o mesmo formato de entrada da rede (ver DepthAnythingV2.get_input_shape)."""
+    images_np = [_to_rgb_array(image) for image in images]
+    outputs = model.infer_batch_lowres(images_np, input_size, channel_order='RGB')
+
+    return [LowResDepth(depth, scale, image_np.shape[:2]) for image_np, (depth, scale) in zip(images_np, outputs)]
+
+def encode_depth_map(depth_map):
+    """Codifica o mapa de profundidade como PNG de 16 bits (milímetros) em base64"""
+    depth_mm = np.clip(np.asarray(depth_map) * 1000.0, 0, np.iinfo(np.uint16).max).astype(np.uint16)
+    buffer = BytesIO()
+    Image.fromarray(depth_mm).save(buffer, format="PNG")
+
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+def calculate_object_distances(detections, depth_map, statistic=("percentile", 50.0), index_min_boxes=None):
+    """Função que retorna as detecções com o calculo da distancias usando o mapa de profundidade.
+    Aceita o mapa em resolução completa (numpy) ou na resolução da rede (LowResDepth).
+    A estatística padrão é a mediana (ver depth_stats.parse_statistic para as demais)."""
+    if isinstance(depth_map, LowResDepth):
+        return _calculate_object_distances_lowres(detections, depth_map, statistic, index_min_boxes)
+
     for obj in detections:
         x1,y1,x2,y2 = obj['box']
         object_depth = depth_map[y1:y2, x1:x2]  # Recortar a região da bounding box
-        median_depth = float(np.median(object_depth))  # Usamos a mediana para evitar ruídos
-        
-        obj['distance'] =  median_depth
+        # Usamos a mediana por padrão para evitar ruídos
+        obj['distance'] = region_statistic(object_depth, statistic)
+
+    return detections
+
+def _calculate_object_distances_lowres(detections, depth_map, statistic, index_min_boxes):
+    """Calcula as estatísticas na grade da rede, no dispositivo do modelo, com uma única cópia para a CPU.
+    Com muitas caixas (index_min_boxes ou mais) usa o histograma integral do mapa."""
+    if not detections:
+        return detections
+
+    grid_boxes = [depth_map.box_to_grid(obj['box']) for obj in detections]
 
-    return detections
\ No newline at end of file
+    if index_min_boxes and len(detections) >= index_min_boxes:
+        values = depth_map.stats_index().query(grid_boxes, statistic)
+    else:
+        values = torch.stack([
+            region_statistic(depth_map.depth[y1:y2, x1:x2], statistic)
+            for x1,y1,x2,y2 in grid_boxes
+        ])
+
+    for obj, distance in zip(detections, values.cpu().tolist()):
+        obj['distance'] = distance
+
+    return detections
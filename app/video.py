@@ -0,0 +1,216 @@
+import os
+import time
+import uuid
+import tempfile
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.tracking import IouTracker
+from app.utils import calculate_object_distances, format_description
+
+
+def frame_thumbnail(frame, size=64):
+    """Miniatura em tons de cinza (float32, largura `size`) usada para comparar quadros"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+    height = max(1, round(size * gray.shape[0] / gray.shape[1]))
+    return cv2.resize(gray, (size, height), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def frame_difference(thumbnail_a, thumbnail_b):
+    """Diferença média absoluta entre duas miniaturas, na escala [0, 1]"""
+    return float(np.mean(np.abs(thumbnail_a - thumbnail_b))) / 255.0
+
+
+class DepthGate:
+    """Decide, quadro a quadro, se o mapa de profundidade precisa ser recalculado.
+
+    O quadro atual é comparado com o último quadro em que a profundidade foi calculada
+    (quadro-chave), e não com o anterior, para que mudanças lentas se acumulem. O mapa é
+    reaproveitado enquanto a diferença ficar abaixo de `threshold`, por no máximo
+    `max_reuse` quadros seguidos e apenas para quadros do mesmo tamanho.
+    """
+
+    def __init__(self, threshold=0.04, max_reuse=30, thumbnail_size=64):
+        self.threshold = threshold
+        self.max_reuse = max_reuse
+        self.thumbnail_size = thumbnail_size
+        self.keyframe = None
+        self.depth_map = None
+        self.size = None
+        self.reused = 0
+
+    def update(self, frame, compute_depth):
+        """Retorna (mapa de profundidade, reaproveitado, diferença para o quadro-chave).
+        frame: quadro RGB uint8; compute_depth: função sem argumentos que calcula o mapa."""
+        thumbnail = frame_thumbnail(frame, self.thumbnail_size)
+        difference = None
+        if self.depth_map is not None and frame.shape[:2] == self.size:
+            difference = frame_difference(thumbnail, self.keyframe)
+            if difference < self.threshold and self.reused < self.max_reuse:
+                self.reused += 1
+                return self.depth_map, True, difference
+
+        self.depth_map = compute_depth()
+        self.keyframe = thumbnail
+        self.size = frame.shape[:2]
+        self.reused = 0
+        return self.depth_map, False, difference
+
+
+def process_frame(models, frame, gate, statistic=("percentile", 50.0), index_min_boxes=None, tracker=None):
+    """Detecta os objetos de um quadro RGB e calcula as distâncias, reaproveitando a
+    profundidade quando o DepthGate permitir. Quadros sem objetos não calculam profundidade.
+
+    Com um IouTracker, cada objeto recebe o id da sua trilha e só as trilhas novas ou que se
+    moveram são medidas de novo; quando todas estão estáveis a profundidade nem é consultada."""
+    image = Image.fromarray(frame)
+    detections = models.detect(image)
+
+    tracks, pending = None, list(range(len(detections)))
+    if tracker is not None:
+        tracks, pending = tracker.update(detections)
+
+    reused, skipped, difference = False, not pending, None
+    measured = []
+    if pending:
+        depth_map, reused, difference = gate.update(frame, lambda: models.depth(image))
+        measured = calculate_object_distances(
+            [detections[i] for i in pending], depth_map, statistic, index_min_boxes
+        )
+
+    if tracker is None:
+        results = measured
+    else:
+        for i, obj in zip(pending, measured):
+            tracker.record(tracks[i], obj["distance"])
+        results = [
+            {"class": det["class"], "box": det["box"], "distance": track.distance, "trilha": track.id}
+            for det, track in zip(detections, tracks)
+        ]
+
+    response = {
+        "descricao": format_description(results, image.size[0]) if results else "",
+        "resultados": results,
+        "profundidade_reutilizada": reused,
+        "diferenca_quadro": None if difference is None else round(difference, 4),
+    }
+    if tracker is not None:
+        # todas as trilhas estáveis: nenhuma medição, nem consulta ao mapa de profundidade
+        response["profundidade_omitida"] = bool(detections) and skipped
+        response["trilhas_medidas"] = len(pending)
+    return response
+
+
+def read_video_frames(path, stride=1, max_frames=None):
+    """Lê os quadros de um vídeo como arrays RGB, pulando `stride - 1` quadros entre os lidos"""
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError("Não foi possível ler o vídeo enviado.")
+    try:
+        index = 0
+        read = 0
+        while max_frames is None or read < max_frames:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            if index % stride == 0:
+                read += 1
+                yield index, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            index += 1
+    finally:
+        capture.release()
+
+
+def process_video(models, stream, gate, statistic=("percentile", 50.0), index_min_boxes=None, stride=1,
+                  max_frames=None, tracker=None):
+    """Processa um vídeo enviado (arquivo em memória/stream) quadro a quadro.
+    O OpenCV só lê vídeos a partir de um caminho, então o arquivo passa por um temporário."""
+    fd, path = tempfile.mkstemp(suffix=".video")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(stream.read())
+
+        t0 = time.perf_counter()
+        frames = []
+        for index, frame in read_video_frames(path, stride, max_frames):
+            frames.append({"indice": index, **process_frame(models, frame, gate, statistic, index_min_boxes, tracker)})
+        elapsed = time.perf_counter() - t0
+    finally:
+        os.remove(path)
+
+    skipped = sum(1 for frame in frames if frame.get("profundidade_omitida"))
+    reused = sum(1 for frame in frames if frame["profundidade_reutilizada"])
+    computed = sum(1 for frame in frames if frame["resultados"]) - skipped - reused
+    return {
+        "quadros": frames,
+        "resumo": {
+            "quadros": len(frames),
+            "profundidade_calculada": computed,
+            "profundidade_reutilizada": reused,
+            "profundidade_omitida": skipped,
+            "tempo_total_s": round(elapsed, 3),
+            "quadros_por_segundo": round(len(frames) / elapsed, 2) if elapsed else None,
+        },
+    }
+
+
+class FrameSession:
+    """Estado de uma sequência de quadros enviada em requisições separadas"""
+
+    def __init__(self, session_id, gate, tracker=None):
+        self.id = session_id
+        self.gate = gate
+        self.tracker = tracker
+        # os quadros de uma sessão são processados em ordem, um de cada vez
+        self.lock = threading.Lock()
+        self.last_seen = time.monotonic()
+        self.frames = 0
+
+
+class FrameSessions:
+    """Sessões de quadros do processo, descartadas após `ttl_s` sem uso ou quando passam de
+    `max_sessions` (a menos usada recentemente sai primeiro)."""
+
+    def __init__(self, ttl_s=300, max_sessions=256, gate_options=None, tracker_options=None):
+        """tracker_options: argumentos do IouTracker de cada sessão (None desliga o rastreamento)"""
+        self.ttl_s = ttl_s
+        self.max_sessions = max_sessions
+        self.gate_options = gate_options or {}
+        self.tracker_options = tracker_options
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id=None):
+        """Sessão existente pelo id, ou uma nova (com id gerado quando não informado)"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None:
+                tracker = IouTracker(**self.tracker_options) if self.tracker_options is not None else None
+                session = FrameSession(session_id or uuid.uuid4().hex, DepthGate(**self.gate_options), tracker)
+                self._sessions[session.id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session.id)
+            session.last_seen = now
+            return session
+
+    def close(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _expire(self, now):
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen <= self.ttl_s:
+                break
+            self._sessions.popitem(last=False)
@@ -0,0 +1,118 @@
+"""Paridade, latência e pico de memória dos backends de atenção do DINOv2
+('sdpa' fundido do PyTorch versus a implementação de referência).
+
+Cada medição roda em um subprocesso; o pico de memória é o VmHWM (Linux) acima do RSS
+anterior ao forward.
+Os pesos são aleatórios (mesma semente para os dois backends).
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_attention.py --encoders vits vitb vitl --size 518
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import multiprocessing as mp
+
+import torch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dinov2 import DINOv2  # noqa: E402
+
+INTERMEDIATE_LAYERS = {'vits': [2, 5, 8, 11], 'vitb': [2, 5, 8, 11], 'vitl': [4, 11, 17, 23]}
+
+
+def read_status_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+def reset_peak_rss():
+    # "5" zera o VmHWM do processo (Linux >= 4.0)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def build(encoder, backend):
+    torch.manual_seed(0)
+    return DINOv2(encoder, attn_backend=backend).eval()
+
+
+@torch.no_grad()
+def measure(encoder, backend, shape, repeats, queue):
+    model = build(encoder, backend)
+    x = torch.randn(1, 3, *shape, generator=torch.Generator().manual_seed(1))
+    layers = INTERMEDIATE_LAYERS[encoder]
+
+    reset_peak_rss()
+    rss_before = read_status_kb('VmRSS')
+    model.get_intermediate_layers(x, layers)
+    peak_kb = read_status_kb('VmHWM') - rss_before
+
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        model.get_intermediate_layers(x, layers)
+        times.append(time.perf_counter() - t0)
+
+    queue.put((statistics.median(times), peak_kb / 1024))
+
+
+@torch.no_grad()
+def parity(encoder, shape):
+    model = build(encoder, 'reference')
+    x = torch.randn(1, 3, *shape, generator=torch.Generator().manual_seed(1))
+    layers = INTERMEDIATE_LAYERS[encoder]
+
+    reference = model.get_intermediate_layers(x, layers)
+    model.set_attn_backend('sdpa')
+    fused = model.get_intermediate_layers(x, layers)
+
+    return max((a - b).abs().max().item() for a, b in zip(reference, fused))
+
+
+def run_isolated(*args):
+    ctx = mp.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=measure, args=(*args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--encoders', nargs='+', default=['vits', 'vitb', 'vitl'], choices=list(INTERMEDIATE_LAYERS))
+    parser.add_argument('--size', default='518x518', help='AxL da entrada da rede')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--tolerance', type=float, default=1e-3)
+    args = parser.parse_args()
+
+    shape = tuple(map(int, args.size.split('x'))) if 'x' in args.size else (int(args.size),) * 2
+    failed = False
+
+    for encoder in args.encoders:
+        error = parity(encoder, shape)
+        ok = error <= args.tolerance
+        failed |= not ok
+        print(f"{encoder} paridade sdpa x referência: erro máx {error:.2e} ({'ok' if ok else 'FALHOU'})")
+
+        for backend in ('reference', 'sdpa'):
+            latency, peak_mb = run_isolated(encoder, backend, shape, args.repeats)
+            print(f"    {backend:>9}: {latency * 1000:8.1f} ms | pico de memória do forward {peak_mb:7.1f} MB")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark do backbone DINOv2 (get_intermediate_layers) por encoder e formato de entrada.
+
+Mede a latência por forward com e sem o cache de embeddings posicionais interpolados.
+Os pesos são aleatórios: apenas o custo computacional interessa aqui.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_backbone.py --encoders vits vitb --shapes 518x686 518x924
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dpt import DepthAnythingV2  # noqa: E402
+
+MODEL_CONFIGS = {
+    'vits': {'encoder': 'vits', 'features': 64, 'out_channels': [48, 96, 192, 384]},
+    'vitb': {'encoder': 'vitb', 'features': 128, 'out_channels': [96, 192, 384, 768]},
+    'vitl': {'encoder': 'vitl', 'features': 256, 'out_channels': [256, 512, 1024, 1024]}
+}
+
+
+def time_forward(fn, repeats, warmup=1):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+@torch.no_grad()
+def bench_pos_cache(model, x, repeats):
+    backbone = model.pretrained
+    layers = model.intermediate_layer_idx[model.encoder]
+    h, w = x.shape[-2:]
+    tokens = torch.empty((1, (h // 14) * (w // 14) + 1, backbone.embed_dim))
+
+    results = {}
+    for label, cache_size in (('sem cache', 0), ('com cache', 8)):
+        backbone.pos_embed_cache_size = cache_size
+        backbone.clear_pos_embed_cache()
+        results[label] = (
+            time_forward(lambda: backbone.interpolate_pos_encoding(tokens, h, w), repeats * 10),
+            time_forward(lambda: backbone.get_intermediate_layers(x, layers, return_class_token=True), repeats),
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--encoders', nargs='+', default=['vits', 'vitb'], choices=list(MODEL_CONFIGS))
+    parser.add_argument('--shapes', nargs='+', default=['518x686', '518x924', '686x518'], help='AxL da entrada da rede')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    for encoder in args.encoders:
+        model = DepthAnythingV2(**MODEL_CONFIGS[encoder]).eval()
+        for shape in args.shapes:
+            h, w = map(int, shape.split('x'))
+            x = torch.randn(1, 3, h, w)
+            results = bench_pos_cache(model, x, args.repeats)
+            (interp_off, fwd_off), (interp_on, fwd_on) = results['sem cache'], results['com cache']
+            print(f"{encoder} {shape}: interpolate_pos_encoding {interp_off * 1000:.2f} -> {interp_on * 1000:.3f} ms | "
+                  f"backbone {fwd_off * 1000:.1f} -> {fwd_on * 1000:.1f} ms "
+                  f"(economia por forward {(fwd_off - fwd_on) * 1000:.2f} ms)")
+
+
+if __name__ == '__main__':
+    main()
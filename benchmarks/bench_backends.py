@@ -0,0 +1,166 @@
+"""Paridade e vazão dos backends de inferência (PyTorch x ONNX Runtime na CPU).
+
+Exporta o DepthAnythingV2 (altura e largura dinâmicas) e o YOLO para ONNX em um diretório
+temporário e compara, para cada resolução, a latência mediana e a vazão dos dois backends.
+A paridade da profundidade é a diferença em metros do mapa na resolução da rede e da mediana
+por caixa (grade 3x3); a do YOLO é a correspondência das detecções (classe e IoU >= 0.9).
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_backends.py --checkpoint checkpoints/depth_anything_v2_metric_hypersim_vitb.pth
+"""
+import os
+import sys
+import copy
+import time
+import argparse
+import shutil
+import tempfile
+import statistics
+
+import numpy as np
+import torch
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dpt import DepthAnythingV2  # noqa: E402
+from app.backends import OnnxDepthBackend, TorchDepthBackend, YoloBackend, export_depth_onnx  # noqa: E402
+from app.utils import LowResDepth, calculate_object_distances, detect_objects  # noqa: E402
+from bench_backbone import MODEL_CONFIGS  # noqa: E402
+from bench_precision import grid_boxes  # noqa: E402
+
+# tamanhos (largura, altura) das imagens sintéticas
+SIZES = [(640, 480), (480, 640), (1280, 720)]
+
+
+def build(encoder, checkpoint):
+    torch.manual_seed(0)
+    model = DepthAnythingV2(**MODEL_CONFIGS[encoder])
+    if checkpoint:
+        try:
+            model.load_state_dict(torch.load(checkpoint, map_location='cpu'))
+        except Exception as e:
+            print(f"Não foi possível carregar {checkpoint} ({e}); usando pesos aleatórios")
+    return model.eval()
+
+
+def time_calls(fn, repeats):
+    fn()
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 1.0
+
+
+def compare_depth(args, images, directory):
+    model = build(args.encoder, args.checkpoint)
+    path = os.path.join(directory, f'depth_{args.encoder}.onnx')
+    t0 = time.perf_counter()
+    export_depth_onnx(model, path)
+    print(f"Depth Anything V2 ({args.encoder}) exportado em {time.perf_counter() - t0:.1f} s")
+
+    backends = {'torch': TorchDepthBackend(model), 'onnx': OnnxDepthBackend(path, args.threads)}
+    failed = False
+    for image in images:
+        h, w = image.shape[:2]
+        outputs, latencies = {}, {}
+        for name, backend in backends.items():
+            with torch.no_grad():
+                outputs[name] = backend.infer_image_lowres(image, channel_order='RGB')
+                latencies[name] = time_calls(lambda: backend.infer_image_lowres(image, channel_order='RGB'), args.repeats)
+
+        (reference, scale), (depth, _) = outputs['torch'], outputs['onnx']
+        error = (depth - reference).abs()
+        distances = {
+            name: [obj['distance'] for obj in calculate_object_distances(
+                copy.deepcopy(grid_boxes(w, h)), LowResDepth(out[0], out[1], (h, w)))]
+            for name, out in outputs.items()
+        }
+        box_error = np.abs(np.array(distances['onnx']) - np.array(distances['torch'])).max()
+        failed |= bool(box_error > args.tolerance)
+
+        print(f"    {w}x{h}: torch {latencies['torch'] * 1000:7.1f} ms ({1 / latencies['torch']:.2f} img/s) | "
+              f"onnx {latencies['onnx'] * 1000:7.1f} ms ({1 / latencies['onnx']:.2f} img/s, "
+              f"{latencies['torch'] / latencies['onnx']:.2f}x) | mapa: máx {error.max():.5f} m | "
+              f"mediana por caixa: máx {box_error:.5f} m")
+    return failed
+
+
+def compare_yolo(args, images, directory):
+    weights = os.path.join(directory, os.path.basename(args.yolo))
+    if os.path.exists(args.yolo):
+        shutil.copy(args.yolo, weights)
+    else:
+        # nomes do ultralytics (yolo11n.pt, yolo11n.yaml) são resolvidos/baixados pela própria biblioteca
+        weights = args.yolo
+
+    torch_backend = YoloBackend(weights)
+    onnx_file = torch_backend.export(format='onnx', dynamic=True)
+    if os.path.dirname(os.path.abspath(onnx_file)) != directory:
+        # pesos resolvidos pelo ultralytics são exportados no diretório atual
+        onnx_file = shutil.move(onnx_file, directory)
+    onnx_backend = YoloBackend(onnx_file)
+
+    for image in images:
+        pil = Image.fromarray(image)
+        h, w = image.shape[:2]
+        reference = detect_objects(torch_backend, pil)
+        detections = detect_objects(onnx_backend, pil)
+        matched = sum(
+            any(d['class'] == r['class'] and iou(d['box'], r['box']) >= 0.9 for d in detections)
+            for r in reference
+        )
+        torch_time = time_calls(lambda: detect_objects(torch_backend, pil), args.repeats)
+        onnx_time = time_calls(lambda: detect_objects(onnx_backend, pil), args.repeats)
+        print(f"    {w}x{h}: torch {torch_time * 1000:7.1f} ms | onnx {onnx_time * 1000:7.1f} ms "
+              f"({torch_time / onnx_time:.2f}x) | detecções {len(reference)} x {len(detections)}, "
+              f"correspondentes {matched}")
+
+
+def load_images(directory):
+    if directory:
+        names = sorted(os.listdir(directory))
+        return [np.asarray(Image.open(os.path.join(directory, n)).convert('RGB')) for n in names]
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (h, w, 3), dtype=np.uint8) for w, h in SIZES]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--encoder', default='vitb', choices=list(MODEL_CONFIGS))
+    parser.add_argument('--checkpoint', default=os.path.join(ROOT, 'checkpoints', 'depth_anything_v2_metric_hypersim_vitb.pth'))
+    parser.add_argument('--yolo', default='yolo11n.pt', help='pesos do YOLO (ou yolo11n.yaml para pesos aleatórios)')
+    parser.add_argument('--images', default=None, help='diretório de imagens (padrão: sintéticas)')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=0, help='threads intra-op do ONNX Runtime (0 = padrão)')
+    parser.add_argument('--tolerance', type=float, default=0.01, help='erro máximo aceito da mediana por caixa (m)')
+    parser.add_argument('--skip-yolo', action='store_true')
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+
+    with tempfile.TemporaryDirectory() as directory:
+        print("Profundidade")
+        failed = compare_depth(args, images, directory)
+        if not args.skip_yolo:
+            print("YOLO")
+            compare_yolo(args, images, directory)
+
+    if failed:
+        print(f"Paridade da profundidade acima da tolerância ({args.tolerance} m)")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
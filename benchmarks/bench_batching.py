@@ -0,0 +1,77 @@
+"""Benchmark de vazão: requisições concorrentes processadas uma a uma versus agrupadas
+pelo BatchScheduler em micro-lotes.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_batching.py --clients 8 --requests 32 --window-ms 20
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import registry  # noqa: E402
+from app.batching import BatchScheduler  # noqa: E402
+
+
+def make_images(n, size):
+    rng = np.random.default_rng(0)
+    return [Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)) for _ in range(n)]
+
+
+def run_sequential(images, clients):
+    # cada requisição faz o seu próprio forward de lote 1 (o YOLO é serializado pelo registro)
+    lock = threading.Lock()
+
+    def handle(image):
+        detections = registry.detect(image)
+        with lock:
+            return detections, registry.depth(image)
+
+    with ThreadPoolExecutor(clients) as pool:
+        t0 = time.perf_counter()
+        list(pool.map(handle, images))
+        return time.perf_counter() - t0
+
+
+def run_batched(images, clients, window_ms, max_batch_size):
+    scheduler = BatchScheduler(registry, window_ms=window_ms, max_batch_size=max_batch_size).start()
+    try:
+        with ThreadPoolExecutor(clients) as pool:
+            t0 = time.perf_counter()
+            list(pool.map(scheduler.process, images))
+            elapsed = time.perf_counter() - t0
+    finally:
+        scheduler.stop()
+    return elapsed, scheduler.batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=32)
+    parser.add_argument('--window-ms', type=float, default=20)
+    parser.add_argument('--max-batch-size', type=int, default=8)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    args = parser.parse_args()
+
+    registry.load(warmup=True)
+    images = make_images(args.requests, (args.width, args.height))
+
+    sequential = run_sequential(images, args.clients)
+    batched, batches = run_batched(images, args.clients, args.window_ms, args.max_batch_size)
+
+    print(f"um a um  : {sequential:.2f}s ({args.requests / sequential:.2f} req/s)")
+    print(f"micro-lote: {batched:.2f}s ({args.requests / batched:.2f} req/s) em {batches} lotes")
+    print(f"ganho de vazão: {sequential / batched:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Custo do cache de resultados por tamanho de imagem.
+
+Mede o hash de conteúdo (sha1 dos pixels decodificados) e o dHash da camada de quase
+duplicatas, que são pagos em toda requisição, e o tempo de um acerto e de uma falta com um
+cálculo vazio. Também confere se a mesma foto recomprimida em JPEG cai na camada perceptual.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_cache.py --sizes 640x480 1920x1080 4032x3024
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.cache import ResultCache, image_key, perceptual_hash  # noqa: E402
+
+
+def median_ms(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000
+
+
+def photo(width, height, seed=0):
+    """Imagem sintética com estrutura (gradientes + ruído), recomprimível em JPEG"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    return Image.fromarray(np.clip(base + rng.normal(0, 8, base.shape), 0, 255).astype(np.uint8))
+
+
+def reencode(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue())).convert("RGB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', nargs='+', default=['640x480', '1920x1080', '4032x3024'])
+    parser.add_argument('--repeats', type=int, default=10)
+    args = parser.parse_args()
+
+    config = ("vitb", "hypersim", ("percentile", 50.0), "normal", False)
+    result = ({"descricao": "", "resultados": []}, 200)
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split("x"))
+        image = reencode(photo(width, height), 95)
+        cache = ResultCache(perceptual=True)
+
+        key_ms = median_ms(lambda: image_key(image, config), args.repeats)
+        phash_ms = median_ms(lambda: perceptual_hash(image), args.repeats)
+        miss_ms = median_ms(lambda: (cache.clear(), cache.get_or_compute(image, config, lambda: result)), args.repeats)
+        hit_ms = median_ms(lambda: cache.get_or_compute(image, config, lambda: result), args.repeats)
+
+        near = [cache.get_or_compute(reencode(image, q), config, lambda: result)[1] for q in (90, 75, 60)]
+        print(f"{size:>10}: chave {key_ms:6.2f} ms | dHash {phash_ms:6.2f} ms | falta {miss_ms:6.2f} ms | "
+              f"acerto {hit_ms:6.2f} ms | JPEG 90/75/60: {', '.join(near)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Tempo de compilação e latência de regime do DepthAnythingV2 compilado por bucket de formato.
+
+Para cada modo (trace/compile) mede, separadamente, o tempo de compilação de cada bucket e a
+latência mediana em regime, comparando com o modo eager nas mesmas imagens. Imagens cuja
+proporção não cai em nenhum bucket são contadas como falhas de cache (executadas em eager).
+A paridade é a diferença, em metros, do mapa de profundidade em relação ao eager (com buckets de
+proporção diferente da imagem a diferença inclui o ajuste de proporção).
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_compiled.py --encoder vits --modes trace compile
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import numpy as np
+import torch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dpt import DepthAnythingV2  # noqa: E402
+from app.compiled import COMPILE_MODES, CompiledDepthModel, parse_aspects  # noqa: E402
+from bench_backbone import MODEL_CONFIGS  # noqa: E402
+
+# tamanhos (largura, altura) das imagens sintéticas; 1200x400 não cai em nenhum bucket padrão
+SIZES = [(640, 480), (480, 640), (1280, 720), (512, 512), (1200, 400)]
+
+
+def build(encoder, checkpoint):
+    torch.manual_seed(0)
+    model = DepthAnythingV2(**MODEL_CONFIGS[encoder])
+    if checkpoint:
+        model.load_state_dict(torch.load(checkpoint, map_location='cpu'))
+    return model.eval()
+
+
+def steady_state(model, images, repeats):
+    """Latência mediana por imagem (após uma execução de aquecimento) e as profundidades"""
+    latencies, depths = [], []
+    for image in images:
+        depth, _ = model.infer_image_lowres(image, channel_order='RGB')
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            depth, _ = model.infer_image_lowres(image, channel_order='RGB')
+            times.append(time.perf_counter() - t0)
+        latencies.append(statistics.median(times))
+        depths.append(DepthAnythingV2.upsample_depth(depth, image.shape[:2]).numpy())
+    return latencies, depths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--encoder', default='vits', choices=list(MODEL_CONFIGS))
+    parser.add_argument('--modes', nargs='+', default=['trace'], choices=COMPILE_MODES)
+    parser.add_argument('--aspects', default='1:1,4:3,3:4,16:9,9:16')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--checkpoint', default=None, help='checkpoint métrico (padrão: pesos aleatórios)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 255, (h, w, 3), dtype=np.uint8) for w, h in SIZES]
+    model = build(args.encoder, args.checkpoint)
+
+    with torch.no_grad():
+        eager_times, eager_depths = steady_state(model, images, args.repeats)
+
+        for mode in args.modes:
+            compiled = CompiledDepthModel(model, aspects=parse_aspects(args.aspects), mode=mode)
+            compiled.compile_all()
+            print(f"{args.encoder} {mode}: compilação")
+            for (h, w), seconds in compiled.compile_times.items():
+                print(f"    bucket {w}x{h}: {seconds:.2f} s")
+            if not compiled.compile_times:
+                print("    nenhum bucket compilado")
+                continue
+
+            times, depths = steady_state(compiled, images, args.repeats)
+            print(f"{args.encoder} {mode}: regime (acertos {compiled.hits}, falhas {compiled.misses})")
+            for (w, h), eager, latency, reference, depth in zip(SIZES, eager_times, times, eager_depths, depths):
+                error = np.abs(depth - reference)
+                print(f"    {w}x{h}: eager {eager * 1000:7.1f} ms | {mode} {latency * 1000:7.1f} ms "
+                      f"({eager / latency:.2f}x) | diferença média {error.mean():.4f} m, máx {error.max():.4f} m")
+
+
+if __name__ == '__main__':
+    main()
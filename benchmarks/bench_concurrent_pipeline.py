@@ -0,0 +1,62 @@
+"""Benchmark da execução concorrente de YOLO e profundidade dentro de uma requisição,
+comparada com a execução sequencial (detecção e depois profundidade).
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_concurrent_pipeline.py --requests 5 --yolo-threads 2 --depth-threads 6
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import registry  # noqa: E402
+from app.pipeline import ConcurrentPipeline  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=5)
+    parser.add_argument('--image', default=None, help='imagem de teste (padrão: imagem sintética)')
+    parser.add_argument('--yolo-threads', type=int, default=0)
+    parser.add_argument('--depth-threads', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.image:
+        image = Image.open(args.image).convert('RGB')
+    else:
+        rng = np.random.default_rng(0)
+        image = Image.fromarray(rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8))
+
+    registry.load(warmup=True)
+
+    sequential = []
+    for _ in range(args.requests):
+        t0 = time.perf_counter()
+        registry.detect(image)
+        registry.depth(image)
+        sequential.append(time.perf_counter() - t0)
+
+    pipeline = ConcurrentPipeline(registry, args.yolo_threads, args.depth_threads)
+    concurrent, timeline = [], None
+    try:
+        for _ in range(args.requests):
+            t0 = time.perf_counter()
+            _, _, timeline = pipeline.process(image)
+            concurrent.append(time.perf_counter() - t0)
+    finally:
+        pipeline.shutdown()
+
+    print(f"threads: yolo={pipeline.yolo_threads} profundidade={pipeline.depth_threads}")
+    print(f"sequencial : mediana {statistics.median(sequential):.3f}s")
+    print(f"concorrente: mediana {statistics.median(concurrent):.3f}s")
+    print(f"última linha do tempo: {timeline}")
+
+
+if __name__ == '__main__':
+    main()
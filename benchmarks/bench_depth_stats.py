@@ -0,0 +1,66 @@
+"""Micro-benchmark das estatísticas por caixa: np.median em cada recorte do mapa
+versus consultas ao histograma integral (DepthStatsIndex).
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_depth_stats.py --boxes 10 50 200
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.depth_stats import DepthStatsIndex  # noqa: E402
+
+
+def random_boxes(n, width, height, rng):
+    x1 = rng.integers(0, width - 32, n)
+    y1 = rng.integers(0, height - 32, n)
+    x2 = np.minimum(x1 + rng.integers(32, width // 2, n), width)
+    y2 = np.minimum(y1 + rng.integers(32, height // 2, n), height)
+    return np.stack([x1, y1, x2, y2], axis=1)
+
+
+def best_of(fn, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--width', type=int, default=924)
+    parser.add_argument('--height', type=int, default=518)
+    parser.add_argument('--boxes', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--bins', type=int, default=64)
+    parser.add_argument('--cell', type=int, default=4)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    depth_np = (rng.random((args.height, args.width)) * 20).astype(np.float32)
+    depth = torch.from_numpy(depth_np)
+
+    build, index = best_of(lambda: DepthStatsIndex(depth, args.bins, args.cell), args.repeats)
+    print(f"construção do índice ({args.width}x{args.height}, {args.bins} intervalos): {build * 1000:.2f} ms")
+
+    for n in args.boxes:
+        boxes = random_boxes(n, args.width, args.height, rng)
+        slice_time, exact = best_of(
+            lambda: [np.median(depth_np[y1:y2, x1:x2]) for x1, y1, x2, y2 in boxes], args.repeats
+        )
+        query_time, approx = best_of(lambda: index.median(boxes).tolist(), args.repeats)
+        error = np.abs(np.array(exact) - np.array(approx)).max()
+        print(f"{n:>4} caixas: np.median {slice_time * 1000:8.2f} ms | índice {query_time * 1000:6.2f} ms "
+              f"(+{build * 1000:.2f} ms de construção) | erro máx {error:.3f} m")
+
+
+if __name__ == '__main__':
+    main()
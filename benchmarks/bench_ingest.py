@@ -0,0 +1,94 @@
+"""Ingestão de imagens: caminho antigo (PIL entregue ao YOLO e np.asarray para a profundidade)
+versus decode_image (uma decodificação, buffer RGB compartilhado, draft em JPEGs grandes).
+
+Para cada tamanho de JPEG mede, sem rodar as redes, o tempo até as entradas do YOLO
+(letterbox do ultralytics) e da profundidade (Preprocessor) ficarem prontas, e a memória dos
+buffers intermediários. Também compara as entradas das redes produzidas pelos dois caminhos
+(idênticas sem draft; com draft a diferença vem só da decodificação reduzida).
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_ingest.py --sizes 1280x960 1920x1080 4032x3024
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ultralytics.data.augment import LetterBox  # noqa: E402
+from ultralytics.data.loaders import LoadPilAndNumpy  # noqa: E402
+from Depth_Anything_V2.metric_depth.depth_anything_v2.util.preprocess import Preprocessor  # noqa: E402
+from app.ingest import decode_image  # noqa: E402
+from app.utils import YOLO_IMGSZ, _yolo_input  # noqa: E402
+
+
+def photo_jpeg(width, height):
+    rng = np.random.default_rng(0)
+    base = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    buffer = io.BytesIO()
+    Image.fromarray(base).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def old_path(data, letterbox, preprocessor):
+    image = Image.open(io.BytesIO(data))
+    # o ultralytics converte a imagem PIL em um array BGR contíguo (duas cópias em tamanho cheio)
+    bgr = LoadPilAndNumpy._single_check(image)
+    yolo = letterbox(image=bgr)
+    rgb = np.asarray(image.convert("RGB"))
+    depth, _ = preprocessor(rgb)
+    return yolo, depth.clone(), bgr.nbytes + rgb.nbytes
+
+
+def new_path(data, letterbox, preprocessor, draft):
+    decoded = decode_image(io.BytesIO(data), draft=draft)
+    bgr, _ = _yolo_input(decoded)
+    yolo = letterbox(image=bgr)
+    depth, _ = preprocessor(decoded.array)
+    return yolo, depth.clone(), decoded.array.nbytes + bgr.nbytes
+
+
+def median_ms(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', nargs='+', default=['1280x960', '1920x1080', '4032x3024'])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    letterbox = LetterBox(YOLO_IMGSZ, auto=False, stride=32)
+    preprocessor = Preprocessor(518, "cpu", "RGB")
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split("x"))
+        data = photo_jpeg(width, height)
+
+        old_ms, (old_yolo, old_depth, old_bytes) = median_ms(lambda: old_path(data, letterbox, preprocessor), args.repeats)
+        full_ms, (full_yolo, full_depth, full_bytes) = median_ms(
+            lambda: new_path(data, letterbox, preprocessor, False), args.repeats)
+        draft_ms, (draft_yolo, draft_depth, draft_bytes) = median_ms(
+            lambda: new_path(data, letterbox, preprocessor, True), args.repeats)
+
+        same = np.array_equal(old_yolo, full_yolo) and bool((old_depth == full_depth).all())
+        yolo_diff = np.abs(old_yolo.astype(np.int16) - draft_yolo.astype(np.int16)).mean()
+        print(f"{size:>10}: antigo {old_ms:6.1f} ms / {old_bytes / 2**20:5.1f} MB | "
+              f"buffer único {full_ms:6.1f} ms / {full_bytes / 2**20:5.1f} MB (entradas idênticas: {same}) | "
+              f"draft {draft_ms:6.1f} ms / {draft_bytes / 2**20:5.1f} MB "
+              f"(diferença média YOLO {yolo_diff:.2f}/255, profundidade {(old_depth - draft_depth).abs().mean():.3f})")
+
+
+if __name__ == '__main__':
+    main()
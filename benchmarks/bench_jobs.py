@@ -0,0 +1,68 @@
+"""Comportamento da fila de jobs (JobQueue) sob uma rajada de requisições.
+
+Cada job simula uma inferência com tempo de serviço fixo (--service-ms). A rajada envia --burst
+jobs de uma vez: os que cabem na fila são aceitos e os demais recebem QueueFull com o
+Retry-After estimado. Depois o cliente rejeitado reenvia após o Retry-After, e o script mostra
+quantos reenvios foram aceitos na primeira tentativa (a estimativa não deve ser curta demais)
+e a latência total dos jobs aceitos.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_jobs.py --burst 40 --max-queue 8 --service-ms 200
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.jobs import JobQueue, QueueFull  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--burst', type=int, default=40)
+    parser.add_argument('--max-queue', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--service-ms', type=float, default=200)
+    args = parser.parse_args()
+
+    service = args.service_ms / 1000
+    jobs = JobQueue(workers=args.workers, max_queue=args.max_queue).start()
+    # mede o tempo de serviço antes da rajada, como num servidor já aquecido
+    jobs.wait(jobs.submit(lambda: time.sleep(service)).id)
+
+    accepted, rejected = [], []
+    for _ in range(args.burst):
+        try:
+            accepted.append((time.monotonic(), jobs.submit(lambda: time.sleep(service))))
+        except QueueFull as e:
+            rejected.append(e.retry_after)
+    print(f"rajada de {args.burst}: {len(accepted)} aceitos, {len(rejected)} rejeitados "
+          f"(Retry-After {min(rejected, default=0)}-{max(rejected, default=0)} s)")
+
+    # os rejeitados voltam juntos após o Retry-After informado
+    if rejected:
+        time.sleep(max(rejected))
+        retried = 0
+        for _ in rejected:
+            try:
+                accepted.append((time.monotonic(), jobs.submit(lambda: time.sleep(service))))
+                retried += 1
+            except QueueFull:
+                pass
+        print(f"reenvio após Retry-After: {retried}/{len(rejected)} aceitos na primeira tentativa")
+
+    latencies = []
+    for submitted, job in accepted:
+        jobs.wait(job.id)
+        latencies.append(job.finished - submitted)
+    print(f"latência dos aceitos: mediana {statistics.median(latencies):.2f} s, máx {max(latencies):.2f} s "
+          f"(limite teórico {(args.max_queue + args.workers) * service / args.workers:.2f} s)")
+    print(jobs.stats())
+    jobs.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Benchmark do cálculo de distâncias: mapa reamostrado para a resolução completa + np.median
+versus medianas na resolução da rede (LowResDepth), calculadas no dispositivo do modelo.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_lowres_distances.py --width 4032 --height 3024 --boxes 20
+"""
+import os
+import sys
+import copy
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import load_depth_anything, generate_depth_map, generate_depth_lowres, calculate_object_distances  # noqa: E402
+
+
+def random_boxes(n, width, height, rng):
+    boxes = []
+    for _ in range(n):
+        x1, y1 = int(rng.integers(0, width - 64)), int(rng.integers(0, height - 64))
+        x2, y2 = int(rng.integers(x1 + 32, width)), int(rng.integers(y1 + 32, height))
+        boxes.append({"class": "objeto", "box": [x1, y1, x2, y2]})
+    return boxes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--width', type=int, default=4032)
+    parser.add_argument('--height', type=int, default=3024)
+    parser.add_argument('--boxes', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8)
+    detections = random_boxes(args.boxes, args.width, args.height, rng)
+    model = load_depth_anything()
+
+    full, low = [], []
+    for _ in range(args.repeats):
+        t0 = time.perf_counter()
+        full_results = calculate_object_distances(copy.deepcopy(detections), generate_depth_map(model, image))
+        full.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        low_results = calculate_object_distances(copy.deepcopy(detections), generate_depth_lowres(model, image))
+        low.append(time.perf_counter() - t0)
+
+    errors = [abs(a['distance'] - b['distance']) for a, b in zip(full_results, low_results)]
+    print(f"resolução completa: mediana {statistics.median(full):.3f}s")
+    print(f"resolução da rede : mediana {statistics.median(low):.3f}s")
+    print(f"diferença nas distâncias: média {np.mean(errors):.3f} m | máx {np.max(errors):.3f} m")
+
+
+if __name__ == '__main__':
+    main()
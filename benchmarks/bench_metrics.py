@@ -0,0 +1,105 @@
+"""Custo da instrumentação de app.metrics: atualização de contadores e histogramas (com e sem
+threads concorrentes), ganchos de requisição do Flask (METRICS_ENABLED ligado e desligado) e,
+para comparação, os prints que eram feitos a cada /process_image (descrição e lista de
+resultados) escritos em um pipe com buffer de linha, como no stdout de um contêiner.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_metrics.py --iterations 100000 --threads 8
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.metrics import MetricsRegistry  # noqa: E402
+
+
+def per_call_ns(fn, iterations, threads=1):
+    def work():
+        for i in range(iterations):
+            fn(i)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - t0) / (iterations * threads) * 1e9
+
+
+def bench_updates(args):
+    registry = MetricsRegistry()
+    counter = registry.counter("c", "c", ("causa",))
+    histogram = registry.histogram("h", "h", ("etapa",))
+    stages = ("leitura", "decodificacao", "yolo", "profundidade", "distancias")
+    for threads in (1, args.threads):
+        inc = per_call_ns(lambda i: counter.inc(causa="sem_deteccoes"), args.iterations, threads)
+        observe = per_call_ns(lambda i: histogram.observe(i % 100 / 100, etapa=stages[i % 5]), args.iterations, threads)
+        print(f"{threads:>2} thread(s): Counter.inc {inc:6.0f} ns | Histogram.observe {observe:6.0f} ns")
+    t0 = time.perf_counter()
+    text = registry.render()
+    print(f"coleta (/metrics) de {len(text.splitlines())} linhas: {(time.perf_counter() - t0) * 1000:.2f} ms")
+
+
+def bench_requests(args):
+    for enabled in (False, True):
+        app = create_app({'MODELS_PRELOAD': False, 'JOBS_ENABLED': False, 'METRICS_ENABLED': enabled})
+        client = app.test_client()
+        for _ in range(100):
+            client.get('/')
+        t0 = time.perf_counter()
+        for _ in range(args.requests):
+            client.get('/')
+        elapsed = (time.perf_counter() - t0) / args.requests * 1e6
+        state = 'ligadas' if enabled else 'desligadas'
+        print(f"requisição ao Flask com métricas {state:<10}: {elapsed:7.1f} µs")
+
+
+def bench_prints(args):
+    results = [{"class": "pessoa", "box": [10 * i, 20, 10 * i + 50, 200], "distance": 3.14159 + i} for i in range(10)]
+    description = "Foi identificado na imagem " + ", ".join(f"um objeto a {i} metros" for i in range(10)) + "."
+    read, write = os.pipe()
+    drain = threading.Thread(target=lambda: [None for _ in iter(lambda: os.read(read, 65536), b"")], daemon=True)
+    drain.start()
+    stream = io.TextIOWrapper(os.fdopen(write, "wb"), line_buffering=True)
+
+    t0 = time.perf_counter()
+    for _ in range(args.requests):
+        print(f"Processamento finalizado em {1.234:.2f} segundos.", file=stream)
+        print(description, file=stream)
+        print(results, file=stream)
+    elapsed = (time.perf_counter() - t0) / args.requests * 1e6
+    stream.close()
+
+    registry = MetricsRegistry()
+    histogram = registry.histogram("h", "h", ("etapa",))
+    detections = registry.histogram("d", "d")
+    t0 = time.perf_counter()
+    for _ in range(args.requests):
+        for stage in ("leitura", "decodificacao", "buffer_rgb", "yolo", "profundidade", "distancias", "processamento"):
+            histogram.observe(0.01, etapa=stage)
+        detections.observe(len(results))
+    metrics_elapsed = (time.perf_counter() - t0) / args.requests * 1e6
+    print(f"por /process_image: prints antigos {elapsed:6.1f} µs | métricas das etapas {metrics_elapsed:6.1f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    bench_updates(args)
+    bench_requests(args)
+    bench_prints(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark da latência por requisição: modelos carregados a cada requisição (antes)
+versus modelos compartilhados pelo registro do processo (depois).
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_model_registry.py --requests 5 --image caminho/imagem.jpg
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.config import model_options  # noqa: E402
+
+
+def make_upload(image_path, size):
+    if image_path:
+        with open(image_path, 'rb') as f:
+            return f.read()
+    rng = np.random.default_rng(0)
+    image = Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8))
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def time_requests(client, payload, n, before_each=None):
+    latencies = []
+    for _ in range(n):
+        if before_each:
+            before_each()
+        t0 = time.perf_counter()
+        client.post('/process_image', data={'image': (BytesIO(payload), 'image.jpg')})
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def summarize(name, latencies):
+    print(f"{name:>10}: média {statistics.mean(latencies):.3f}s | "
+          f"mediana {statistics.median(latencies):.3f}s | "
+          f"min {min(latencies):.3f}s | max {max(latencies):.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=5)
+    parser.add_argument('--image', default=None, help='imagem de teste (padrão: imagem sintética)')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    args = parser.parse_args()
+
+    payload = make_upload(args.image, (args.width, args.height))
+
+    app = create_app({'MODELS_PRELOAD': False, 'RESULT_CACHE': False})
+    client = app.test_client()
+    models = app.extensions['models']
+
+    # Antes: descarta os modelos antes de cada requisição, reproduzindo a carga por POST
+    def reset():
+        models.depth_models.clear()
+        models.yolo_model = None
+
+    before = time_requests(client, payload, args.requests, before_each=reset)
+
+    # Depois: modelos carregados e aquecidos uma única vez
+    reset()
+    t0 = time.perf_counter()
+    models.load(warmup=True, **model_options(app.config))
+    startup = time.perf_counter() - t0
+    after = time_requests(client, payload, args.requests)
+
+    summarize('antes', before)
+    summarize('depois', after)
+    print(f"carga + aquecimento únicos no create_app: {startup:.3f}s {models.load_times}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Latência, memória e paridade da inferência com autocast bfloat16 por etapa, por encoder.
+
+Para cada encoder compara float32 com as configurações de precisão pedidas (backbone/head/saída).
+A paridade é o erro, em metros, da mediana de profundidade por caixa (grade 3x3) em relação ao
+float32. Sem --checkpoints os pesos são aleatórios e só a latência/memória são representativas.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_precision.py --encoders vits vitb vitl --checkpoints checkpoints
+"""
+import os
+import sys
+import copy
+import time
+import argparse
+import statistics
+import multiprocessing as mp
+
+import numpy as np
+import torch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dpt import DepthAnythingV2  # noqa: E402
+from app.utils import LowResDepth, calculate_object_distances  # noqa: E402
+from bench_attention import read_status_kb, reset_peak_rss  # noqa: E402
+from bench_backbone import MODEL_CONFIGS  # noqa: E402
+
+# (backbone, head, saída)
+CONFIGS = {
+    'fp32': ('fp32', 'fp32', 'fp32'),
+    'bf16-backbone': ('bf16', 'fp32', 'fp32'),
+    'bf16-saida-fp32': ('bf16', 'bf16', 'fp32'),
+    'bf16-tudo': ('bf16', 'bf16', 'bf16'),
+}
+
+
+def build(encoder, checkpoints, dataset):
+    torch.manual_seed(0)
+    model = DepthAnythingV2(**MODEL_CONFIGS[encoder])
+    path = os.path.join(checkpoints or '', f'depth_anything_v2_metric_{dataset}_{encoder}.pth')
+    if checkpoints and os.path.exists(path):
+        model.load_state_dict(torch.load(path, map_location='cpu'))
+    return model.eval()
+
+
+def grid_boxes(width, height):
+    return [{"class": "celula", "box": [c * width // 3, r * height // 3, (c + 1) * width // 3, (r + 1) * height // 3]}
+            for r in range(3) for c in range(3)]
+
+
+def run(encoder, config, images, repeats, checkpoints, dataset, queue):
+    model = build(encoder, checkpoints, dataset)
+    backbone, head, output = CONFIGS[config]
+    model.set_precision(backbone=backbone, head=head, output=output)
+
+    model.infer_image_lowres(images[0], channel_order='RGB')
+    reset_peak_rss()
+    rss_before = read_status_kb('VmRSS')
+
+    times, distances = [], []
+    for image in images:
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            depth, scale = model.infer_image_lowres(image, channel_order='RGB')
+            times.append(time.perf_counter() - t0)
+        detections = grid_boxes(image.shape[1], image.shape[0])
+        results = calculate_object_distances(copy.deepcopy(detections), LowResDepth(depth, scale, image.shape[:2]))
+        distances.extend(obj['distance'] for obj in results)
+
+    peak_mb = (read_status_kb('VmHWM') - rss_before) / 1024
+    queue.put((statistics.median(times), peak_mb, distances))
+
+
+def run_isolated(*args):
+    ctx = mp.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=run, args=(*args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def load_images(directory, count):
+    if directory:
+        from PIL import Image
+        names = sorted(os.listdir(directory))[:count]
+        return [np.asarray(Image.open(os.path.join(directory, n)).convert('RGB')) for n in names]
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--encoders', nargs='+', default=['vits', 'vitb', 'vitl'], choices=list(MODEL_CONFIGS))
+    parser.add_argument('--configs', nargs='+', default=list(CONFIGS)[1:], choices=list(CONFIGS)[1:])
+    parser.add_argument('--images', default=None, help='diretório de imagens (padrão: sintéticas)')
+    parser.add_argument('--count', type=int, default=3)
+    parser.add_argument('--repeats', type=int, default=2)
+    parser.add_argument('--checkpoints', default=None, help='diretório com os checkpoints métricos')
+    parser.add_argument('--dataset', default='hypersim', choices=['hypersim', 'vkitti'])
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.count)
+
+    for encoder in args.encoders:
+        common = (images, args.repeats, args.checkpoints, args.dataset)
+        base_time, base_mem, base_dist = run_isolated(encoder, 'fp32', *common)
+        print(f"{encoder} fp32: {base_time * 1000:.1f} ms | pico {base_mem:.1f} MB")
+
+        for config in args.configs:
+            latency, peak_mb, distances = run_isolated(encoder, config, *common)
+            errors = np.abs(np.array(distances) - np.array(base_dist))
+            print(f"    {config:>16}: {latency * 1000:8.1f} ms ({base_time / latency:.2f}x) | pico {peak_mb:7.1f} MB | "
+                  f"erro da mediana: médio {errors.mean():.3f} m, máx {errors.max():.3f} m")
+
+
+if __name__ == '__main__':
+    main()
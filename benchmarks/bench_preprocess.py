@@ -0,0 +1,101 @@
+"""Benchmark por etapa do pré-processamento do Depth Anything V2: pipeline original
+(Compose com Resize, NormalizeImage e PrepareForNet em float64) versus o Preprocessor
+(redimensionamento único em float32, ou em uint8 no modo aproximado, e normalização float32 em
+buffer reutilizável).
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_preprocess.py --sizes 640x480 1920x1080 4032x3024
+"""
+import os
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+import torch
+from torchvision.transforms import Compose
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Depth_Anything_V2.metric_depth.depth_anything_v2.util.transform import Resize, NormalizeImage, PrepareForNet  # noqa: E402
+from Depth_Anything_V2.metric_depth.depth_anything_v2.util.preprocess import Preprocessor  # noqa: E402
+
+
+def original_stages(raw_image, input_size):
+    """Reproduz o image2tensor original, cronometrando cada etapa"""
+    times = {}
+    t0 = time.perf_counter()
+    transform = Compose([
+        Resize(width=input_size, height=input_size, resize_target=False, keep_aspect_ratio=True,
+               ensure_multiple_of=14, resize_method='lower_bound', image_interpolation_method=cv2.INTER_CUBIC),
+        NormalizeImage(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        PrepareForNet(),
+    ])
+    resize, normalize, prepare = transform.transforms
+    times['compose'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    # o app entrega RGB; o caminho original trocava os canais assumindo BGR
+    sample = {'image': raw_image / 255.0}
+    times['float64'] = time.perf_counter() - t0
+
+    for name, step in (('resize', resize), ('normalize', normalize), ('prepare', prepare)):
+        t0 = time.perf_counter()
+        sample = step(sample)
+        times[name] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    device = 'cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'
+    tensor = torch.from_numpy(sample['image']).unsqueeze(0).to(device)
+    times['to_device'] = time.perf_counter() - t0
+
+    return tensor, times
+
+
+def median_times(runs):
+    return {k: float(np.median([r[k] for r in runs])) for k in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', nargs='+', default=['640x480', '1920x1080', '4032x3024'])
+    parser.add_argument('--input-size', type=int, default=518)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    preprocessors = {
+        'exato': Preprocessor(args.input_size, channel_order='RGB'),
+        'uint8': Preprocessor(args.input_size, channel_order='RGB', exact_resize=False),
+    }
+
+    for size in args.sizes:
+        width, height = map(int, size.split('x'))
+        # imagem suave (gradientes + ruído leve), mais próxima de uma foto que ruído puro
+        yy, xx = np.mgrid[0:height, 0:width]
+        base = np.stack([xx * 255 / width, yy * 255 / height, (xx + yy) * 127 / (width + height)], axis=-1)
+        raw = np.clip(base + rng.normal(0, 8, base.shape), 0, 255).astype(np.uint8)
+
+        runs = []
+        for _ in range(args.repeats):
+            reference, times = original_stages(raw, args.input_size)
+            runs.append(times)
+        old = median_times(runs)
+
+        print(f"{size}: original {sum(old.values()) * 1000:.1f} ms "
+              f"({', '.join(f'{k} {v * 1000:.1f}' for k, v in old.items())})")
+
+        for name, preprocessor in preprocessors.items():
+            new = []
+            for _ in range(args.repeats):
+                t0 = time.perf_counter()
+                tensor, _ = preprocessor(raw)
+                new.append(time.perf_counter() - t0)
+
+            diff = (tensor.cpu() - reference.cpu()).abs()
+            print(f"    Preprocessor ({name}): {np.median(new) * 1000:.1f} ms | "
+                  f"diferença máx {diff.max():.2e} média {diff.mean():.2e}")
+
+if __name__ == '__main__':
+    main()
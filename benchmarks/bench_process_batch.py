@@ -0,0 +1,74 @@
+"""Benchmark do /process_batch: imagens JPEG processadas uma a uma (decodificação, YOLO e
+profundidade por imagem, como nas chamadas sequenciais ao /process_image) versus o
+BatchProcessor (decodificação em pool e forwards em lote), com o tempo até o primeiro registro.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_process_batch.py --images 32 --batch-size 8 --decode-workers 4
+"""
+import io
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import registry  # noqa: E402
+from app.batch import BatchProcessor, decode_upload  # noqa: E402
+from app.utils import calculate_object_distances  # noqa: E402
+
+
+def make_uploads(n, size):
+    rng = np.random.default_rng(0)
+    uploads = []
+    for i in range(n):
+        buffer = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)).save(buffer, format="JPEG")
+        uploads.append((f"{i}.jpg", buffer.getvalue()))
+    return uploads
+
+
+def run_sequential(uploads):
+    t0 = time.perf_counter()
+    first = None
+    for _, data in uploads:
+        image = decode_upload(data)
+        detections = registry.detect(image)
+        if detections:
+            calculate_object_distances(detections, registry.depth(image))
+        first = first or time.perf_counter() - t0
+    return time.perf_counter() - t0, first
+
+
+def run_batched(processor, uploads):
+    t0 = time.perf_counter()
+    first = None
+    for record in processor.process(iter(uploads)):
+        first = first or time.perf_counter() - t0
+    return time.perf_counter() - t0, first
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--images', type=int, default=32)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--decode-workers', type=int, default=4)
+    args = parser.parse_args()
+
+    registry.load(warmup=True)
+    uploads = make_uploads(args.images, (args.width, args.height))
+    processor = BatchProcessor(registry, batch_size=args.batch_size, decode_workers=args.decode_workers)
+
+    for name, (total, first) in (("uma a uma", run_sequential(uploads)), ("lote", run_batched(processor, uploads))):
+        print(f"{name:>9}: {args.images / total:6.2f} imagens/s | total {total:6.2f} s | "
+              f"primeiro resultado {first:5.2f} s")
+    processor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Relatório de acurácia e latência da inferência INT8 (app.quantization) contra float32.
+
+Para cada imagem do conjunto local, compara a mediana de profundidade por objeto (caixas do
+YOLO, ou uma grade 3x3 fixa com --grid) entre o modelo float32 e o quantizado, e mede a
+latência de inferência de cada um.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_quantization.py --images caminho/imagens --mode dynamic
+    python benchmarks/bench_quantization.py --images caminho/imagens --mode dynamic+head --calibration-dir caminho/calib
+"""
+import os
+import sys
+import copy
+import time
+import argparse
+import statistics
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import (  # noqa: E402
+    load_depth_anything,
+    load_yolo,
+    detect_objects,
+    generate_depth_lowres,
+    calculate_object_distances
+)
+from app.quantization import QUANTIZATION_MODES  # noqa: E402
+
+
+def grid_boxes(width, height):
+    boxes = []
+    for row in range(3):
+        for col in range(3):
+            boxes.append({"class": f"celula_{row}{col}", "box": [
+                col * width // 3, row * height // 3, (col + 1) * width // 3, (row + 1) * height // 3
+            ]})
+    return boxes
+
+
+def timed_distances(model, image, detections):
+    t0 = time.perf_counter()
+    results = calculate_object_distances(copy.deepcopy(detections), generate_depth_lowres(model, image))
+    return results, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--images', required=True, help='diretório com o conjunto fixo de imagens')
+    parser.add_argument('--mode', default='dynamic', choices=QUANTIZATION_MODES)
+    parser.add_argument('--calibration-dir', default=None)
+    parser.add_argument('--grid', action='store_true', help='usa uma grade 3x3 em vez das caixas do YOLO')
+    args = parser.parse_args()
+
+    paths = sorted(os.path.join(args.images, name) for name in os.listdir(args.images))
+    images = [Image.open(path).convert('RGB') for path in paths]
+
+    fp32 = load_depth_anything()
+    int8 = load_depth_anything(quantize=args.mode, calibration_dir=args.calibration_dir or args.images)
+    yolo = None if args.grid else load_yolo()
+
+    errors, rounded_changes, fp32_times, int8_times = [], 0, [], []
+    for path, image in zip(paths, images):
+        detections = detect_objects(yolo, image) if yolo else grid_boxes(*image.size)
+        if not detections:
+            continue
+
+        reference, t_fp32 = timed_distances(fp32, image, detections)
+        quantized, t_int8 = timed_distances(int8, image, detections)
+        fp32_times.append(t_fp32)
+        int8_times.append(t_int8)
+
+        for ref, quant in zip(reference, quantized):
+            errors.append(abs(ref['distance'] - quant['distance']))
+            rounded_changes += round(ref['distance']) != round(quant['distance'])
+
+        print(f"{os.path.basename(path)}: {len(detections)} objetos | erro máx "
+              f"{max(errors[-len(detections):]):.3f} m | {t_fp32:.2f}s -> {t_int8:.2f}s")
+
+    if not errors:
+        print("Nenhum objeto avaliado.")
+        return
+
+    print(f"\nmodo {args.mode}: {len(errors)} objetos em {len(fp32_times)} imagens")
+    print(f"erro absoluto da mediana: médio {np.mean(errors):.3f} m | p95 {np.percentile(errors, 95):.3f} m | "
+          f"máx {np.max(errors):.3f} m")
+    print(f"distâncias arredondadas (como na descrição) que mudaram: {rounded_changes}/{len(errors)}")
+    print(f"latência mediana: float32 {statistics.median(fp32_times):.3f}s | "
+          f"int8 {statistics.median(int8_times):.3f}s "
+          f"({statistics.median(fp32_times) / statistics.median(int8_times):.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Curva latência x precisão do input_size do modelo de profundidade.
+
+Para cada tamanho de entrada mede a latência mediana da profundidade e compara as distâncias
+por caixa (mediana) com as obtidas em 518, separando as caixas pelo tamanho (grades 2x2, 4x4 e
+8x8 sobre cada imagem). Como o format_description arredonda para metros inteiros, também é
+mostrada a fração de caixas cujo valor arredondado muda. Por fim indica o tamanho que a
+ResolutionPolicy escolheria para cada grade. Sem --checkpoint os pesos são aleatórios e só a
+latência é representativa.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_resolution.py --encoder vitb --checkpoint checkpoints/depth_anything_v2_metric_hypersim_vitb.pth --images fotos/
+"""
+import os
+import sys
+import copy
+import time
+import argparse
+import statistics
+
+import numpy as np
+import torch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.resolution import ResolutionPolicy  # noqa: E402
+from app.utils import LowResDepth, calculate_object_distances  # noqa: E402
+from bench_backbone import MODEL_CONFIGS  # noqa: E402
+from bench_backends import build, load_images  # noqa: E402
+
+GRIDS = (2, 4, 8)
+
+
+def grid(width, height, n):
+    return [{"class": "celula", "box": [c * width // n, r * height // n, (c + 1) * width // n, (r + 1) * height // n]}
+            for r in range(n) for c in range(n)]
+
+
+def distances(model, image, input_size, n):
+    h, w = image.shape[:2]
+    depth, scale = model.infer_image_lowres(image, input_size, channel_order='RGB')
+    results = calculate_object_distances(copy.deepcopy(grid(w, h, n)), LowResDepth(depth, scale, (h, w)))
+    return np.array([obj['distance'] for obj in results])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--encoder', default='vits', choices=list(MODEL_CONFIGS))
+    parser.add_argument('--checkpoint', default=None)
+    parser.add_argument('--images', default=None, help='diretório de imagens (padrão: sintéticas)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[266, 364, 434, 518])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    model = build(args.encoder, args.checkpoint)
+    reference_size = max(args.sizes)
+
+    with torch.no_grad():
+        reference = {(i, n): distances(model, image, reference_size, n) for i, image in enumerate(images) for n in GRIDS}
+
+        print(f"{args.encoder}: erro em relação a {reference_size} (média / máx em m; fração com metro arredondado diferente)")
+        for size in args.sizes:
+            times = []
+            for image in images:
+                model.infer_image_lowres(image, size, channel_order='RGB')
+                for _ in range(args.repeats):
+                    t0 = time.perf_counter()
+                    model.infer_image_lowres(image, size, channel_order='RGB')
+                    times.append(time.perf_counter() - t0)
+
+            columns = []
+            for n in GRIDS:
+                errors, changed = [], []
+                for i, image in enumerate(images):
+                    values = distances(model, image, size, n)
+                    errors.append(np.abs(values - reference[(i, n)]))
+                    changed.append(np.round(values) != np.round(reference[(i, n)]))
+                errors, changed = np.concatenate(errors), np.concatenate(changed)
+                columns.append(f"{n}x{n}: {errors.mean():.3f} / {errors.max():.3f} ({changed.mean():.0%})")
+
+            print(f"    {size:4d}: {statistics.median(times) * 1000:7.1f} ms | " + " | ".join(columns))
+
+    policy = ResolutionPolicy(sizes=args.sizes)
+    print("Escolha da política (qualidade normal, fila vazia)")
+    for n in GRIDS:
+        choices = [policy.choose((image.shape[1], image.shape[0]), grid(image.shape[1], image.shape[0], n))[0]
+                   for image in images]
+        print(f"    grade {n}x{n}: {sorted(set(choices))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""Latência por etapa do pipeline de detecção + profundidade, com saída em JSON e comparação com
+uma linha de base salva.
+
+Etapas medidas para cada encoder e imagem: decodificação (app.ingest.decode_image),
+detect_objects, image2tensor, get_intermediate_layers do DINOv2, DPTHead.forward, upsample do
+infer_image, calculate_object_distances (mapa completo e na resolução da rede) e
+format_description. As imagens são sintéticas (JPEG com textura suave) nos tamanhos de --sizes
+e, com --fixtures, as imagens de um diretório reduzidas ao lado maior de cada tamanho.
+
+Sem --checkpoints os pesos de profundidade são aleatórios (apenas o custo computacional
+interessa). As distâncias usam as detecções do YOLO ou, sem nenhuma, --boxes caixas fixas,
+para que a medição não dependa dos pesos.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_stages.py --encoders vits vitb --sizes 640x480 1920x1080 --output stages.json
+    python benchmarks/bench_stages.py --baseline stages.json --output stages_novo.json
+Com --baseline, etapas mais lentas que a linha de base além de --tolerance (e de --min-delta-ms)
+são listadas como regressões e o processo termina com código 1.
+"""
+import io
+import os
+import sys
+import json
+import glob
+import time
+import platform
+import argparse
+import subprocess
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dpt import DepthAnythingV2  # noqa: E402
+from app.ingest import decode_image  # noqa: E402
+from app.utils import (  # noqa: E402
+    DATASET_MAX_DEPTH,
+    MODEL_CONFIGS,
+    LowResDepth,
+    calculate_object_distances,
+    detect_objects,
+    format_description,
+    load_depth_anything,
+    load_yolo,
+)
+
+STAGES = (
+    "decodificacao",
+    "detect_objects",
+    "image2tensor",
+    "get_intermediate_layers",
+    "dpt_head",
+    "upsample",
+    "distancias",
+    "distancias_lowres",
+    "format_description",
+)
+
+
+def synthetic_jpeg(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    base = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    buffer = io.BytesIO()
+    Image.fromarray(base).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def fixture_jpeg(path, long_side):
+    image = Image.open(path).convert("RGB")
+    image.thumbnail((long_side, long_side), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def images(args):
+    """(nome, bytes JPEG) de cada imagem do benchmark"""
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split("x"))
+        yield f"sintetica_{size}", synthetic_jpeg(width, height)
+        if args.fixtures:
+            for path in sorted(glob.glob(os.path.join(args.fixtures, "*"))):
+                if path.lower().endswith((".jpg", ".jpeg", ".png", ".webp", ".bmp")):
+                    yield f"{os.path.basename(path)}@{max(width, height)}", fixture_jpeg(path, max(width, height))
+
+
+def grid_boxes(size, count):
+    """`count` caixas fixas distribuídas pela imagem (largura, altura)"""
+    width, height = size
+    cols = int(np.ceil(np.sqrt(count)))
+    rows = int(np.ceil(count / cols))
+    boxes = []
+    for i in range(count):
+        col, row = i % cols, i // cols
+        x1, y1 = col * width // cols, row * height // rows
+        boxes.append({"class": "pessoa", "box": [x1, y1, x1 + width // (2 * cols), y1 + height // (2 * rows)]})
+    return boxes
+
+
+@torch.no_grad()
+def run_once(model, yolo, data, args, timings):
+    """Uma passada pelo pipeline, acumulando o tempo de cada etapa em `timings`.
+    A divisão do forward reproduz DepthAnythingV2.forward; devolve o mapa para a verificação."""
+    def stage(name, t0):
+        now = time.perf_counter()
+        timings.setdefault(name, []).append(now - t0)
+        return now
+
+    t = time.perf_counter()
+    image = decode_image(io.BytesIO(data), draft=not args.no_draft)
+    t = stage("decodificacao", t)
+
+    detections = detect_objects(yolo, image)
+    t = stage("detect_objects", t)
+    synthetic = not detections
+    if synthetic:
+        detections = grid_boxes(image.size, args.boxes)
+
+    raw = image.array
+    x, (h, w) = model.image2tensor(raw, args.input_size, "RGB")
+    t = stage("image2tensor", t)
+
+    patch_h, patch_w = x.shape[-2] // 14, x.shape[-1] // 14
+    with model._autocast("backbone", x.device.type):
+        features = model.pretrained.get_intermediate_layers(
+            x, model.intermediate_layer_idx[model.encoder], return_class_token=True
+        )
+    if model.precision["head"] == "fp32":
+        features = tuple((out.float(), cls_token.float()) for out, cls_token in features)
+    t = stage("get_intermediate_layers", t)
+
+    with model._autocast("head", x.device.type):
+        depth = model.depth_head(features, patch_h, patch_w)
+    depth = (depth.float() * model.max_depth).squeeze(1)[0]
+    t = stage("dpt_head", t)
+
+    depth_map = DepthAnythingV2.upsample_depth(depth, (h, w)).cpu().numpy()
+    t = stage("upsample", t)
+
+    results = calculate_object_distances([dict(d) for d in detections], depth_map)
+    t = stage("distancias", t)
+
+    lowres = LowResDepth(depth, (depth.shape[0] / h, depth.shape[1] / w), (h, w))
+    calculate_object_distances([dict(d) for d in detections], lowres)
+    t = stage("distancias_lowres", t)
+
+    format_description(results, image.size[0])
+    stage("format_description", t)
+    return x, depth, len(detections), synthetic, image.size
+
+
+def summarize(samples):
+    ms = np.array(samples) * 1000
+    return {
+        "mediana_ms": round(float(np.median(ms)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "min_ms": round(float(ms.min()), 3),
+    }
+
+
+def bench_image(model, yolo, name, data, args):
+    timings = {}
+    for _ in range(args.warmup):
+        run_once(model, yolo, data, args, {})
+    for _ in range(args.repeats):
+        x, depth, count, synthetic, size = run_once(model, yolo, data, args, timings)
+
+    # a divisão das etapas precisa produzir o mesmo mapa que o forward do modelo
+    reference = model(x)[0]
+    max_diff = float((reference - depth).abs().max())
+    stages = {stage: summarize(timings[stage]) for stage in STAGES}
+    return {
+        "encoder": model.encoder,
+        "imagem": name,
+        "tamanho": list(size),
+        "entrada_rede": list(x.shape[-2:]),
+        "deteccoes": count,
+        "deteccoes_sinteticas": synthetic,
+        "diferenca_forward": max_diff,
+        "etapas": stages,
+        "total_ms": round(sum(s["mediana_ms"] for s in stages.values()), 3),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "threads_torch": torch.get_num_threads(),
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Etapas com mediana acima da linha de base além da tolerância relativa e absoluta"""
+    base = {(r["encoder"], r["imagem"]): r for r in baseline["resultados"]}
+    regressions = []
+    for result in results:
+        reference = base.get((result["encoder"], result["imagem"]))
+        if reference is None:
+            continue
+        for stage, stats in result["etapas"].items():
+            before = reference["etapas"].get(stage, {}).get("mediana_ms")
+            if before is None:
+                continue
+            after = stats["mediana_ms"]
+            stats["linha_base_ms"] = before
+            stats["variacao"] = round(after / before - 1, 3) if before else None
+            if after > before * (1 + tolerance) and after - before > min_delta_ms:
+                regressions.append((result["encoder"], result["imagem"], stage, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--encoders', nargs='+', default=['vits', 'vitb'], choices=list(MODEL_CONFIGS))
+    parser.add_argument('--sizes', nargs='+', default=['640x480', '1280x720', '1920x1080', '4032x3024'])
+    parser.add_argument('--fixtures', help='diretório com imagens reais')
+    parser.add_argument('--input-size', type=int, default=518)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--boxes', type=int, default=8, help='caixas fixas quando o YOLO não detecta nada')
+    parser.add_argument('--no-draft', action='store_true', help='decodifica os JPEGs em resolução completa')
+    parser.add_argument('--checkpoints', action='store_true', help='usa os checkpoints métricos (hypersim)')
+    parser.add_argument('--yolo', default='yolo11n.pt')
+    parser.add_argument('--output', default='stages.json')
+    parser.add_argument('--baseline', help='JSON de uma execução anterior')
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    parser.add_argument('--min-delta-ms', type=float, default=0.5)
+    args = parser.parse_args()
+
+    yolo = load_yolo(args.yolo)
+    if yolo is None:
+        sys.exit(f"Não foi possível carregar o YOLO ({args.yolo}).")
+    inputs = list(images(args))
+
+    results = []
+    for encoder in args.encoders:
+        if args.checkpoints:
+            model = load_depth_anything(encoder, 'hypersim')
+            if model is None:
+                sys.exit(f"Checkpoint de {encoder} indisponível.")
+        else:
+            model = DepthAnythingV2(**MODEL_CONFIGS[encoder], max_depth=DATASET_MAX_DEPTH['hypersim']).eval()
+        for name, data in inputs:
+            result = bench_image(model, yolo, name, data, args)
+            results.append(result)
+            stages = " | ".join(f"{stage} {stats['mediana_ms']:.1f}" for stage, stats in result["etapas"].items())
+            print(f"{encoder} {name}: total {result['total_ms']:.1f} ms | {stages}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "ambiente": environment(),
+            "parametros": vars(args),
+            "resultados": results,
+            "regressoes": [
+                {"encoder": e, "imagem": i, "etapa": s, "linha_base_ms": b, "atual_ms": a}
+                for e, i, s, b, a in regressions
+            ],
+        }, f, indent=2, ensure_ascii=False)
+    print(f"Resultados salvos em {args.output}.")
+
+    if args.baseline:
+        for encoder, image, stage, before, after in regressions:
+            print(f"REGRESSÃO {encoder} {image} {stage}: {before:.2f} -> {after:.2f} ms ({after / before - 1:+.0%})")
+        print(f"{len(regressions)} regressões em relação a {args.baseline}.")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Latência do modelo de profundidade com vários workers pré-forkados rodando ao mesmo tempo:
+pools de threads padrão do torch (cada worker com uma thread por núcleo do host, disputando as
+CPUs) versus app.topology (núcleos divididos entre os workers, threads fixadas).
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_topology.py --workers 4 --seconds 20 --encoder vits
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import registry  # noqa: E402
+from app.prefork import load_before_fork  # noqa: E402
+from app.topology import apply_topology, current_layout  # noqa: E402
+
+
+def serve(slot, args, topology, output):
+    if topology:
+        apply_topology(slot, args.workers)
+    else:
+        torch.set_num_threads(os.cpu_count())
+    image = Image.fromarray(np.random.default_rng(slot).integers(0, 255, (args.height, args.width, 3), dtype=np.uint8))
+    registry.depth(image)
+    latencies = []
+    end = time.perf_counter() + args.seconds
+    while time.perf_counter() < end:
+        t0 = time.perf_counter()
+        registry.depth(image)
+        latencies.append(time.perf_counter() - t0)
+    with os.fdopen(output, "w") as f:
+        json.dump({"latencias": latencies, "layout": current_layout()}, f)
+
+
+def run(args, topology):
+    pids, pipes = [], []
+    for slot in range(args.workers):
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            serve(slot, args, topology, write)
+            os._exit(0)
+        os.close(write)
+        pids.append(pid)
+        pipes.append(read)
+    results = []
+    for read in pipes:
+        with os.fdopen(read) as f:
+            results.append(json.load(f))
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+    latencies = np.array([latency for result in results for latency in result["latencias"]]) * 1000
+    threads = [result["layout"]["threads_intra_op"] for result in results]
+    name = "topologia" if topology else "padrão"
+    print(f"{name:>9}: {len(latencies) / args.seconds:6.2f} mapas/s | p50 {np.percentile(latencies, 50):7.1f} ms | "
+          f"p99 {np.percentile(latencies, 99):7.1f} ms | threads por worker {threads}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--encoder', default='vits')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    args = parser.parse_args()
+
+    load_before_fork(registry, warmup=False, encoder=args.encoder)
+    print(f"{os.cpu_count()} CPUs, {args.workers} workers")
+    for topology in (False, True):
+        run(args, topology)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Vazão do processamento de vídeo com e sem o reaproveitamento da profundidade (DepthGate) e
+o rastreamento de objetos (IouTracker).
+
+Gera um clipe sintético (fundo texturizado com um objeto que se move devagar e um corte de cena
+no meio), processa o clipe recalculando a profundidade em todos os quadros, depois com o
+DepthGate e por fim com DepthGate e trilhas, e compara quadros por segundo, quantos mapas foram
+calculados e a diferença das distâncias por objeto em relação à primeira execução.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_video.py --frames 60 --threshold 0.04
+"""
+import os
+import sys
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import registry  # noqa: E402
+from app.tracking import IouTracker  # noqa: E402
+from app.video import DepthGate, process_video  # noqa: E402
+
+
+def make_clip(path, frames, size, fps=15):
+    """Clipe MJPG: objeto se deslocando 2 px por quadro e troca de fundo na metade"""
+    width, height = size
+    rng = np.random.default_rng(0)
+    ramp = np.linspace(0, 255, width, dtype=np.float32)[None, :, None].repeat(height, 0).repeat(3, 2)
+    noise = rng.normal(0, 12, (height, width, 3))
+    # duas cenas com gradientes opostos (o corte muda a miniatura inteira)
+    backgrounds = [np.clip(ramp + noise, 0, 255).astype(np.uint8), np.clip(255 - ramp + noise, 0, 255).astype(np.uint8)]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    for i in range(frames):
+        frame = backgrounds[0 if i < frames // 2 else 1].copy()
+        x = width // 4 + 2 * i
+        cv2.rectangle(frame, (x, height // 3), (x + width // 4, height // 3 + height // 3), (40, 90, 200), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def run(path, gate, tracker=None):
+    with open(path, "rb") as stream:
+        return process_video(registry, stream, gate, tracker=tracker)
+
+
+def distances(result):
+    return [obj["distance"] for frame in result["quadros"] for obj in frame["resultados"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--threshold', type=float, default=0.04)
+    parser.add_argument('--max-reuse', type=int, default=30)
+    parser.add_argument('--move-iou', type=float, default=0.8)
+    args = parser.parse_args()
+
+    registry.load(warmup=True)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "clipe.avi")
+        make_clip(path, args.frames, (args.width, args.height))
+
+        always = run(path, DepthGate(threshold=0.0))
+        gated = run(path, DepthGate(threshold=args.threshold, max_reuse=args.max_reuse))
+        tracked = run(path, DepthGate(threshold=args.threshold, max_reuse=args.max_reuse),
+                      IouTracker(move_iou=args.move_iou))
+
+    for name, result in (("sempre", always), ("com gate", gated), ("trilhas", tracked)):
+        summary = result["resumo"]
+        print(f"{name:>9}: {summary['quadros_por_segundo']} quadros/s | profundidade calculada "
+              f"{summary['profundidade_calculada']}, reaproveitada {summary['profundidade_reutilizada']}, "
+              f"omitida {summary['profundidade_omitida']}")
+
+    a = distances(always)
+    for name, result in (("com gate", gated), ("trilhas", tracked)):
+        b = distances(result)
+        if a and len(a) == len(b):
+            errors = np.abs(np.array(a) - np.array(b))
+            print(f"diferença das distâncias ({name}): média {errors.mean():.3f} m, máx {errors.max():.3f} m")
+        print(f"ganho de vazão ({name}): {always['resumo']['tempo_total_s'] / result['resumo']['tempo_total_s']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
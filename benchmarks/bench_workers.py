@@ -0,0 +1,96 @@
+"""Memória por worker pré-forkado: cada worker carregando os próprios modelos versus os modelos
+carregados no mestre antes do fork (preload, copy-on-write), com e sem os pesos de
+profundidade mapeados do checkpoint (torch.load com mmap=True).
+
+Para cada modo, um processo mestre cria `--workers` workers, cada um atende `--requests`
+inferências (YOLO e profundidade) e a memória é medida com todos vivos: única (USS, o que cada
+worker a mais custa), PSS e RSS.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/bench_workers.py --workers 4 --requests 3 --encoder vitb
+"""
+import os
+import sys
+import argparse
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import registry  # noqa: E402
+from app.prefork import freeze_shared_objects, load_before_fork, process_memory, workers_memory  # noqa: E402
+
+MODES = {
+    # nome: (carga no mestre antes do fork, pesos mapeados do checkpoint)
+    "independente": (False, False),
+    "mmap": (False, True),
+    "preload": (True, False),
+    "preload+mmap": (True, True),
+}
+
+
+def serve(preloaded, options, requests, ready, stop):
+    if not preloaded:
+        registry.load(warmup=False, **options)
+    image = Image.fromarray(np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8))
+    for _ in range(requests):
+        registry.detect(image)
+        registry.depth(image)
+    os.write(ready, b"1")
+    os.read(stop, 1)  # EOF quando o mestre termina a medição
+
+
+def master(mode, args):
+    preload, mmap = MODES[mode]
+    options = {"encoder": args.encoder, "depth_options": {"mmap": mmap}}
+    if preload:
+        load_before_fork(registry, warmup=True, **options)
+        freeze_shared_objects()
+    loaded = process_memory()
+
+    ready_r, ready_w = os.pipe()
+    stop_r, stop_w = os.pipe()
+    pids = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(stop_w)
+            serve(preload, options, args.requests, ready_w, stop_r)
+            os._exit(0)
+        pids.append(pid)
+    for _ in pids:
+        os.read(ready_r, 1)
+    memory = workers_memory(os.getpid())
+    os.close(stop_w)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+    unique = [worker["unica_mb"] for worker in memory["workers"]]
+    rss = [worker["rss_mb"] for worker in memory["workers"]]
+    print(f"{mode:>13}: mestre {loaded['rss_mb']:7.1f} MB RSS | por worker: única {np.mean(unique):7.1f} MB, "
+          f"RSS {np.mean(rss):7.1f} MB | total (PSS mestre + workers) "
+          f"{memory['mestre']['pss_mb'] + memory['total_pss_mb']:7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=3)
+    parser.add_argument('--encoder', default='vitb')
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    if process_memory() is None:
+        sys.exit("Este benchmark lê /proc/<pid>/smaps_rollup e só roda no Linux.")
+    # cada modo roda em um processo mestre novo, sem modelos carregados
+    for mode in args.modes:
+        pid = os.fork()
+        if pid == 0:
+            master(mode, args)
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+
+if __name__ == '__main__':
+    main()
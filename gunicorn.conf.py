@@ -0,0 +1,56 @@
+"""Configuração do gunicorn (lida automaticamente do diretório de trabalho).
+
+Com PREFORK_SHARED_WEIGHTS ligado (padrão aqui), o app é criado no processo mestre (preload_app)
+e os modelos são carregados uma única vez, antes do fork: os workers compartilham os pesos por
+copy-on-write e os checkpoints de profundidade mapeados em memória pelo page cache, então cada
+worker a mais custa apenas a sua memória única (ver GET /memory). O número de workers vem de
+WEB_CONCURRENCY ou --workers.
+
+Os jobs assíncronos (POST /jobs) rodam no worker que os aceitou, mas o estado deles fica em um
+diretório compartilhado (JOBS_STORE_DIR; sem ele, um diretório temporário criado aqui e removido
+ao encerrar), então GET /jobs/<id> funciona em qualquer worker e a fila é contada para todos.
+
+Com WORKER_TOPOLOGY ligado, cada worker recebe uma posição fixa (reaproveitada quando um worker
+é substituído) e, logo após o fork, a sua parte dos núcleos do host (ver app.topology e
+GET /topology).
+"""
+import os
+import shutil
+import tempfile
+import itertools
+
+os.environ.setdefault("PREFORK_SHARED_WEIGHTS", "1")
+_jobs_dir = None
+if not os.environ.get("JOBS_STORE_DIR"):
+    # em memória quando disponível; herdado pelos workers
+    _jobs_dir = tempfile.mkdtemp(prefix="jobs-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    os.environ["JOBS_STORE_DIR"] = _jobs_dir
+
+from app.config import Config, topology_options  # noqa: E402
+
+preload_app = Config.PREFORK_SHARED_WEIGHTS
+_topology = topology_options(vars(Config))
+
+
+def when_ready(server):
+    if preload_app:
+        from app.prefork import freeze_shared_objects, process_memory
+        freeze_shared_objects()
+        server.log.info("Modelos carregados no mestre: %s", process_memory())
+
+
+def on_exit(server):
+    if _jobs_dir is not None:
+        shutil.rmtree(_jobs_dir, ignore_errors=True)
+
+
+def pre_fork(server, worker):
+    # menor posição livre entre os workers vivos (o novo worker ainda não está em server.WORKERS)
+    used = {getattr(other, "slot", None) for other in server.WORKERS.values()}
+    worker.slot = next(slot for slot in itertools.count() if slot not in used)
+
+
+def post_fork(server, worker):
+    if _topology is not None:
+        from app.topology import apply_topology
+        apply_topology(worker.slot, server.num_workers, **_topology)
@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from app.admission import AdmissionController, LatencyEstimates, depth_work, parse_deadline
+
+IMAGE = (640, 480)
+
+
+def controller(vitb=10.0, vits=1.0, yolo=0.05, post=0.0):
+    """Segundos por megapixel de entrada em cada encoder (amostras constantes: o quantil é o próprio valor)"""
+    estimates = LatencyEstimates()
+    estimates.record("yolo", yolo)
+    estimates.record("pos_processamento", post)
+    estimates.record("profundidade/vitb", vitb)
+    estimates.record("profundidade/vits", vits)
+    return AdmissionController(estimates, sizes=(266, 364, 518), safety=1.0)
+
+
+def deadline_for(seconds):
+    # folga de 20 ms para o tempo gasto entre o cálculo do prazo e o plano
+    return time.monotonic() + seconds + 0.02
+
+
+@pytest.mark.parametrize("budget, resident, tier, encoder, size", [
+    (depth_work(IMAGE, 518) * 10.0, ("vitb", "vits"), "completa", "vitb", 518),
+    (depth_work(IMAGE, 364) * 10.0, ("vitb", "vits"), "resolucao_reduzida", "vitb", 364),
+    (depth_work(IMAGE, 266) * 10.0, ("vitb",), "resolucao_reduzida", "vitb", 266),
+    (depth_work(IMAGE, 518) * 1.0, ("vitb", "vits"), "encoder_leve", "vits", 518),
+    (depth_work(IMAGE, 266) * 1.0, ("vitb", "vits"), "encoder_leve", "vits", 266),
+    (depth_work(IMAGE, 266) * 1.0, ("vitb",), "somente_deteccoes", None, None),
+    (0.001, ("vitb", "vits"), "somente_deteccoes", None, None),
+])
+def test_plan_picks_best_tier_that_fits(budget, resident, tier, encoder, size):
+    admission = controller()
+
+    plan = admission.plan(deadline_for(budget), IMAGE, "vitb", 518, resident)
+
+    assert (plan.tier, plan.encoder, plan.input_size) == (tier, encoder, size)
+    assert plan.depth == (tier != "somente_deteccoes")
+    assert admission.stats()["niveis"][tier] == 1
+
+
+def test_plan_reserves_post_processing_time():
+    admission = controller(post=2.0)
+    budget = depth_work(IMAGE, 518) * 10.0
+
+    assert admission.plan(deadline_for(budget), IMAGE, "vitb", 518, ("vitb",)).input_size < 518
+    assert admission.plan(deadline_for(budget + 2.0), IMAGE, "vitb", 518, ("vitb",)).tier == "completa"
+
+
+def test_stage_without_samples_is_feasible():
+    admission = AdmissionController(LatencyEstimates())
+    assert admission.admit(deadline_for(0.001))
+    assert admission.plan(deadline_for(0.001), IMAGE, "vitl", 518).tier == "completa"
+
+
+def test_admit_rejects_when_detection_does_not_fit():
+    admission = controller(yolo=0.5)
+
+    assert admission.admit(deadline_for(1.0))
+    assert not admission.admit(deadline_for(0.1))
+    assert not admission.admit(time.monotonic() - 1)
+    assert admission.stats()["rejeitadas"] == 2
+
+
+def test_finish_counts_missed_deadlines():
+    admission = controller()
+    admission.finish("completa", time.monotonic() + 10)
+    admission.finish("encoder_leve", time.monotonic() - 1)
+    assert admission.stats()["prazos_perdidos"] == {
+        "completa": 0, "resolucao_reduzida": 0, "encoder_leve": 1, "somente_deteccoes": 0,
+    }
+
+
+def test_parse_deadline():
+    assert parse_deadline(None) is None
+    assert parse_deadline("") is None
+    assert parse_deadline("250") == 250.0
+    for value in ("0", "-5", "rapido"):
+        with pytest.raises(ValueError):
+            parse_deadline(value)
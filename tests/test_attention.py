@@ -0,0 +1,48 @@
+from functools import partial
+
+import pytest
+import torch
+
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dinov2 import DinoVisionTransformer
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dinov2_layers import MemEffAttention, NestedTensorBlock as Block
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dinov2_layers.attention import Attention
+
+
+@pytest.mark.parametrize("tokens", [1 + 16, 1 + 37 * 37])
+def test_sdpa_matches_reference_attention(tokens):
+    torch.manual_seed(0)
+    attention = Attention(64, num_heads=4, qkv_bias=True).eval()
+    x = torch.randn(2, tokens, 64)
+
+    with torch.no_grad():
+        attention.set_backend("reference")
+        expected = attention(x)
+        attention.set_backend("sdpa")
+        result = attention(x)
+
+    torch.testing.assert_close(result, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_sdpa_matches_reference_backbone():
+    torch.manual_seed(0)
+    # backbone pequeno com os mesmos blocos do DINOv2 (pesos aleatórios)
+    backbone = DinoVisionTransformer(
+        img_size=518, patch_size=14, embed_dim=96, depth=2, num_heads=4, init_values=1.0, block_chunks=0,
+        block_fn=partial(Block, attn_class=MemEffAttention),
+    ).eval()
+    x = torch.randn(1, 3, 266, 364)
+
+    with torch.no_grad():
+        backbone.set_attn_backend("reference")
+        expected = backbone.get_intermediate_layers(x, [0, 1], return_class_token=True)
+        backbone.set_attn_backend("sdpa")
+        result = backbone.get_intermediate_layers(x, [0, 1], return_class_token=True)
+
+    for (tokens, cls_token), (expected_tokens, expected_cls) in zip(result, expected):
+        torch.testing.assert_close(tokens, expected_tokens, rtol=1e-4, atol=1e-4)
+        torch.testing.assert_close(cls_token, expected_cls, rtol=1e-4, atol=1e-4)
+
+
+def test_unknown_attention_backend():
+    with pytest.raises(ValueError):
+        Attention(64, attn_backend="flash")
@@ -0,0 +1,130 @@
+import threading
+import time
+
+import numpy as np
+
+from app.cache import ResultCache
+from app.ingest import DecodedImage
+
+
+def image(value=0):
+    return DecodedImage(np.full((32, 48, 3), value, dtype=np.uint8))
+
+
+def wait_inflight(cache):
+    deadline = time.monotonic() + 5
+    while not cache._inflight:
+        assert time.monotonic() < deadline, "o líder não começou a calcular"
+        time.sleep(0.001)
+
+
+def run_follower(cache, compute, store, results):
+    thread = threading.Thread(
+        target=lambda: results.append(cache.get_or_compute(image(), "config", compute, store))
+    )
+    thread.start()
+    # dá tempo para o seguidor encontrar o cálculo em andamento
+    time.sleep(0.05)
+    return thread
+
+
+def test_follower_gets_accepted_result():
+    cache = ResultCache()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append("lider")
+        release.wait(5)
+        return {"descricao": "ok"}
+
+    leader = []
+    thread = threading.Thread(target=lambda: leader.append(cache.get_or_compute(image(), "config", slow)))
+    thread.start()
+    wait_inflight(cache)
+    follower = []
+    follower_thread = run_follower(cache, lambda: calls.append("seguidor"), None, follower)
+    release.set()
+    thread.join(5)
+    follower_thread.join(5)
+
+    assert calls == ["lider"]
+    assert leader == [({"descricao": "ok"}, "calculado")]
+    assert follower == [({"descricao": "ok"}, "coalescido")]
+    assert cache.stats()["coalescidos"] == 1
+    assert cache.get_or_compute(image(), "config", lambda: None) == ({"descricao": "ok"}, "acerto")
+
+
+def test_follower_recomputes_rejected_result():
+    cache = ResultCache()
+    release = threading.Event()
+    accept = lambda value: not value.get("degradado")
+
+    def degraded():
+        release.wait(5)
+        return {"descricao": "parcial", "degradado": True}
+
+    leader = []
+    thread = threading.Thread(
+        target=lambda: leader.append(cache.get_or_compute(image(), "config", degraded, accept))
+    )
+    thread.start()
+    wait_inflight(cache)
+    follower = []
+    follower_thread = run_follower(cache, lambda: {"descricao": "completa"}, accept, follower)
+    release.set()
+    thread.join(5)
+    follower_thread.join(5)
+
+    # o líder fica com o próprio resultado; o seguidor não recebe o resultado recusado
+    assert leader == [({"descricao": "parcial", "degradado": True}, "calculado")]
+    assert follower == [({"descricao": "completa"}, "calculado")]
+    stats = cache.stats()
+    assert stats["recalculados"] == 1
+    assert stats["coalescidos"] == 0
+    assert stats["entradas"] == 1
+    assert cache.get_or_compute(image(), "config", lambda: None) == ({"descricao": "completa"}, "acerto")
+
+
+def test_follower_gets_leader_exception():
+    cache = ResultCache()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise RuntimeError("falha no modelo")
+
+    errors = []
+
+    def call(compute):
+        try:
+            cache.get_or_compute(image(), "config", compute)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    thread = threading.Thread(target=call, args=(failing,))
+    thread.start()
+    wait_inflight(cache)
+    follower_thread = threading.Thread(target=call, args=(lambda: {"descricao": "ok"},))
+    follower_thread.start()
+    time.sleep(0.05)
+    release.set()
+    thread.join(5)
+    follower_thread.join(5)
+
+    assert errors == ["falha no modelo", "falha no modelo"]
+    assert cache.stats()["em_andamento"] == 0
+
+
+def test_perceptual_hit_for_near_duplicate():
+    cache = ResultCache(perceptual=True)
+    base = np.tile(np.linspace(0, 255, 48, dtype=np.uint8)[None, :, None], (32, 1, 3))
+    cache.get_or_compute(DecodedImage(base), "config", lambda: {"descricao": "ok"})
+
+    near = base.copy()
+    near[0, 0] ^= 1
+    assert cache.get_or_compute(DecodedImage(near), "config", lambda: None) == ({"descricao": "ok"}, "similar")
+    # gradiente invertido: todos os bits do dHash diferem
+    other = np.ascontiguousarray(base[:, ::-1])
+    assert cache.get_or_compute(DecodedImage(other), "config", lambda: {"descricao": "outra"}) == (
+        {"descricao": "outra"}, "calculado")
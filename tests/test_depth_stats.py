@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+import torch
+
+from app.depth_stats import DepthStatsIndex, parse_statistic, region_statistic
+
+
+def depth_map(seed=0, shape=(120, 160)):
+    rng = np.random.default_rng(seed)
+    # gradiente de profundidade com ruído, na faixa de um ambiente interno (metros)
+    y, x = np.mgrid[:shape[0], :shape[1]]
+    return (1.0 + 0.03 * y + 0.01 * x + rng.normal(0, 0.3, shape)).clip(0.1).astype(np.float32)
+
+
+def aligned_boxes(rng, shape, cell, count=50):
+    # caixas alinhadas às células: o erro fica limitado à largura de um intervalo do histograma
+    boxes = []
+    for _ in range(count):
+        x1, x2 = sorted(rng.choice(shape[1] // cell + 1, 2, replace=False) * cell)
+        y1, y2 = sorted(rng.choice(shape[0] // cell + 1, 2, replace=False) * cell)
+        boxes.append((x1, y1, x2, y2))
+    return boxes
+
+
+@pytest.mark.parametrize("bins, cell", [(64, 4), (256, 1), (32, 8)])
+def test_index_median_matches_numpy(bins, cell):
+    depth = depth_map()
+    index = DepthStatsIndex(depth, bins=bins, cell=cell)
+    boxes = aligned_boxes(np.random.default_rng(1), depth.shape, cell)
+
+    medians = index.median(boxes).numpy()
+    expected = np.array([np.median(depth[y1:y2, x1:x2]) for x1, y1, x2, y2 in boxes])
+
+    np.testing.assert_allclose(medians, expected, rtol=0, atol=index.bin_width)
+
+
+@pytest.mark.parametrize("statistic", [("percentile", 25.0), ("percentile", 90.0), ("trimmed_mean", 0.1)])
+def test_index_statistics_match_region_statistic(statistic):
+    depth = depth_map(seed=2)
+    index = DepthStatsIndex(depth, bins=128, cell=4)
+    boxes = aligned_boxes(np.random.default_rng(3), depth.shape, 4)
+
+    values = index.query(boxes, statistic).numpy()
+    expected = np.array([region_statistic(depth[y1:y2, x1:x2], statistic) for x1, y1, x2, y2 in boxes])
+
+    np.testing.assert_allclose(values, expected, rtol=0, atol=index.bin_width)
+
+
+def test_region_statistic_torch_matches_numpy():
+    depth = depth_map(seed=4)
+    for statistic in [("percentile", 50.0), ("percentile", 10.0), ("trimmed_mean", 0.2)]:
+        expected = region_statistic(depth, statistic)
+        assert float(region_statistic(torch.from_numpy(depth), statistic)) == pytest.approx(expected, rel=1e-5)
+
+
+def test_parse_statistic():
+    assert parse_statistic(None) == ("percentile", 50.0)
+    assert parse_statistic("p25") == ("percentile", 25.0)
+    assert parse_statistic("trimmed_mean:0.2") == ("trimmed_mean", 0.2)
+    for value in ("p101", "trimmed_mean:0.5", "mode"):
+        with pytest.raises(ValueError):
+            parse_statistic(value)
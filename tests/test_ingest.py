@@ -0,0 +1,51 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image, ImageOps
+
+from app.ingest import EXIF_ORIENTATION, decode_image, draft_size
+
+
+def jpeg(size, orientation=1, quality=95):
+    width, height = size
+    # padrão assimétrico: qualquer giro ou espelhamento errado muda os pixels
+    y, x = np.mgrid[:height, :width]
+    array = np.stack([x * 255 // width, y * 255 // height, (x < width // 4) * 255], axis=-1).astype(np.uint8)
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = orientation
+    buffer = BytesIO()
+    Image.fromarray(array).save(buffer, format="JPEG", quality=quality, exif=exif)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("orientation", range(1, 9))
+def test_orientation_matches_exif_transpose(orientation):
+    data = jpeg((64, 48), orientation)
+    expected = np.asarray(ImageOps.exif_transpose(Image.open(BytesIO(data))).convert("RGB"))
+
+    decoded = decode_image(BytesIO(data), draft=False)
+
+    np.testing.assert_array_equal(decoded.array, expected)
+    assert decoded.array.flags.c_contiguous
+    assert decoded.size == decoded.original_size == (expected.shape[1], expected.shape[0])
+
+
+@pytest.mark.parametrize("orientation", [1, 6])
+def test_draft_keeps_original_size_and_restores_boxes(orientation):
+    data = jpeg((2560, 1920), orientation)
+    decoded = decode_image(BytesIO(data), min_short_side=518, min_long_side=640)
+
+    # 6: girada 90°, a imagem vista pelo cliente é 1920x2560
+    original = (2560, 1920) if orientation == 1 else (1920, 2560)
+    assert decoded.original_size == original
+    assert decoded.size == (original[0] // 2, original[1] // 2)
+    assert min(decoded.size) >= 518
+
+    detections = [{"box": [10, 20, 30, 40]}]
+    assert decoded.restore_boxes(detections) == [{"box": [20, 40, 60, 80]}]
+
+
+def test_draft_size():
+    assert draft_size((4000, 3000), 518, 640) == (691, 518)
+    assert draft_size((640, 480), 518, 640) == (640, 480)
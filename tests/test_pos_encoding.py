@@ -0,0 +1,45 @@
+import pytest
+import torch
+
+from Depth_Anything_V2.metric_depth.depth_anything_v2.dinov2 import DinoVisionTransformer
+
+
+def small_backbone():
+    torch.manual_seed(0)
+    # grade nativa de 37x37 patches, como o DINOv2 do Depth Anything V2 (pesos aleatórios)
+    return DinoVisionTransformer(
+        img_size=518, patch_size=14, embed_dim=96, depth=1, num_heads=4, init_values=1.0, block_chunks=0,
+        interpolate_offset=0.1,
+    ).eval()
+
+
+@pytest.mark.parametrize("h, w", [(266, 364), (518, 686), (686, 518), (364, 364), (518, 518), (14, 28)])
+def test_traceable_matches_interpolate(h, w):
+    backbone = small_backbone()
+    # prepare_tokens_with_masks passa (altura, largura) da entrada como (w, h)
+    expected = backbone._interpolate_pos_encoding(96, h, w)
+    if (h, w) == (518, 518):
+        expected = backbone.pos_embed
+    result = backbone._interpolate_pos_encoding_traceable(96, h, w)
+    torch.testing.assert_close(result, expected, rtol=0, atol=1e-5)
+
+
+class Tokens(torch.nn.Module):
+    def __init__(self, backbone):
+        super().__init__()
+        self.backbone = backbone
+
+    def forward(self, x):
+        return self.backbone.prepare_tokens_with_masks(x)
+
+
+@pytest.mark.filterwarnings("ignore::torch.jit.TracerWarning")
+@torch.no_grad()
+def test_traced_graph_follows_input_size():
+    # o grafo gravado na exportação ONNX (backend 'onnx') precisa servir para qualquer tamanho
+    backbone = small_backbone()
+    traced = torch.jit.trace(Tokens(backbone), torch.zeros(1, 3, 518, 686), check_trace=False)
+
+    for shape in [(266, 364), (518, 518), (364, 266)]:
+        x = torch.randn(1, 3, *shape)
+        torch.testing.assert_close(traced(x), backbone.prepare_tokens_with_masks(x), rtol=0, atol=1e-4)
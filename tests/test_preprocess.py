@@ -0,0 +1,56 @@
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from Depth_Anything_V2.metric_depth.depth_anything_v2.util.preprocess import Preprocessor
+from Depth_Anything_V2.metric_depth.depth_anything_v2.util.transform import NormalizeImage, PrepareForNet, Resize
+
+
+def compose_image2tensor(raw_image, input_size=518):
+    """Pipeline original do image2tensor (Resize -> NormalizeImage -> PrepareForNet em float64)"""
+    transforms = [
+        Resize(
+            width=input_size,
+            height=input_size,
+            resize_target=False,
+            keep_aspect_ratio=True,
+            ensure_multiple_of=14,
+            resize_method='lower_bound',
+            image_interpolation_method=cv2.INTER_CUBIC,
+        ),
+        NormalizeImage(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        PrepareForNet(),
+    ]
+    sample = {'image': cv2.cvtColor(raw_image, cv2.COLOR_BGR2RGB) / 255.0}
+    for transform in transforms:
+        sample = transform(sample)
+    return torch.from_numpy(sample['image']).unsqueeze(0)
+
+
+@pytest.mark.parametrize("shape", [(480, 640), (720, 1280), (300, 301), (518, 518)])
+@pytest.mark.parametrize("input_size", [266, 518])
+def test_preprocessor_matches_compose(shape, input_size):
+    # ruído é o pior caso para o resize bicúbico (overshoot em todos os pixels)
+    raw_image = np.random.default_rng(0).integers(0, 256, (*shape, 3), dtype=np.uint8)
+
+    expected = compose_image2tensor(raw_image, input_size)
+    image, size = Preprocessor(input_size, channel_order="BGR")(raw_image)
+
+    assert size == shape
+    assert image.dtype == torch.float32
+    assert image.shape == expected.shape
+    torch.testing.assert_close(image, expected.float(), rtol=0, atol=1e-3)
+
+
+def test_preprocessor_batch_matches_single():
+    rng = np.random.default_rng(1)
+    raw_images = [rng.integers(0, 256, (480, 640, 3), dtype=np.uint8) for _ in range(3)]
+    preprocessor = Preprocessor(channel_order="BGR")
+
+    batch, sizes = preprocessor.batch(raw_images)
+    batch = batch.clone()
+
+    assert sizes == [(480, 640)] * 3
+    for i, raw_image in enumerate(raw_images):
+        torch.testing.assert_close(batch[i:i + 1], preprocessor(raw_image)[0], rtol=0, atol=0)